@@ -8,9 +8,10 @@ import re
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/external/lib/python')
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from utils.Common import getConfig, getMyLogger, csvArgsToList, getNfsServer
+from utils.Common import getConfig, getMyLogger, csvArgsToList
 from utils.acl.Nfs4NetApp import Nfs4NetApp
 from utils.acl.Nfs4FreeNAS import Nfs4FreeNAS
+from utils.ProjectPool import ProjectPool
 
 ## execute the main program
 if __name__ == "__main__":
@@ -76,6 +77,20 @@ if __name__ == "__main__":
                       default = '',
                       help    = 'specify the relative/absolute path to a sub-directory to which the role setting is applied')
 
+    parg.add_argument('-j','--jobs',
+                      action  = 'store',
+                      dest    = 'jobs',
+                      type    = int,
+                      default = 1,
+                      help    = 'number of projects processed concurrently')
+
+    parg.add_argument('--jobs-per-server',
+                      action  = 'store',
+                      dest    = 'jobs_per_server',
+                      type    = int,
+                      default = 4,
+                      help    = 'maximum number of projects processed concurrently on the same NFS server')
+
     args = parg.parse_args()
 
     logger = getMyLogger(name=os.path.basename(__file__), lvl=args.verbose)
@@ -102,26 +117,34 @@ if __name__ == "__main__":
     fss['atreides'] = Nfs4NetApp('', lvl=args.verbose)
     fss['freenas']  = Nfs4FreeNAS('', lvl=args.verbose)
 
-    for id in args.prj_id:
+    pool = ProjectPool(jobs=args.jobs, per_server=args.jobs_per_server, lvl=args.verbose)
+
+    def __del_users__(id):
         p = os.path.join(args.basedir, id)
 
         # switch between netapp and freenas
-        m = re.match('^(freenas|atreides).*', getNfsServer(p))
-        if m.group(1) not in fss.keys():
-            continue
+        m = re.match('^(freenas|atreides).*', pool.server(p))
+        if not m or m.group(1) not in fss.keys():
+            logger.warning('skip project %s on unsupported NFS server: %s' % (id, pool.server(p)))
+            return None
 
-        fs = fss[m.group(1)]
+        fs = fss[m.group(1)].project(p)
         logger.debug('use NFSv4 module: %s' % fs.__class__.__name__)
 
-        fs.project_root = p
-
         if args.subdir:
             # if args.basedir has leading ppath, substitute it with empty string
             p = os.path.join(fs.project_root, re.sub(r'^%s/' % fs.project_root, '', args.subdir))
 
+        out = None
         if os.path.exists(p):
             out = fs.delUsers(re.sub(r'^%s/' % fs.project_root, '', args.subdir), _l_user, recursive=args.recursive, force=args.force, logical=args.logical, batch=args.batch)
             if not out:
                 logger.error('fail to remove %s from project %s.' % (','.join(_l_user), id))
-            elif args.batch:
-                print('batch job for deleting user from ACL submitted: %s' % out)
+        return out
+
+    # projects are processed concurrently, their results are reported in the order of the projects
+    for id, out, err in pool.map(__del_users__, args.prj_id, path=lambda x: os.path.join(args.basedir, x)):
+        if err is not None:
+            logger.error('fail to remove %s from project %s: %s' % (','.join(_l_user), id, err))
+        elif args.batch and out:
+            print('batch job for deleting user from ACL submitted: %s' % out)
@@ -10,8 +10,9 @@ import re
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/external/lib/python')
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from utils.Common import getConfig, getMyLogger
-from utils.acl.Report import printRoleTable
+from utils.acl.Report import getRoleWriter, printRoleEstimate, OUTPUT_FORMATS
 from utils.acl.Nfs4NetApp import Nfs4NetApp
+from utils.ProjectPool import ProjectPool
 
 ## execute the main program
 if __name__ == "__main__":
@@ -48,6 +49,79 @@ if __name__ == "__main__":
                       default = '',
                       help    = 'specify the relative/absolute path to a sub-directory from which the user role is retrieved')
 
+    parg.add_argument('-r','--recursive',
+                      action  = 'store_true',
+                      dest    = 'recursive',
+                      default = False,
+                      help    = 'get roles of all files and sub-directories recursively')
+
+    parg.add_argument('-b','--boundary',
+                      action  = 'store_true',
+                      dest    = 'boundary',
+                      default = False,
+                      help    = 'with -r, only report the paths with roles different from their parent directory, and the number of descendants inheriting the roles')
+
+    parg.add_argument('-s','--sample',
+                      action  = 'store',
+                      dest    = 'sample',
+                      type    = int,
+                      default = 0,
+                      help    = 'estimate the role distribution under the path from the given number of randomly sampled paths, instead of listing the roles')
+
+    parg.add_argument('--sample-time',
+                      action  = 'store',
+                      dest    = 'sample_time',
+                      type    = float,
+                      default = None,
+                      help    = 'stop sampling after the given number of seconds')
+
+    parg.add_argument('-j','--jobs',
+                      action  = 'store',
+                      dest    = 'jobs',
+                      type    = int,
+                      default = 1,
+                      help    = 'number of projects processed concurrently; the output is the same as with a single job')
+
+    parg.add_argument('-t','--threads',
+                      action  = 'store',
+                      dest    = 'threads',
+                      type    = int,
+                      default = 1,
+                      help    = 'with -r, number of threads listing directories and reading ACLs concurrently within a project')
+
+    parg.add_argument('--jobs-per-server',
+                      action  = 'store',
+                      dest    = 'jobs_per_server',
+                      type    = int,
+                      default = 4,
+                      help    = 'maximum number of projects processed concurrently on the same NFS server')
+
+    parg.add_argument('--no-cache',
+                      action  = 'store_true',
+                      dest    = 'no_cache',
+                      default = False,
+                      help    = 'read all ACLs from the file system, bypassing the ACL cache configured by ACL_CACHE_DIR')
+
+    parg.add_argument('-f','--format',
+                      action  = 'store',
+                      dest    = 'format',
+                      choices = OUTPUT_FORMATS,
+                      default = 'table',
+                      help    = 'set the output format; all but the default \'table\' are written while the roles are retrieved')
+
+    parg.add_argument('--widths',
+                      action  = 'store',
+                      dest    = 'widths',
+                      default = None,
+                      help    = 'comma-separated column widths of the \'fixed\' format, e.g. 12,80,30,30,30,30')
+
+    parg.add_argument('--page-size',
+                      action  = 'store',
+                      dest    = 'page_size',
+                      type    = int,
+                      default = 1000,
+                      help    = 'number of rows per page of the \'fixed\' format if no --widths is given')
+
     args = parg.parse_args()
 
     logger = getMyLogger(name=os.path.basename(__file__), lvl=args.verbose)
@@ -55,8 +129,22 @@ if __name__ == "__main__":
     if not args.prj_id:
         args.prj_id = os.listdir(args.basedir)
 
-    roles = {}
-    fs = Nfs4NetApp('', lvl=args.verbose)
+    opts = {}
+    if args.format == 'fixed':
+        opts = {'page_size': args.page_size}
+        if args.widths:
+            opts['widths'] = map(int, args.widths.split(','))
+
+    w = getRoleWriter(args.format, inherited=args.boundary and args.recursive, **opts)
+
+    cache_dir = None
+    if not args.no_cache:
+        cache_dir = cfg.get('PPS', 'ACL_CACHE_DIR') or None
+
+    fs = Nfs4NetApp('', lvl=args.verbose, cache_dir=cache_dir)
+
+    # the projects with the paths to be read
+    prjs = []
     for id in args.prj_id:
         p = os.path.join(args.basedir, id)
 
@@ -80,12 +168,48 @@ if __name__ == "__main__":
         #     logger.error('path not found: %s' % p)
         #     continue
 
-        ## create empty role dict for the project
-        roles[id] = []
-        fs.project_root = p
-
-        for pp in plist:
-            roles[id] += fs.getRoles(re.sub('r^%s/' % fs.project_root, '', pp), recursive=False)
-
-    ## printing or updating project DB database
-    printRoleTable(roles)
+        prjs.append((id, p, plist))
+
+    def __project_roles__(prj_info):
+        # generator of RoleData objects, or RoleEstimate objects in the sampling mode, of a project
+        id, p, plist = prj_info
+        prj = fs.project(p)
+        try:
+            for pp in plist:
+                if args.sample > 0:
+                    yield prj.sampleRoles(re.sub('r^%s/' % prj.project_root, '', pp), samples=args.sample, timeout=args.sample_time)
+                    continue
+
+                for rd in prj.iterRoles(re.sub('r^%s/' % prj.project_root, '', pp), recursive=args.recursive, nthreads=args.threads, boundary=args.boundary):
+                    yield rd
+        finally:
+            prj.closeCache()
+
+    def __output__(id, r):
+        if args.sample > 0:
+            printRoleEstimate(id, r)
+        else:
+            w.write(id, r)
+
+    if args.jobs > 1:
+        # results are written in the order of the projects: those of the project in turn as they are read, those
+        # of the projects started ahead of their turn are held, at most one per job
+        pool = ProjectPool(jobs=args.jobs, per_server=args.jobs_per_server, lvl=args.verbose)
+        for prj_info, rs in pool.stream(__project_roles__, prjs, path=lambda x: x[1], lookahead=args.jobs):
+            while True:
+                try:
+                    r = rs.next()
+                except StopIteration:
+                    break
+                except Exception as err:
+                    logger.error('cannot get roles of project %s: %s' % (prj_info[0], err))
+                    break
+                __output__(prj_info[0], r)
+    else:
+        for prj_info in prjs:
+            for r in __project_roles__(prj_info):
+                __output__(prj_info[0], r)
+
+    ## printing the remaining rows
+    if args.sample <= 0:
+        w.close()
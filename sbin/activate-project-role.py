@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 import sys
 import os 
-from datetime import datetime 
+from datetime import datetime
 from argparse import ArgumentParser
 
 # adding PYTHONPATH for access to utility modules and 3rd-party libraries
@@ -10,7 +10,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
 from utils.Common import getConfig, getMyLogger
 from utils.IMailer import SMTPMailer
 from utils.IStorage import StorageType, createProjectDirectory
-from utils.IProjectDB import getDBConnectInfo, setProjectRoleConfigActions, getProjectRoleConfigActions, updateProjectDatabase, getProjectOwner
+from utils.IProjectDB import getDBConnectInfo, setProjectRoleConfigActions, getProjectRoleConfigActions, getProjectRoleConfigActionsMark, updateProjectDatabase, getProjectMetadata, ProjectDBSession, ActionMarkFile
 from utils.acl.Nfs4NetApp import Nfs4NetApp
 from utils.acl.UserRole import ROLE_ADMIN, ROLE_CONTRIBUTOR, ROLE_USER
 
@@ -55,25 +55,84 @@ if __name__ == "__main__":
                       default = False,
                       help    = 'create project directory with mkdir instead of adding new filer volume for new project')
 
+    parg.add_argument('-m','--mark',
+                      action  = 'store',
+                      dest    = 'mark',
+                      default = cfg.get('PPS','ACTIVATE_MARK_FILE'),
+                      help    = 'set the file keeping the number and the latest creation time of the pending actions left by the previous run; the run stops early if they have not changed since. Empty for always retrieving the pending actions')
+
+    parg.add_argument('--full',
+                      action  = 'store_true',
+                      dest    = 'full',
+                      default = False,
+                      help    = 'retrieve the pending actions even if none has been added since the previous run, e.g. for retrying the actions that failed')
+
+    parg.add_argument('-b','--batch',
+                      action  = 'store',
+                      dest    = 'batch',
+                      type    = int,
+                      default = 100,
+                      help    = 'number of activated actions written to the project database at once; a failing run loses at most one batch')
+
     args = parg.parse_args()
 
     logger = getMyLogger(name=os.path.basename(__file__), lvl=args.verbose)
 
     # project database connection information
     (db_host, db_uid, db_name, db_pass) = getDBConnectInfo(cfg)
-    
+
+    # one database connection for the whole run, statements are timed at the DEBUG level
+    db = ProjectDBSession(db_host, db_uid, db_pass, db_name, timing=args.verbose >= 3, lvl=args.verbose)
+
+    # stop early if the pending actions have not changed since the previous run
+    mark = None
+    if args.mark:
+        mark_file = ActionMarkFile(args.mark, lvl=args.verbose)
+        last = mark_file.load()
+        mark = getProjectRoleConfigActionsMark(lvl=args.verbose, session=db)
+        if mark is not None and (mark[0] == 0 or (not args.full and mark == last)):
+            if mark[0] == 0:
+                logger.info('no pending action')
+            else:
+                logger.info('%d pending actions, the latest created at %s, unchanged since the previous run' % mark)
+            mark_file.save(mark)
+            db.close()
+            sys.exit(0)
+
     # retrieve pending actions
-    actions = getProjectRoleConfigActions(db_host, db_uid, db_pass, db_name, lvl=args.verbose)
+    actions = getProjectRoleConfigActions(lvl=args.verbose, session=db)
 
     if not actions:
         # break the program when no pending actions
         logger.warn('I have nothing to do!')
+        db.close()
         sys.exit(0) 
 
     # re-org actions in projects so that we can perform actions by project
     prjs = list( set(map(lambda x:x.pid, actions)) )
 
 
+    # activated actions not yet written to the project database, and the run summary
+    activated = []
+    unwritten = []
+    stats = {'actions': 0, 'rows': 0, 'batches': 0, 'failed': 0}
+
+    def __flush__():
+        if not activated:
+            return
+        n = setProjectRoleConfigActions(actions=activated, lvl=args.verbose, session=db)
+        if n is None:
+            stats['failed'] += len(activated)
+            unwritten.extend(activated)
+        else:
+            stats['actions'] += len(activated)
+            stats['rows'] += n
+            stats['batches'] += 1
+        del activated[:]
+
+    # owners of the projects initialised by this run, retrieved at once for the notification emails
+    meta = getProjectMetadata(filter(lambda x: not os.path.exists(os.path.join(args.basedir, x)), prjs), lvl=args.verbose, session=db)
+
     fs = Nfs4NetApp('', lvl=args.verbose)
     for pid in prjs:
 
@@ -127,11 +186,11 @@ if __name__ == "__main__":
         logger.info('  |- set %s role: %s' % (ROLE_USER, repr(_l_user)))
 
         rc = True
-        fs.project_root = p_dir
+        prj = fs.project(p_dir)
         if not args.do_test:
             # while initializing the project's ACL, there is no need to set ACL for sub-directories.
             # therefore, the first two arguments of setACE are the same and equal to the project's top directory.
-            rc = fs.setRoles(users=_l_user, contributors=_l_contrib, admins=_l_admin, force=args.force, traverse=False)
+            rc = prj.setRoles(users=_l_user, contributors=_l_contrib, admins=_l_admin, force=args.force, traverse=False)
 
         if rc:
             for a in _set_a:
@@ -148,27 +207,29 @@ if __name__ == "__main__":
         if not args.do_test:
             # while initializing the project's ACL, there is no need to set ACL for sub-directories.
             # therefore, the first two arguments of delACE are the same and equal to the project's top directory.
-            rc = fs.delUsers(users=_l_user, force=args.force)
+            rc = prj.delUsers(users=_l_user, force=args.force)
 
         if rc:
             for a in _del_a:
                 a.atime = datetime.now()
 
-        # update project database on activate roles for this project
-        setProjectRoleConfigActions(db_host, db_uid, db_pass, db_name, actions=filter(lambda x: x.atime, actions), lvl=args.verbose)
+        # activated roles of this project are written to the project database with the current batch
+        activated += filter(lambda x: x.atime, p_actions)
+        if len(activated) >= args.batch:
+            __flush__()
 
         # retrieve the up-to-date user roles for this project
-        roles = {pid: fs.getRoles(recursive=False)}
+        roles = {pid: prj.getRoles(recursive=False)}
 
         # updating project DB database with the currently activated user roles
-        updateProjectDatabase(roles, db_host, db_uid, db_pass, db_name, lvl=args.verbose)
+        updateProjectDatabase(roles, lvl=args.verbose, session=db)
         
         # send email to project owner if it's a creation of the project
-        # - get project owner email
+        # - get project owner email from the metadata retrieved before the loop
         # - compose html email (if isInit is True, notify user the project storage is created)
         # - send via service email account
         if isInit:
-            owner = getProjectOwner(db_host, db_uid, db_pass, db_name, pid, lvl=args.verbose)
+            owner = meta.get(pid)
 
             if owner and owner['email']:
                 smtp_host = cfg.get('MAILER','SMTP_HOST')
@@ -194,3 +255,20 @@ if __name__ == "__main__":
 
             else:
                 logger.warn('project owner (email) unknown: %s %s' % (pid, repr(owner)))
+
+    __flush__()
+    logger.info('%d actions activated in %d batches, %d projectmembers rows updated, %d actions not written' % (stats['actions'], stats['batches'], stats['rows'], stats['failed']))
+
+    # if the retrieved actions are all activated in the database, none of the actions pending at the start of this
+    # run is left; otherwise the mark is removed, so that the next run retries the actions left pending
+    if args.mark:
+        pending = filter(lambda x: not x.atime, actions) + unwritten
+        if pending:
+            logger.info('%d actions left pending, the oldest created at %s' % (len(pending), min(map(lambda x: x.ctime, pending))))
+            mark_file.clear()
+        else:
+            mark_file.save((0, None))
+
+    db.close()
+    if db.timing:
+        logger.debug('%d database statements in %.3f s' % (db.n_statements, db.t_statements))
@@ -46,5 +46,4 @@ if __name__ == "__main__":
 
     fs = Nfs4NetApp('', lvl=args.verbose)
     for id in os.listdir(args.basedir):
-        fs.project_root = os.path.join(args.basedir, id)
-        fs.delUsers(users=args.uid, recursive=False)
+        fs.project(os.path.join(args.basedir, id)).delUsers(users=args.uid, recursive=False)
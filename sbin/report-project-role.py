@@ -2,6 +2,7 @@
 import sys
 import traceback 
 import os
+import time
 from argparse import ArgumentParser
 
 # adding PYTHONPATH for access to utility modules and 3rd-party libraries
@@ -12,6 +13,8 @@ from utils.Common import getConfig, getMyLogger
 from utils.IMailer import SMTPMailer
 from utils.IProjectDB import getDBConnectInfo,updateProjectDatabase
 from utils.acl.Nfs4NetApp import Nfs4NetApp
+from utils.PrincipalIndex import configPrincipalIndex
+from utils.ProjectPool import ProjectPool
 
 # execute the main program
 if __name__ == "__main__":
@@ -42,6 +45,26 @@ if __name__ == "__main__":
                       default = cfg.get('PPS','PROJECT_BASEDIR'),
                       help    = 'set the basedir in which the project storages are located')
 
+    parg.add_argument('--no-cache',
+                      action  = 'store_true',
+                      dest    = 'no_cache',
+                      default = False,
+                      help    = 'read all ACLs from the file system, bypassing the ACL cache configured by ACL_CACHE_DIR')
+
+    parg.add_argument('-j','--jobs',
+                      action  = 'store',
+                      dest    = 'jobs',
+                      type    = int,
+                      default = 8,
+                      help    = 'number of projects whose ACL is read concurrently')
+
+    parg.add_argument('--jobs-per-server',
+                      action  = 'store',
+                      dest    = 'jobs_per_server',
+                      type    = int,
+                      default = 4,
+                      help    = 'maximum number of projects read concurrently on the same NFS server')
+
     args = parg.parse_args()
 
     logger = getMyLogger(name=os.path.basename(__file__), lvl=args.verbose)
@@ -49,17 +72,52 @@ if __name__ == "__main__":
     if not args.pid:
         args.pid = os.listdir(args.basedir)
 
+    # load all users and groups at once, shared with the other nodes via the snapshot file
+    if cfg.get('PPS', 'PRINCIPAL_SNAPSHOT'):
+        configPrincipalIndex(bulk=True, snapshot=cfg.get('PPS', 'PRINCIPAL_SNAPSHOT'), lvl=args.verbose)
+
+    cache_dir = None
+    if not args.no_cache:
+        cache_dir = cfg.get('PPS', 'ACL_CACHE_DIR') or None
+
+    t0 = time.time()
+
+    # read the project ACLs concurrently
+    fs = Nfs4NetApp('', lvl=args.verbose, cache_dir=cache_dir)
+
+    def __get_roles__(id):
+        prj = fs.project(os.path.join(args.basedir, id))
+        try:
+            return prj.getRoles(recursive=False)
+        finally:
+            prj.closeCache()
+
     roles = {}
-    fs = Nfs4NetApp('', lvl=args.verbose)
-    for id in args.pid:
-        fs.project_root = os.path.join(args.basedir, id)
-        roles[id] = fs.getRoles(recursive=False)
+    nfailed = 0
+    pool = ProjectPool(jobs=args.jobs, per_server=args.jobs_per_server, lvl=args.verbose)
+    for id, rd_list, err in pool.map(__get_roles__, args.pid, path=lambda x: os.path.join(args.basedir, x)):
+        if err is not None:
+            logger.error('cannot get roles of project %s: %s' % (id, err))
+            nfailed += 1
+            continue
+
+        roles[id] = rd_list
+
+    t1 = time.time()
+    logger.info('%d projects scanned in %.1f s: %d failed' % (len(args.pid), t1 - t0, nfailed))
+
+    if not roles:
+        logger.info('no project scanned, database not updated')
+        sys.exit(0)
 
-    # updating database
+    # updating database; the rows of the projects are compared with the current ones in the acls table, which
+    # other tools also modify, and only the rows that differ are written
     (db_host, db_uid, db_name, db_pass) = getDBConnectInfo(cfg)
 
     try:
-        updateProjectDatabase(roles, db_host, db_uid, db_pass, db_name, lvl=args.verbose)
+        n = updateProjectDatabase(roles, db_host, db_uid, db_pass, db_name, lvl=args.verbose, sync=True)
+        if n is not None:
+            logger.info('%d projects pushed to database in %.1f s: %d rows changed' % (len(roles), time.time() - t1, n))
     except Exception, e:
 
         exc_type, exc_value, exc_traceback = sys.exc_info()
@@ -8,9 +8,10 @@ import re
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/external/lib/python')
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from utils.Common import getConfig, getMyLogger, csvArgsToList, getNfsServer
+from utils.Common import getConfig, getMyLogger, csvArgsToList
 from utils.acl.Nfs4NetApp import Nfs4NetApp
 from utils.acl.Nfs4FreeNAS import Nfs4FreeNAS
+from utils.ProjectPool import ProjectPool
 
 ## execute the main program
 if __name__ == "__main__":
@@ -101,6 +102,20 @@ if __name__ == "__main__":
 #                      default = False,
 #                      help    = 'create new project directory if it does not exist')
 
+    parg.add_argument('-j','--jobs',
+                      action  = 'store',
+                      dest    = 'jobs',
+                      type    = int,
+                      default = 1,
+                      help    = 'number of projects processed concurrently')
+
+    parg.add_argument('--jobs-per-server',
+                      action  = 'store',
+                      dest    = 'jobs_per_server',
+                      type    = int,
+                      default = 4,
+                      help    = 'maximum number of projects processed concurrently on the same NFS server')
+
     args = parg.parse_args()
 
     logger = getMyLogger(name=os.path.basename(__file__), lvl=args.verbose)
@@ -144,20 +159,20 @@ if __name__ == "__main__":
     fss['atreides'] = Nfs4NetApp('', lvl=args.verbose)
     fss['freenas']  = Nfs4FreeNAS('', lvl=args.verbose)
 
-    for id in args.prj_id:
+    pool = ProjectPool(jobs=args.jobs, per_server=args.jobs_per_server, lvl=args.verbose)
 
+    def __set_roles__(id):
         p = os.path.join(args.basedir, id)
 
         # switch between netapp and freenas
-        m = re.match('^(freenas|atreides).*', getNfsServer(p))
-        if m.group(1) not in fss.keys():
-            continue
+        m = re.match('^(freenas|atreides).*', pool.server(p))
+        if not m or m.group(1) not in fss.keys():
+            logger.warning('skip project %s on unsupported NFS server: %s' % (id, pool.server(p)))
+            return None
 
-        fs = fss[m.group(1)]
+        fs = fss[m.group(1)].project(p)
         logger.debug('use NFSv4 module: %s' % fs.__class__.__name__)
 
-        fs.project_root = p
-
         if args.subdir:
             # if args.basedir has leading ppath, substitute it with empty string
             p = os.path.join(fs.project_root, re.sub(r'^%s/' % fs.project_root, '', args.subdir))
@@ -165,10 +180,15 @@ if __name__ == "__main__":
         if os.path.exists(p):
             logger.info('setting file or directory: %s' % p)
 
-            out = fs.setRoles(re.sub(r'^%s/' % fs.project_root, '', args.subdir), users=_l_user, contributors=_l_contrib,
-                              admins=_l_admin, recursive=args.recursive, force=args.force, traverse=args.traverse, logical=args.logical, batch=args.batch)
-
-            if args.batch and out:
-                print('batch job for setting ACL submitted: %s' % out)
+            return fs.setRoles(re.sub(r'^%s/' % fs.project_root, '', args.subdir), users=_l_user, contributors=_l_contrib,
+                               admins=_l_admin, recursive=args.recursive, force=args.force, traverse=args.traverse, logical=args.logical, batch=args.batch)
         else:
             logger.error('file or directory not found: %s' % p)
+            return None
+
+    # projects are processed concurrently, their results are reported in the order of the projects
+    for id, out, err in pool.map(__set_roles__, args.prj_id, path=lambda x: os.path.join(args.basedir, x)):
+        if err is not None:
+            logger.error('fail to set roles of project %s: %s' % (id, err))
+        elif args.batch and out:
+            print('batch job for setting ACL submitted: %s' % out)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import shutil
+import tempfile
+import getpass
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from utils.acl.Nfs4NetApp import Nfs4NetApp
+from fake_acl import FakeACL, defaultACL
+
+# scaling of the recursive getRoles over a synthetic tree, with a simulated NFS round-trip per ACL read
+ndirs = 40
+nfiles = 50
+latency = 0.002
+
+
+def makeTree(top, ndirs, nfiles):
+    """creates ndirs subject directories with nfiles files each"""
+    for i in range(ndirs):
+        d = os.path.join(top, 'sub-%03d' % i, 'raw')
+        os.makedirs(d)
+        for j in range(nfiles):
+            open(os.path.join(d, 'run-%03d.dat' % j), 'w').close()
+
+
+def slowACL(path):
+    """an ACL read costing one simulated NFS round-trip"""
+    time.sleep(latency)
+    return defaultACL(path, principle='%s@dccn.nl' % getpass.getuser())
+
+
+def summary(roles):
+    return sorted(map(repr, roles))
+
+
+if __name__ == "__main__":
+    top = tempfile.mkdtemp()
+    try:
+        makeTree(top, ndirs, nfiles)
+        with FakeACL(slowACL):
+            fs = Nfs4NetApp(top)
+            # the same output for every number of threads
+            expected = None
+            print '%d paths, %.1f ms per ACL read' % (ndirs * (nfiles + 2) + 1, latency * 1000)
+            for n in [1, 2, 4, 8, 16, 32]:
+                t0 = time.time()
+                roles = fs.getRoles(recursive=True, nthreads=n)
+                dt = time.time() - t0
+
+                if expected is None:
+                    expected = summary(roles)
+                    t1 = dt
+                assert summary(roles) == expected
+
+                print 'nthreads=%-3d %7.2f s  speedup %5.1f' % (n, dt, t1 / dt)
+    finally:
+        shutil.rmtree(top)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import random
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils.acl.ACE import ACE
+from utils.acl.Nfs4NetApp import Nfs4NetApp
+
+# classification of ACE masks into roles, the masks drawn from the roles and a few hand-made variants
+naces = 1000000
+
+
+def setBasedRole(fs, ace):
+    """the role by the symmetric difference of character sets, as done before the bitmask encoding"""
+    diff = {}
+    for r in fs.ROLE_PERMISSION.keys():
+        diff[r] = list(set(list(ace.mask)) ^ set(list(fs.__get_permission__(r)['A'])))
+    return sorted(diff.items(), key=lambda x: len(x[1]))[0][0]
+
+
+if __name__ == "__main__":
+    fs = Nfs4NetApp('/tmp')
+
+    masks = map(lambda r: fs.__get_permission__(r)['A'], fs.ROLE_PERMISSION.keys()) + \
+            ['rwaDdxtTnNcCoy', 'rxtncy', 'rtncy', 'rwadxtTnNcy', 'x', 'rx']
+    rnd = random.Random(1)
+    aces = [ACE(type='A', flag='fd', principle='u@dccn.nl', mask=rnd.choice(masks)) for i in xrange(naces)]
+
+    print '%d ACEs, %d distinct masks' % (naces, len(set(masks)))
+
+    n = naces / 10
+    t0 = time.time()
+    expected = map(lambda a: setBasedRole(fs, a), aces[:n])
+    t = time.time() - t0
+    print '%-10s %8.2f s (%d ACEs, %.2f s extrapolated)' % ('set-based', t, n, t * naces / n)
+
+    t0 = time.time()
+    roles = map(fs.mapACEtoRole, aces)
+    t = time.time() - t0
+    print '%-10s %8.2f s' % ('bitmask', t)
+
+    assert roles[:n] == expected
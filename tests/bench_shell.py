@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils.Shell import Shell
+
+# per-call overhead of utils.Shell with a trivial command
+ncalls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+
+def legacy_cmd1(env, cmd):
+    """the former Shell.cmd1: spawn '/bin/sh -c' writing into a temporary file, poll waitpid every 0.1 second"""
+    soutfile = tempfile.mktemp('.out')
+    pid = os.spawnve(os.P_NOWAIT, '/bin/sh', ['/bin/sh', '-c', '%s > %s 2>&1' % (cmd, soutfile)], env)
+    while 1:
+        wpid, sts = os.waitpid(pid, os.WNOHANG)
+        if wpid != 0:
+            rc = os.WEXITSTATUS(sts)
+            break
+        time.sleep(0.1)
+    output = open(soutfile).read()
+    os.unlink(soutfile)
+    return rc, output
+
+
+def bench(label, f):
+    t0 = time.time()
+    for i in xrange(ncalls):
+        f()
+    dt = time.time() - t0
+    print '%-32s %8.2f ms/call' % (label, dt * 1000. / ncalls)
+
+
+if __name__ == "__main__":
+    s = Shell()
+    print 'running "true" %d times' % ncalls
+    bench('before: spawnve + poll + tempfile', lambda: legacy_cmd1(s.env, 'true'))
+    bench('after: cmd1("true")', lambda: s.cmd1('true'))
+    bench('after: cmd1(["true"])', lambda: s.cmd1(['true']))
+    bench('after: cmd1(["true"], timeout=10)', lambda: s.cmd1(['true'], timeout=10))
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils.acl import Nfs4Xattr
+from utils.acl.ACE import ACE
+
+
+def defaultACL(path, principle='root@dccn.nl', mask='rwaDdxtTnNcCoy'):
+    """the ACL of a path with a single user and the owner, both with full permissions"""
+    return [ACE(type='A', flag='fd', principle=principle, mask=mask),
+            ACE(type='A', flag='fd', principle='OWNER@', mask='rwaDdxtTnNcCoy')]
+
+
+class FakeACL(object):
+    """
+    Replaces Nfs4Xattr.getACL within a with block, so that ACLs are read without an NFSv4 file system.
+    The paths whose ACL is read are recorded, and the original getACL is restored at the end of the block.
+
+    Example:
+
+        with FakeACL(lambda p: defaultACL(p, principle='nobody@dccn.nl')) as acl:
+            Nfs4NetApp(top).getRoles(recursive=True)
+            print len(acl.reads)
+    """
+
+    def __init__(self, func=defaultACL):
+        """
+        :param func: function giving the list of ACE objects of a path
+        """
+        self.func = func
+        self.reads = []
+        self.orig = None
+
+    def __call__(self, path):
+        self.reads.append(path)
+        return self.func(path)
+
+    def __enter__(self):
+        self.orig = Nfs4Xattr.getACL
+        Nfs4Xattr.getACL = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        Nfs4Xattr.getACL = self.orig
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+import sys
+import os
+import pickle
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils.acl.ACE import ACE
+
+
+def test_canonical():
+    a = ACE(type='A', flag='gdf', principle='mri_g@dccn.nl', mask='RX')
+    assert str(a) == 'A:fdg:mri_g@dccn.nl:rxtncy'
+    assert a.__str_no_inheritance__() == 'A:g:mri_g@dccn.nl:rxtncy'
+    assert a.isGroup() and a.isFileInherited() and a.isDirectoryInherited()
+
+    # unknown letters are kept, so that the ACE can still be rejected when it is written
+    assert ACE(type='A', flag='q', principle='OWNER@', mask='rZ').mask == 'rZ'
+
+    assert ACE(principle='OWNER@').isDefaultPrinciple()
+    assert not ACE(principle='OWNER').isDefaultPrinciple()
+    assert not ACE(principle='owner@dccn.nl').isDefaultPrinciple()
+
+
+def test_equality():
+    a = ACE(type='A', flag='fd', principle='u@dccn.nl', mask='xr')
+    b = ACE(type='A', flag='df', principle='u@dccn.nl', mask='rx')
+    c = ACE(type='A', flag='d', principle='u@dccn.nl', mask='rx')
+    assert a == b and not a != b and a != c
+    assert len(set([a, b, c])) == 2
+    assert set([a, c]) - set([b]) == set([c])
+
+    # the canonical form follows changes of the fields
+    c.flag = 'fd'
+    assert c == a and hash(c) == hash(a)
+
+
+def test_pickle():
+    a = ACE(type='A', flag='fdg', principle='mri_g@dccn.nl', mask='rxtncy')
+    for proto in [0, pickle.HIGHEST_PROTOCOL]:
+        b = pickle.loads(pickle.dumps([a], proto))[0]
+        assert b == a and b.isGroup()
+    assert eval(repr(a)) == {'type': 'A', 'flag': 'fdg', 'principle': 'mri_g@dccn.nl', 'mask': 'rxtncy'}
+
+
+if __name__ == "__main__":
+    test_canonical()
+    test_equality()
+    test_pickle()
+    print 'all tests passed'
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from utils.acl.ACE import ACE
+from utils.acl.ACLCache import ACLCache, getACLCache, dumpACL, loadACL
+from utils.acl.Nfs4NetApp import Nfs4NetApp
+from fake_acl import FakeACL, defaultACL
+
+
+def test_serialize():
+    aces = [ACE(type='A', flag='fdg', principle='a:b@dccn.nl', mask='RX'), ACE(type='D', principle='EVERYONE@', mask='w')]
+    assert loadACL(dumpACL(aces)) == aces
+
+
+def test_cache_roles():
+    top = tempfile.mkdtemp()
+    cache_dir = tempfile.mkdtemp()
+    try:
+        for i in range(3):
+            os.makedirs(os.path.join(top, 'sub-%d' % i))
+            for j in range(5):
+                open(os.path.join(top, 'sub-%d' % i, 'f%d' % j), 'w').close()
+        npaths = 1 + 3 * 6
+
+        with FakeACL() as acl:
+            for nthreads in [1, 4]:
+                shutil.rmtree(cache_dir)
+
+                del acl.reads[:]
+                fs = Nfs4NetApp(top, cache_dir=cache_dir)
+                expected = sorted(map(repr, fs.getRoles(recursive=True, nthreads=nthreads)))
+                fs.closeCache()
+                assert len(acl.reads) == npaths
+
+                # another run only reads the path whose ctime has changed
+                time.sleep(0.01)
+                os.chmod(os.path.join(top, 'sub-1', 'f2'), 0600)
+
+                del acl.reads[:]
+                fs = Nfs4NetApp(top, cache_dir=cache_dir)
+                assert sorted(map(repr, fs.getRoles(recursive=True, nthreads=nthreads))) == expected
+                assert fs.acl_cache.hits == npaths - 1
+                fs.closeCache()
+                assert acl.reads == [os.path.join(top, 'sub-1', 'f2')]
+
+                # no cache
+                del acl.reads[:]
+                fs = Nfs4NetApp(top)
+                fs.getRoles(recursive=True, nthreads=nthreads)
+                assert len(acl.reads) == npaths
+    finally:
+        shutil.rmtree(top)
+        shutil.rmtree(cache_dir)
+
+
+def test_evict():
+    d = tempfile.mkdtemp()
+    try:
+        st = os.stat(d)
+        aces = defaultACL(d)
+
+        c = ACLCache(os.path.join(d, 'acl.sqlite'), max_entries=3)
+        for i in range(5):
+            c.put('/p%d' % i, st, aces)
+        assert c.evict() == 2
+        assert c.get('/p0', st) is None and c.get('/p4', st) == aces
+
+        c.max_age = -1
+        assert c.evict() == 3
+        c.close()
+    finally:
+        shutil.rmtree(d)
+
+
+def test_refresh_stamp():
+    d = tempfile.mkdtemp()
+    try:
+        st = os.stat(d)
+        aces = defaultACL(d)
+
+        c = ACLCache(os.path.join(d, 'acl.sqlite'), max_age=3600)
+        c.put('/p0', st, aces)
+        c.put('/p1', st, aces)
+        c.flush()
+        c.db.execute('UPDATE acls SET stamp = ?', (time.time() - 7200,))
+        c.db.commit()
+
+        # an entry in use is kept
+        assert c.get('/p0', st) == aces
+        assert c.evict() == 1
+        assert c.get('/p0', st) == aces and c.get('/p1', st) is None
+        c.close()
+    finally:
+        shutil.rmtree(d)
+
+
+def test_readonly():
+    top = tempfile.mkdtemp()
+    cache_dir = tempfile.mkdtemp()
+    try:
+        st = os.stat(top)
+        aces = defaultACL(top)
+
+        c = ACLCache(os.path.join(cache_dir, 'acl.sqlite'), batch_size=2)
+        c.put('/p0', st, aces)
+        c.flush()
+
+        # writes fail, the cache is disabled instead
+        c.db.execute('PRAGMA query_only = ON')
+        c.put('/p1', st, aces)
+        assert c.enabled
+        c.put('/p2', st, aces)
+        assert not c.enabled
+        assert c.get('/p0', st) is None
+        assert c.evict() == 0
+        c.close()
+
+        # the ACLs are read from the file system
+        for i in range(3):
+            open(os.path.join(top, 'f%d' % i), 'w').close()
+        with FakeACL() as acl:
+            for nthreads in [1, 4]:
+                del acl.reads[:]
+                fs = Nfs4NetApp(top, cache_dir=cache_dir)
+                fs.__get_acl_cache__().batch_size = 2
+                fs.acl_cache.db.execute('PRAGMA query_only = ON')
+                assert len(list(fs.getRoles(recursive=True, nthreads=nthreads))) == 4
+                assert not fs.acl_cache.enabled and fs.__get_acl_cache__() is None
+                fs.closeCache()
+                assert len(acl.reads) == 4
+    finally:
+        shutil.rmtree(top)
+        shutil.rmtree(cache_dir)
+
+
+def test_owner():
+    top = tempfile.mkdtemp()
+    cache_dir = tempfile.mkdtemp()
+    try:
+        getACLCache(cache_dir, top).close()
+        dbfile = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+        assert os.stat(dbfile).st_mode & 0777 == 0600
+
+        # a cache others may write is refused
+        for p, mode in [(dbfile, 0666), (cache_dir, 0777)]:
+            os.chmod(p, mode)
+            try:
+                getACLCache(cache_dir, top)
+                assert False, p
+            except OSError:
+                pass
+
+        with FakeACL() as acl:
+            fs = Nfs4NetApp(top, cache_dir=cache_dir)
+            assert len(list(fs.getRoles(recursive=True))) == 1
+            assert fs.acl_cache is None and fs.cache_dir is None
+            assert len(acl.reads) == 1
+    finally:
+        shutil.rmtree(top)
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == "__main__":
+    test_serialize()
+    test_cache_roles()
+    test_evict()
+    test_refresh_stamp()
+    test_readonly()
+    test_owner()
+    print 'all tests passed'
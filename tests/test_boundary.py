@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+import sys
+import os
+import random
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from utils.acl.ACE import ACE
+from utils.acl.Boundary import iterBoundaries
+from utils.acl.Nfs4NetApp import Nfs4NetApp
+from utils.acl.RoleData import RoleData, makeRoles
+from utils.acl.UserRole import ROLE_ADMIN, ROLE_USER
+from fake_acl import FakeACL, defaultACL
+
+
+def test_iter_boundaries():
+    a = makeRoles({ROLE_ADMIN: ['honlee']})
+    b = makeRoles({ROLE_ADMIN: ['honlee'], ROLE_USER: ['edwger']})
+
+    dirs = set(['/p', '/p/s1', '/p/s2', '/p/s2/raw'])
+    rds = [RoleData('/p/', a), RoleData('/p/f', a),
+           RoleData('/p/s1', a), RoleData('/p/s1/f1', a), RoleData('/p/s1/f2', b),
+           RoleData('/p/s2', b), RoleData('/p/s2/raw', b), RoleData('/p/s2/raw/f', b), RoleData('/p/s2/f', a)]
+
+    expected = [('/p/', 3), ('/p/s1/f2', 0), ('/p/s2', 2), ('/p/s2/f', 0)]
+
+    # the same boundaries regardless of the order in which the roles come
+    for i in range(20):
+        for rd in rds:
+            rd.inherited = 0
+        bs = list(iterBoundaries('/p', rds, dirs))
+        assert map(lambda x: (x.path, x.inherited), bs) == expected, bs
+        random.shuffle(rds)
+
+
+def extraUserACL(path):
+    # an extra user on everything under sub-03
+    aces = defaultACL(path)
+    if '/sub-03' in path:
+        aces.insert(0, ACE(type='A', flag='fd', principle='nobody@dccn.nl', mask='rxtncy'))
+    return aces
+
+
+def test_boundary_mode():
+    top = tempfile.mkdtemp()
+    try:
+        for i in range(5):
+            os.makedirs(os.path.join(top, 'sub-%02d' % i, 'raw'))
+            for j in range(20):
+                open(os.path.join(top, 'sub-%02d' % i, 'raw', 'f%02d' % j), 'w').close()
+
+        with FakeACL(extraUserACL):
+            fs = Nfs4NetApp(top)
+
+            for n in [1, 4]:
+                bs = fs.getRoles(recursive=True, boundary=True, nthreads=n)
+                assert map(lambda x: (os.path.relpath(x.path, top), x.inherited), bs) == [('.', 88), ('sub-03', 21)], bs
+                assert bs[1][ROLE_USER] == ['nobody']
+    finally:
+        shutil.rmtree(top)
+
+
+if __name__ == "__main__":
+    test_iter_boundaries()
+    test_boundary_mode()
+    print 'all tests passed'
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+import sys
+import os
+import shutil
+import tempfile
+import getpass
+import types
+import errno
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from utils.acl import Walker
+from utils.acl.Nfs4NetApp import Nfs4NetApp
+from utils.acl.RoleData import RoleData, makeRoles
+from utils.acl.UserRole import ROLE_ADMIN, ROLE_USER
+
+from fake_acl import FakeACL, defaultACL
+
+
+def userACL(path):
+    return defaultACL(path, principle='%s@dccn.nl' % getpass.getuser())
+
+
+def test_iter_roles():
+    top = tempfile.mkdtemp()
+    try:
+        for i in range(10):
+            os.makedirs(os.path.join(top, 'sub-%02d' % i))
+            for j in range(10):
+                open(os.path.join(top, 'sub-%02d' % i, 'f%02d' % j), 'w').close()
+
+        with FakeACL(userACL) as acl:
+            fs = Nfs4NetApp(top)
+
+            # roles are yielded while the tree is being walked
+            g = fs.iterRoles(recursive=True)
+            assert isinstance(g, types.GeneratorType)
+            r = g.next()
+            assert r.path == os.path.join(top, '')
+            assert len(acl.reads) < 111
+            assert getpass.getuser() in r[ROLE_ADMIN]
+            g.close()
+
+            # getRoles returns the same roles as a list
+            for n in [1, 4]:
+                roles = fs.getRoles(recursive=True, nthreads=n)
+                assert sorted(map(lambda x: x.path, roles)) == sorted(map(lambda x: x.path, fs.iterRoles(recursive=True)))
+                assert len(roles) == 111
+
+            assert map(lambda x: x.path, fs.getRoles('sub-00')) == [os.path.join(top, 'sub-00')]
+
+            # one ACL class, with the roles shared by all paths
+            assert len(fs.acl_classes) == 1
+            assert len(set(map(lambda x: id(x.roles), roles))) == 1
+            assert set(map(lambda x: x.aclid, roles)) == set([0])
+    finally:
+        shutil.rmtree(top)
+
+
+def test_unlistable_dir():
+    top = tempfile.mkdtemp()
+    scandir = Walker.scandir
+
+    def __scandir__(path):
+        if os.path.basename(path) == 'sub-03':
+            raise OSError(errno.EACCES, 'Permission denied', path)
+        return scandir(path)
+
+    try:
+        for i in range(5):
+            os.makedirs(os.path.join(top, 'sub-%02d' % i))
+            for j in range(5):
+                open(os.path.join(top, 'sub-%02d' % i, 'f%02d' % j), 'w').close()
+
+        Walker.scandir = __scandir__
+        fs = Nfs4NetApp(top)
+
+        # the directory that cannot be listed is reported, whatever the number of threads
+        with FakeACL():
+            for n in [1, 4]:
+                paths = map(lambda x: x.path, fs.getRoles(recursive=True, nthreads=n))
+                assert os.path.join(top, 'sub-03') in paths
+                assert len(paths) == 31 - 5
+    finally:
+        Walker.scandir = scandir
+        shutil.rmtree(top)
+
+
+def test_large_dir():
+    top = tempfile.mkdtemp()
+    try:
+        # more entries in a directory than the queues of the threads hold
+        os.makedirs(os.path.join(top, 'flat', 'sub'))
+        for i in range(200):
+            open(os.path.join(top, 'flat', 'f%03d' % i), 'w').close()
+        open(os.path.join(top, 'flat', 'sub', 'f'), 'w').close()
+
+        with FakeACL():
+            fs = Nfs4NetApp(top)
+            serial = sorted(map(lambda x: os.path.normpath(x.path), fs.iterRoles(recursive=True)))
+            assert len(serial) == 204
+            for n, size in [(2, 1), (4, 5)]:
+                paths = map(lambda x: x[0], fs.__nfs4_getfacl_parallel__(top, n, queue_size=size))
+                assert sorted(map(os.path.normpath, paths)) == map(os.path.normpath, serial)
+    finally:
+        shutil.rmtree(top)
+
+
+def test_role_data():
+    a = RoleData(path='/a', roles=makeRoles({ROLE_ADMIN: ['honlee']}), aclid=0)
+    b = RoleData(path='/b', roles=a.roles, aclid=0)
+
+    # modifying the roles of one path does not affect the others sharing them
+    b.addUserToRole(ROLE_USER, 'edwger')
+    b.addUserToRole(ROLE_USER, 'edwger')
+    assert a[ROLE_USER] == [] and b[ROLE_USER] == ['edwger']
+    assert b.aclid is None
+
+    b.removeUserFromRole(ROLE_USER, 'edwger')
+    assert b.roles == a.roles and b != a
+    assert RoleData(path='/a', roles=b.roles) == a
+
+    try:
+        a.owner = 'honlee'
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError('RoleData has no attribute dictionary')
+
+
+if __name__ == "__main__":
+    test_iter_roles()
+    test_unlistable_dir()
+    test_large_dir()
+    test_role_data()
+    print 'all tests passed'
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+import sys
+import os
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils.acl.Nfs4NetApp import Nfs4NetApp
+
+# a fake nfs4_getfacl printing a fixed ACL for every given path, and counting its invocations
+fake_getfacl = """#!/bin/sh
+echo x >> "%s"
+for f in "$@"; do
+    echo "# file: $f"
+    echo "A::$(basename "$f")@dccn.nl:rxtncy"
+    echo "A::OWNER@:rwaDdxtTnNcCoy"
+    echo ""
+done
+"""
+
+
+def test_parse_stream():
+    fs = Nfs4NetApp('')
+    out = ['# file: /project/a/', 'A::OWNER@:rwaDxtTnNcCy', 'A:g:GROUP@:rxtncy', '',
+           '# file: /project/a/b c', 'A::EVERYONE@:rxtncy', '',
+           '# file: /project/a/empty', '']
+
+    acls = list(fs.__parseACLStream__(out))
+    assert map(lambda x: x[0], acls) == ['/project/a/', '/project/a/b c', '/project/a/empty']
+    assert map(lambda x: len(x[1]), acls) == [2, 1, 0]
+    assert acls[1][1][0].principle == 'EVERYONE@'
+
+
+def test_getfacl_batch():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        bindir = os.path.join(tmpdir, 'bin')
+        datadir = os.path.join(tmpdir, 'data')
+        counter = os.path.join(tmpdir, 'count')
+        os.mkdir(bindir)
+        os.mkdir(datadir)
+
+        f = open(os.path.join(bindir, 'nfs4_getfacl'), 'w')
+        f.write(fake_getfacl % counter)
+        f.close()
+        os.chmod(os.path.join(bindir, 'nfs4_getfacl'), 0755)
+        os.environ['PATH'] = '%s:%s' % (bindir, os.environ['PATH'])
+
+        paths = []
+        for i in range(250):
+            paths.append(os.path.join(datadir, 'f %03d' % i))
+            open(paths[-1], 'w').close()
+
+        fs = Nfs4NetApp('', use_xattr=False)
+        acls = list(fs.__nfs4_getfacl_batch__(paths, batch_size=100, nprocs=2))
+
+        assert sorted(map(lambda x: x[0], acls)) == paths
+        for p, aces in acls:
+            assert aces[0].principle == '%s@dccn.nl' % os.path.basename(p)
+
+        # 250 paths in batches of 100
+        assert len(open(counter).readlines()) == 3
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+# a fake nfs4_getfacl holding back the last path until the go file appears, or giving up after 10 seconds
+slow_getfacl = """#!/bin/sh
+n=$#
+for f in "$@"; do
+    n=$((n - 1))
+    if [ $n -eq 0 ]; then
+        i=0
+        while [ ! -e "%(go)s" ]; do
+            i=$((i + 1))
+            [ $i -gt 200 ] && echo timeout > "%(timeout)s" && break
+            sleep 0.05
+        done
+    fi
+    echo "# file: $f"
+    echo "A::OWNER@:rwaDdxtTnNcCoy"
+    echo ""
+done
+"""
+
+
+def test_getfacl_batch_streaming():
+    tmpdir = tempfile.mkdtemp()
+    path = os.environ['PATH']
+    try:
+        bindir = os.path.join(tmpdir, 'bin')
+        datadir = os.path.join(tmpdir, 'data')
+        go = os.path.join(tmpdir, 'go')
+        timeout = os.path.join(tmpdir, 'timeout')
+        os.mkdir(bindir)
+        os.mkdir(datadir)
+
+        f = open(os.path.join(bindir, 'nfs4_getfacl'), 'w')
+        f.write(slow_getfacl % {'go': go, 'timeout': timeout})
+        f.close()
+        os.chmod(os.path.join(bindir, 'nfs4_getfacl'), 0755)
+        os.environ['PATH'] = '%s:%s' % (bindir, path)
+
+        paths = []
+        for i in range(10):
+            paths.append(os.path.join(datadir, 'f%d' % i))
+            open(paths[-1], 'w').close()
+
+        fs = Nfs4NetApp('', use_xattr=False)
+        acls = []
+        for p, aces in fs.__nfs4_getfacl_batch__(paths, batch_size=100, nprocs=1):
+            # the first paths are yielded while nfs4_getfacl is still running
+            open(go, 'w').close()
+            acls.append(p)
+
+        assert not os.path.exists(timeout)
+        assert acls == paths
+    finally:
+        os.environ['PATH'] = path
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    test_parse_stream()
+    test_getfacl_batch()
+    test_getfacl_batch_streaming()
+    print 'all tests passed'
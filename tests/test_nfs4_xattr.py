@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+import sys
+import os
+import re
+import glob
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils.acl.ACE import ACE
+from utils.acl.Nfs4Xattr import decodeACL, encodeACL
+
+# binary system.nfs4_acl values with the corresponding nfs4_getfacl listing
+corpus_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'nfs4_acl')
+
+
+def test_decode_corpus():
+    xdrs = sorted(glob.glob(os.path.join(corpus_dir, '*.xdr')))
+    assert xdrs
+
+    for f in xdrs:
+        aces = decodeACL(open(f, 'rb').read())
+        expected = open(re.sub(r'\.xdr$', '.txt', f)).read().splitlines()
+        assert map(lambda x: x.__str__(), aces) == expected, f
+
+
+def test_decode_truncated():
+    data = open(os.path.join(corpus_dir, 'project_root.xdr'), 'rb').read()
+    for n in [0, 3, 10, 30, len(data) - 4]:
+        try:
+            decodeACL(data[:n])
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('truncated data of %d bytes is decoded' % n)
+
+
+def test_encode_roundtrip():
+    for f in sorted(glob.glob(os.path.join(corpus_dir, '*.xdr'))):
+        data = open(f, 'rb').read()
+        assert encodeACL(decodeACL(data)) == data, f
+
+
+def test_encode_no_inheritance():
+    aces = [ACE(type='A', flag='fdg', principle='mri_g@dccn.nl', mask='RX'),
+            ACE(type='A', flag='fd', principle='OWNER@', mask='rwaDdxtTnNcCoy')]
+
+    aces = decodeACL(encodeACL(aces, inheritance=False))
+    assert map(lambda x: x.__str__(), aces) == ['A:g:mri_g@dccn.nl:rxtncy', 'A::OWNER@:rwaDdxtTnNcCoy']
+
+
+def test_encode_invalid():
+    for ace in [ACE(type='X', flag='', principle='OWNER@', mask='r'),
+                ACE(type='A', flag='q', principle='OWNER@', mask='r'),
+                ACE(type='A', flag='', principle='OWNER@', mask='rZ')]:
+        try:
+            encodeACL([ace])
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('invalid ACE is encoded: %s' % ace)
+
+
+if __name__ == "__main__":
+    test_decode_corpus()
+    test_decode_truncated()
+    test_encode_roundtrip()
+    test_encode_no_inheritance()
+    test_encode_invalid()
+    print 'all tests passed'
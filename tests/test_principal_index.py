@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+import sys
+import os
+import pwd
+import grp
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils import PrincipalIndex as P
+
+lookups = []
+
+
+def fakeGetpwnam(name):
+    lookups.append(name)
+    if name == 'nobody':
+        return pwd.struct_passwd(('nobody', 'x', 99, 99, '', '/', '/sbin/nologin'))
+    raise KeyError(name)
+
+
+def fakeGetpwall():
+    lookups.append('*')
+    return [pwd.struct_passwd(('root', 'x', 0, 0, '', '/root', '/bin/bash'))]
+
+
+def fakeGetgrall():
+    return [grp.struct_group(('root', 'x', 0, []))]
+
+
+def setup_function(f):
+    del lookups[:]
+    P.pwd.getpwnam = fakeGetpwnam
+    P.pwd.getpwall = fakeGetpwall
+    P.grp.getgrall = fakeGetgrall
+
+
+def teardown_function(f):
+    P.pwd.getpwnam = pwd.getpwnam
+    P.pwd.getpwall = pwd.getpwall
+    P.grp.getgrall = grp.getgrall
+
+
+def test_memoized_lookup():
+    idx = P.PrincipalIndex()
+    assert idx.userExist('nobody') and idx.userExist('nobody')
+    assert not idx.userExist('nouser') and not idx.userExist('nouser')
+    assert lookups == ['nobody', 'nouser']
+
+    # the negative answer expires first
+    del lookups[:]
+    idx = P.PrincipalIndex(negative_ttl=-1)
+    for i in range(2):
+        idx.userExist('nobody')
+        idx.userExist('nouser')
+    assert lookups == ['nobody', 'nouser', 'nouser']
+
+
+def test_bulk_snapshot():
+    d = tempfile.mkdtemp()
+    try:
+        snapshot = os.path.join(d, 'principals.json')
+        idx = P.PrincipalIndex(bulk=True, snapshot=snapshot)
+        assert idx.userExist('root') and idx.groupExist('root')
+        assert idx.userExist('nobody')
+        assert lookups == ['*', 'nobody']
+        assert os.path.exists(snapshot)
+
+        # another node reuses the snapshot instead of enumerating the users
+        del lookups[:]
+        idx = P.PrincipalIndex(bulk=True, snapshot=snapshot)
+        assert idx.userExist('root')
+        assert lookups == []
+
+        # an expired snapshot is reloaded
+        idx = P.PrincipalIndex(bulk=True, snapshot=snapshot, ttl=-1)
+        assert idx.userExist('root')
+        assert lookups == ['*']
+    finally:
+        shutil.rmtree(d)
+
+
+if __name__ == "__main__":
+    for t in [test_memoized_lookup, test_bulk_snapshot]:
+        setup_function(t)
+        try:
+            t()
+        finally:
+            teardown_function(t)
+    print 'all tests passed'
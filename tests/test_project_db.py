@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+import sys
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+import utils.IProjectDB as pdb
+from utils.Common import getMyLogger
+from utils.acl.RoleData import RoleData, makeRoles
+from utils.acl.UserRole import ROLE_ADMIN, ROLE_CONTRIBUTOR, ROLE_USER
+
+logger = getMyLogger(lvl=0)
+
+
+class SQLiteCursor:
+    """cursor of an in-memory acls table, taking MySQL-style placeholders"""
+
+    def __init__(self, unique=True, db=None, cnx=None):
+        if db is None:
+            db = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES)
+            db.execute('CREATE TABLE acls (project TEXT, user TEXT, projectRole TEXT%s)' %
+                       (', UNIQUE (project, user)' if unique else ''))
+        self.db = db
+        self.cnx = cnx
+        self.crs = self.db.cursor()
+        self.statements = []
+
+    def execute(self, qry, args=()):
+        if self.cnx is not None and self.cnx.dropped:
+            raise pdb.mdb.OperationalError(msg='Lost connection to MySQL server during query')
+        self.statements.append(qry)
+        if qry == 'SELECT @@max_allowed_packet':
+            qry = 'SELECT 4194304'
+        try:
+            self.crs.execute(qry.replace('%s', '?'), tuple(args or ()))
+        except sqlite3.IntegrityError as e:
+            raise pdb.mdb.IntegrityError(msg=str(e))
+
+    def fetchall(self):
+        return self.crs.fetchall()
+
+    def fetchone(self):
+        return self.crs.fetchone()
+
+    @property
+    def rowcount(self):
+        return self.crs.rowcount
+
+    def close(self):
+        pass
+
+    def rows(self):
+        return set(self.db.execute('SELECT project, user, projectRole FROM acls').fetchall())
+
+
+class SQLiteConnection:
+    """connection to a shared in-memory database, which can be dropped as if by the server"""
+
+    def __init__(self, db):
+        self.db = db
+        self.dropped = False
+        self.closed = False
+
+    def ping(self):
+        if self.dropped:
+            raise pdb.mdb.InterfaceError(msg='MySQL server has gone away')
+
+    def autocommit(self, v):
+        pass
+
+    def cursor(self):
+        return SQLiteCursor(db=self.db, cnx=self)
+
+    def commit(self):
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def close(self):
+        self.closed = True
+
+
+connections = []
+_getMySQLConnector = pdb.__getMySQLConnector__
+
+
+def setup_function(f):
+    db = SQLiteCursor().db
+
+    def __connect__(host, uid, passwd, db_name, lvl=0):
+        connections.append(SQLiteConnection(db))
+        return connections[-1]
+
+    del connections[:]
+    pdb.__getMySQLConnector__ = __connect__
+
+
+def teardown_function(f):
+    pdb.__getMySQLConnector__ = _getMySQLConnector
+
+
+def test_delta():
+    roles = {'p1': [RoleData(path='/p1', roles=makeRoles({ROLE_ADMIN: ['u1'], ROLE_USER: ['u2']}))],
+             'p2': []}
+    rows = pdb.projectRoleRows(roles)
+    assert rows == set([('p1', 'u1', ROLE_ADMIN), ('p1', 'u2', ROLE_USER)])
+
+    ins, dels = pdb.aclsDelta([('p1', 'u1', ROLE_ADMIN), ('p1', 'u2', ROLE_CONTRIBUTOR), ('p2', 'u3', ROLE_USER)], rows)
+    assert ins == [('p1', 'u2', ROLE_USER)]
+    assert dels == [('p1', 'u2', ROLE_CONTRIBUTOR), ('p2', 'u3', ROLE_USER)]
+
+
+def test_chunk_rows():
+    rows = [('p%d' % i, 'user%d' % i, 'viewer') for i in range(1000)]
+    chunks = list(pdb.__chunkRows__(rows, 4096))
+    assert [r for c in chunks for r in c] == rows
+    assert len(chunks) > 1
+    for c in chunks:
+        assert len(('(%s,%s,%s),' * len(c)) % tuple(v for r in c for v in r)) < 4096
+
+    # a row larger than the limit is still sent, on its own
+    assert list(pdb.__chunkRows__([('p', 'u' * 5000, 'viewer'), ('p', 'u', 'viewer')], 4096)) == \
+        [[('p', 'u' * 5000, 'viewer')], [('p', 'u', 'viewer')]]
+
+    assert map(len, pdb.__chunkRows__(rows, 1 << 30, max_rows=300)) == [300, 300, 300, 100]
+
+
+def test_max_statement_size():
+    assert pdb.__getMaxStatementSize__(SQLiteCursor(), logger) == 2097152
+
+    # half of the assumed max_allowed_packet
+    crs = SQLiteCursor()
+    crs.execute = lambda qry, args=(): crs.crs.execute('SELECT @@max_allowed_packet')
+    assert pdb.__getMaxStatementSize__(crs, logger) == 1024 * 1024
+
+
+def test_sync():
+    crs = SQLiteCursor()
+    for r in [('p1', 'u1', ROLE_ADMIN), ('p1', 'u2', ROLE_CONTRIBUTOR), ('p2', 'u3', ROLE_USER), ('p3', 'u4', ROLE_USER)]:
+        crs.execute('INSERT INTO acls VALUES (%s, %s, %s)', r)
+
+    roles = {'p1': [RoleData(path='/p1', roles=makeRoles({ROLE_ADMIN: ['u1'], ROLE_USER: ['u2', 'u5']}))],
+             'p2': []}
+
+    del crs.statements[:]
+    assert pdb.__syncProjectRoles__(crs, roles, logger) == (2, 2)
+    assert crs.rows() == set([('p1', 'u1', ROLE_ADMIN), ('p1', 'u2', ROLE_USER), ('p1', 'u5', ROLE_USER),
+                              ('p3', 'u4', ROLE_USER)])
+
+    # one select, one delete and one insert
+    assert len(filter(lambda x: not x.startswith('SELECT @@'), crs.statements)) == 3
+
+    # nothing changes the second time
+    assert pdb.__syncProjectRoles__(crs, roles, logger) == (0, 0)
+
+
+def test_sync_integrity_error():
+    crs = SQLiteCursor()
+    crs.execute('INSERT INTO acls VALUES (%s, %s, %s)', ('p2', 'u1', ROLE_USER))
+
+    # the second row violates the unique key, the others are inserted
+    roles = {'p1': [RoleData(path='/p1', roles=makeRoles({ROLE_ADMIN: ['u1', 'u2'], ROLE_USER: ['u1']}))]}
+    n_ins, n_del = pdb.__syncProjectRoles__(crs, roles, logger)
+    assert (n_ins, n_del) == (2, 0)
+    assert len(crs.rows()) == 3
+
+
+def test_replace():
+    crs = SQLiteCursor(unique=False)
+    crs.execute('INSERT INTO acls VALUES (%s, %s, %s)', ('p1', 'u1', ROLE_USER))
+    crs.execute('INSERT INTO acls VALUES (%s, %s, %s)', ('p2', 'u3', ROLE_USER))
+
+    roles = {'p1': [RoleData(path='/p1', roles=makeRoles({ROLE_ADMIN: ['u1', 'u2']}))]}
+    assert pdb.__replaceProjectRoles__(crs, roles, logger) == (2, 1)
+    assert crs.rows() == set([('p1', 'u1', ROLE_ADMIN), ('p1', 'u2', ROLE_ADMIN), ('p2', 'u3', ROLE_USER)])
+
+
+def test_session():
+    roles = {'p1': [RoleData(path='/p1', roles=makeRoles({ROLE_ADMIN: ['u1'], ROLE_USER: ['u2']}))]}
+
+    with pdb.ProjectDBSession('h', 'u', 'p', 'db', timing=True) as db:
+        assert pdb.updateProjectDatabase(roles, lvl=0, sync=True, session=db) == 2
+        assert pdb.updateProjectDatabase(roles, lvl=0, sync=True, session=db) == 0
+
+        with db.transaction() as crs:
+            crs.execute('SELECT COUNT(*) FROM acls')
+            assert crs.fetchone() == (2,)
+
+        # one connection for all the calls, the statements are timed
+        assert len(connections) == 1
+        assert db.n_statements > 0
+
+    assert connections[0].closed
+
+    # without a session, every call has its own connection
+    pdb.updateProjectDatabase(roles, 'h', 'u', 'p', 'db', sync=True)
+    assert len(connections) == 2 and connections[1].closed
+
+
+def test_session_rollback():
+    db = pdb.ProjectDBSession('h', 'u', 'p', 'db')
+    try:
+        with db.transaction() as crs:
+            crs.execute('INSERT INTO acls VALUES (%s, %s, %s)', ('p1', 'u1', ROLE_USER))
+            raise ValueError('abort')
+    except ValueError:
+        pass
+
+    with db.transaction() as crs:
+        crs.execute('SELECT COUNT(*) FROM acls')
+        assert crs.fetchone() == (0,)
+    db.close()
+
+
+def test_session_reconnect():
+    db = pdb.ProjectDBSession('h', 'u', 'p', 'db')
+
+    def __count__(crs):
+        crs.execute('SELECT COUNT(*) FROM acls')
+        return crs.fetchone()[0]
+
+    assert db.run(__count__) == 0
+
+    # dropped between two transactions
+    connections[-1].dropped = True
+    assert db.run(__count__) == 0
+    assert len(connections) == 2
+
+    # dropped in the middle of a transaction
+    def __drop__(crs):
+        if len(connections) == 2:
+            connections[-1].dropped = True
+        return __count__(crs)
+
+    assert db.run(__drop__) == 0
+    assert len(connections) == 3
+
+    # not repeated beyond the given retries
+    def __always_drop__(crs):
+        connections[-1].dropped = True
+        return __count__(crs)
+
+    try:
+        db.run(__always_drop__)
+        assert False
+    except pdb.mdb.OperationalError:
+        pass
+    db.close()
+
+
+def test_pending_actions():
+    db = pdb.ProjectDBSession('h', 'u', 'p', 'db')
+    with db.transaction() as crs:
+        crs.execute('CREATE TABLE projects (id TEXT, calculatedProjectSpace INTEGER)')
+        crs.execute('CREATE TABLE projectmembers (user_id TEXT, project_id TEXT, role TEXT, created TIMESTAMP, '
+                    'action TEXT, activated TEXT)')
+
+    assert pdb.getProjectRoleConfigActionsMark(session=db) == (0, None)
+
+    with db.transaction() as crs:
+        for p in [('p1', 10), ('p2', 0)]:
+            crs.execute('INSERT INTO projects VALUES (%s, %s)', p)
+        for a in [('u1', 'p1', ROLE_USER, datetime(2020, 1, 1, 10), 'set', 'no'),
+                  ('u1', 'p1', ROLE_ADMIN, datetime(2020, 1, 2, 10), 'set', 'no'),
+                  ('u1', 'p1', ROLE_CONTRIBUTOR, datetime(2020, 1, 3, 10), 'set', 'yes'),
+                  ('u2', 'p1', ROLE_USER, datetime(2020, 1, 1, 9), 'set', 'no'),
+                  ('u2', 'p1', ROLE_USER, datetime(2020, 1, 1, 9), 'delete', 'no'),
+                  ('u3', 'p2', ROLE_USER, datetime(2020, 1, 4, 10), 'set', 'no')]:
+            crs.execute('INSERT INTO projectmembers VALUES (%s, %s, %s, %s, %s, %s)', a)
+
+    actions = pdb.getProjectRoleConfigActions(session=db)
+    assert map(lambda x: (x.uid, x.pid, x.role), actions) == [('u2', 'p1', ROLE_USER), ('u1', 'p1', ROLE_ADMIN)]
+    assert actions[1].pquota == 10
+
+    # the mark covers the actions on the projects with a quota; SQLite gives MAX() as a string
+    n, t = pdb.getProjectRoleConfigActionsMark(session=db)
+    assert (n, str(t)) == (4, '2020-01-02 10:00:00')
+
+    # and moves once a project gets its quota, even with no new action
+    with db.transaction() as crs:
+        crs.execute('UPDATE projects SET calculatedProjectSpace = 5 WHERE id = %s', ('p2',))
+    n, t = pdb.getProjectRoleConfigActionsMark(session=db)
+    assert (n, str(t)) == (5, '2020-01-04 10:00:00')
+    assert map(lambda x: x.uid, pdb.getProjectRoleConfigActions(session=db)) == ['u2', 'u1', 'u3']
+    db.close()
+
+
+def test_action_mark_file():
+    d = tempfile.mkdtemp()
+    try:
+        f = pdb.ActionMarkFile(os.path.join(d, 'mark'))
+        assert f.load() is None
+
+        for m in [(3, datetime(2020, 1, 2, 10, 0, 0)), (1, datetime(2020, 1, 2, 10, 0, 0, 1234)), (0, None)]:
+            assert f.save(m)
+            assert f.load() == m
+
+        for v in ['garbage', '2020-01-02 10:00:00', '1 garbage']:
+            with open(f.path, 'w') as fh:
+                fh.write(v + '\n')
+            assert f.load() is None
+
+        assert f.clear() and not os.path.exists(f.path) and f.clear()
+    finally:
+        shutil.rmtree(d)
+
+
+class RecordingCursor:
+    """cursor recording the statements, for the statements SQLite does not support"""
+
+    def __init__(self, statements):
+        self.statements = statements
+        self.rowcount = -1
+
+    def execute(self, qry, args=None):
+        self.statements.append((qry, args))
+        self.rowcount = 3 if qry.startswith('UPDATE') else -1
+
+    def fetchone(self):
+        return (1024,)
+
+    def close(self):
+        pass
+
+
+def test_set_actions():
+    statements = []
+    cnx = SQLiteConnection(sqlite3.connect(':memory:'))
+    cnx.cursor = lambda: RecordingCursor(statements)
+    pdb.__getMySQLConnector__ = lambda *args, **kwargs: cnx
+
+    t = datetime(2020, 1, 5, 10)
+    actions = [pdb.ProjectRoleSettingAction(uid='u%d' % i, pid='p1', ctime=datetime(2020, 1, 1, 10), atime=t)
+               for i in range(20)]
+
+    assert pdb.setProjectRoleConfigActions(actions=actions, session=pdb.ProjectDBSession('h', 'u', 'p', 'db')) == 3
+
+    inserts = filter(lambda x: x[0].startswith('INSERT INTO activated_actions'), statements)
+    updates = filter(lambda x: x[0].startswith('UPDATE'), statements)
+
+    # rows chunked to half of max_allowed_packet, one UPDATE for all of them
+    assert len(inserts) > 1
+    assert sorted(zip(*[iter(v for q, args in inserts for v in args)] * 4)) == \
+        sorted(map(lambda a: (a.pid, a.uid, a.ctime, a.atime), actions))
+    assert len(updates) == 1 and 'JOIN activated_actions' in updates[0][0]
+    assert statements[-1][0] == 'DROP TEMPORARY TABLE activated_actions'
+
+    # nothing to write
+    del statements[:]
+    assert pdb.setProjectRoleConfigActions(actions=[], session=pdb.ProjectDBSession('h', 'u', 'p', 'db')) == 0
+    assert statements == []
+
+
+def test_project_metadata():
+    db = pdb.ProjectDBSession('h', 'u', 'p', 'db')
+    with db.transaction() as crs:
+        crs.execute('CREATE TABLE projects (id TEXT, owner_id TEXT, calculatedProjectSpace INTEGER)')
+        crs.execute('CREATE TABLE users (id TEXT, email TEXT, firstName TEXT, lastName TEXT)')
+        for p in [('p1', 'o1', 10), ('p2', 'o2', 20), ('p3', None, 30)]:
+            crs.execute('INSERT INTO projects VALUES (%s, %s, %s)', p)
+        crs.execute('INSERT INTO users VALUES (%s, %s, %s, %s)', ('o1', 'o1@example.org', 'First', 'Owner'))
+
+    # p2 has an owner unknown to the users table, p4 is not a project
+    meta = pdb.getProjectMetadata(['p1', 'p2', 'p3', 'p4', 'p1'], session=db)
+    assert meta == {'p1': {'owner_id': 'o1', 'name': 'First Owner', 'email': 'o1@example.org', 'quota': 10},
+                    'p2': {'owner_id': None, 'name': None, 'email': None, 'quota': 20},
+                    'p3': {'owner_id': None, 'name': None, 'email': None, 'quota': 30}}
+    assert pdb.getProjectMetadata([], session=db) == {}
+
+    assert pdb.getProjectOwner(pid='p1', session=db) == {'name': 'First Owner', 'email': 'o1@example.org'}
+    assert pdb.getProjectOwner(pid='p2', session=db) == {}
+    db.close()
+
+
+if __name__ == "__main__":
+    for t in [test_delta, test_chunk_rows, test_max_statement_size, test_sync, test_sync_integrity_error,
+              test_replace, test_session, test_session_rollback, test_session_reconnect, test_pending_actions,
+              test_action_mark_file, test_set_actions, test_project_metadata]:
+        setup_function(t)
+        try:
+            t()
+        finally:
+            teardown_function(t)
+    print 'all tests passed'
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+import sys
+import os
+import random
+import shutil
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from utils.acl.Nfs4NetApp import Nfs4NetApp
+from utils.acl.UserRole import ROLE_ADMIN, ROLE_CONTRIBUTOR, ROLE_USER
+from fake_acl import FakeACL, defaultACL
+
+# the role of root in a project, by the project number modulo 3
+masks = ['rwaDdxtTnNcCoy', 'rwaDdxtTnNcy', 'rxtncy']
+roles = [ROLE_ADMIN, ROLE_CONTRIBUTOR, ROLE_USER]
+
+
+def projectACL(path):
+    i = int(path.split('/prj-')[1][:2])
+    return defaultACL(path, mask=masks[i % 3])
+
+
+def test_concurrent_projects():
+    top = tempfile.mkdtemp()
+    cache_dir = tempfile.mkdtemp()
+    try:
+        nprjs = 12
+        for i in range(nprjs):
+            for j in range(3):
+                os.makedirs(os.path.join(top, 'prj-%02d' % i, 'sub-%d' % j))
+                for k in range(4):
+                    open(os.path.join(top, 'prj-%02d' % i, 'sub-%d' % j, 'f%d' % k), 'w').close()
+        npaths = 1 + 3 * 5
+
+        with FakeACL(projectACL):
+
+            # one backend object shared by all threads, each operation on a handle of its own
+            fs = Nfs4NetApp('', cache_dir=cache_dir)
+            errors = []
+
+            def __hammer__(seed):
+                rnd = random.Random(seed)
+                try:
+                    for n in range(30):
+                        i = rnd.randrange(nprjs)
+                        root = os.path.join(top, 'prj-%02d' % i)
+                        prj = fs.project(root)
+                        rds = prj.getRoles(recursive=True, nthreads=rnd.choice([1, 2]), boundary=rnd.random() < 0.3)
+                        prj.closeCache()
+
+                        assert prj.project_root == root and fs.project_root == ''
+                        if not rds[0].inherited:
+                            assert len(rds) == npaths, (root, len(rds))
+                        for rd in rds:
+                            assert rd.path.startswith(root + '/') or rd.path == root, (root, rd.path)
+                            assert rd.roles[roles[i % 3]] == frozenset(['root']), (root, rd)
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=__hammer__, args=(s,)) for s in range(16)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            assert not errors, errors
+            assert fs.acl_cache is None
+    finally:
+        shutil.rmtree(top)
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == "__main__":
+    test_concurrent_projects()
+    print 'all tests passed'
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import random
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils.ProjectPool import ProjectPool
+
+resolved = []
+
+
+def fakeServer(path):
+    # projects on three servers, by the project number modulo 3
+    resolved.append(path)
+    return 'filer-%d' % (int(path.split('-')[1]) % 3)
+
+
+def test_map():
+    del resolved[:]
+    prjs = map(lambda i: '/project/prj-%02d' % i, range(30))
+
+    lock = threading.Lock()
+    running = {}
+    peak = {}
+
+    def __work__(p):
+        s = fakeServer(p)
+        lock.acquire()
+        running[s] = running.get(s, 0) + 1
+        peak[s] = max(peak.get(s, 0), running[s])
+        lock.release()
+
+        time.sleep(random.random() * 0.01)
+
+        lock.acquire()
+        running[s] -= 1
+        lock.release()
+
+        if p.endswith('-13'):
+            raise ValueError(p)
+        return p.upper()
+
+    pool = ProjectPool(jobs=8, per_server=2, server=fakeServer)
+    out = list(pool.map(__work__, prjs))
+
+    # results in the order of the projects, whatever the order of completion
+    assert map(lambda x: x[0], out) == prjs
+    for p, r, e in out:
+        if p.endswith('-13'):
+            assert r is None and isinstance(e, ValueError)
+        else:
+            assert r == p.upper() and e is None
+
+    # at most 2 projects at a time on a server, each server resolved once per project by the pool
+    assert max(peak.values()) <= 2
+    assert pool.server(prjs[0]) == 'filer-0'
+    assert len(resolved) == 2 * len(prjs)
+
+
+def test_busy_server():
+    # a saturated server does not hold the workers back from the projects on other servers
+    start = {}
+    end = {}
+
+    def __work__(p):
+        start[p] = time.time()
+        time.sleep(0.2 if p.startswith('a') else 0)
+        end[p] = time.time()
+        return p
+
+    pool = ProjectPool(jobs=2, per_server=1, server=lambda p: p[0])
+    out = list(pool.map(__work__, ['a-0', 'a-1', 'b-0', 'b-1']))
+    assert map(lambda x: x[1], out) == ['a-0', 'a-1', 'b-0', 'b-1']
+    assert end['b-1'] < end['a-0'] and start['a-1'] >= end['a-0']
+
+
+def test_lookahead():
+    prjs = map(lambda i: '/project/prj-%02d' % i, range(20))
+    received = []
+    started = []
+
+    def __work__(p):
+        started.append((prjs.index(p), len(received)))
+        return p
+
+    pool = ProjectPool(jobs=4, per_server=4, server=fakeServer)
+    for p, r, e in pool.map(__work__, prjs, lookahead=2):
+        received.append(p)
+        time.sleep(0.001)
+
+    assert received == prjs
+    assert max(map(lambda x: x[0] - x[1], started)) <= 2
+
+
+def test_stream():
+    consumed = threading.Event()
+    waited = []
+
+    def __work__(p):
+        # the first result of the project in turn reaches the caller while the project is still processed
+        yield p + '/a'
+        if p.endswith('-0'):
+            waited.append(consumed.wait(5))
+        yield p + '/b'
+        if p.endswith('-1'):
+            raise ValueError(p)
+
+    pool = ProjectPool(jobs=2, per_server=1, server=fakeServer)
+    out = []
+    for p, rs in pool.stream(__work__, ['/project/prj-0', '/project/prj-1', '/project/prj-2'], lookahead=1):
+        try:
+            for r in rs:
+                out.append(r)
+                consumed.set()
+        except ValueError as e:
+            out.append(e.args[0])
+
+    assert waited == [True]
+    assert out == ['/project/prj-0/a', '/project/prj-0/b', '/project/prj-1/a', '/project/prj-1/b', '/project/prj-1',
+                   '/project/prj-2/a', '/project/prj-2/b']
+
+
+def test_unresolved():
+    def __server__(p):
+        if p == 'b':
+            raise OSError(p)
+        return p
+
+    out = list(ProjectPool(jobs=2, server=__server__).map(lambda p: p, ['a', 'b', 'c']))
+    assert map(lambda x: x[1], out) == ['a', None, 'c'] and isinstance(out[1][2], OSError)
+
+
+if __name__ == "__main__":
+    test_map()
+    test_busy_server()
+    test_lookahead()
+    test_stream()
+    test_unresolved()
+    print 'all tests passed'
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+import sys
+import os
+import csv
+import json
+from StringIO import StringIO
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils.acl.RoleData import RoleData
+from utils.acl.Report import getRoleWriter
+from utils.acl.UserRole import ROLE_ADMIN, ROLE_CONTRIBUTOR, ROLE_USER
+
+
+def roles():
+    a = RoleData(path='/project/3010000.01/')
+    a.addUserToRole(ROLE_ADMIN, 'honlee')
+    a.addUserToRole(ROLE_USER, 'edwger')
+    a.addUserToRole(ROLE_USER, 'g:mri_g')
+
+    b = RoleData(path='/project/3010000.01/a long sub-directory, with comma')
+    b.addUserToRole(ROLE_CONTRIBUTOR, 'rendbru')
+    return [('3010000.01', a), ('3010000.01', b)]
+
+
+def written(fmt, **kwargs):
+    out = StringIO()
+    w = getRoleWriter(fmt, out=out, **kwargs)
+    for pid, rd in roles():
+        w.write(pid, rd)
+    w.close()
+    return out.getvalue()
+
+
+def test_ndjson():
+    rows = map(json.loads, written('ndjson').splitlines())
+    assert len(rows) == 2
+    assert rows[0]['path'] == '/project/3010000.01/'
+    assert rows[0][ROLE_USER] == ['edwger', 'g:mri_g']
+    assert rows[1][ROLE_ADMIN] == []
+
+
+def test_ndjson_non_utf8():
+    out = StringIO()
+    w = getRoleWriter('ndjson', out=out)
+    w.write('3010000.01', RoleData(path='/project/x/\xe9t\xe9'))
+    w.write('3010000.01', RoleData(path='/project/x/\xc3\xa9t\xc3\xa9'))
+    w.close()
+
+    # the invalid bytes are replaced, the stream goes on
+    rows = map(json.loads, out.getvalue().splitlines())
+    assert rows[0]['path'] == u'/project/x/\ufffdt\ufffd'
+    assert rows[1]['path'] == u'/project/x/\xe9t\xe9'
+
+
+def test_delimited():
+    for fmt, d in [('csv', ','), ('tsv', '\t')]:
+        rows = list(csv.reader(StringIO(written(fmt)), delimiter=d))
+        assert rows[0][:2] == ['project', 'path']
+        assert rows[1][2] == 'honlee'
+        assert rows[2][1] == '/project/3010000.01/a long sub-directory, with comma'
+
+
+def test_fixed_width():
+    # paged: the widths fit the longest value
+    lines = written('fixed', page_size=1).splitlines()
+    assert len(lines) == 5 and lines[2] == ''
+    assert lines[0].startswith('project     path')
+
+    # given widths: values are truncated
+    lines = written('fixed', widths=[10, 20, 10, 10, 10, 10]).splitlines()
+    assert len(lines) == 3
+    assert lines[2].split('  ')[1] == '/project/3010000.01~'
+
+    try:
+        getRoleWriter('fixed', widths=[10])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('invalid widths are accepted')
+
+
+def test_table():
+    out = written('table')
+    assert 'edwger,g:mri_g' in out
+
+
+if __name__ == "__main__":
+    test_ndjson()
+    test_ndjson_non_utf8()
+    test_delimited()
+    test_fixed_width()
+    test_table()
+    print 'all tests passed'
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+import sys
+import os
+import random
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils.acl.ACE import ACE
+from utils.acl.Nfs4NetApp import Nfs4NetApp
+from utils.acl.RoleMask import RoleMaskTable, maskToBits, popcount
+from utils.acl.UserRole import ROLE_ADMIN, ROLE_CONTRIBUTOR, ROLE_TRAVERSE, ROLE_USER
+
+
+def test_permission():
+    fs = Nfs4NetApp('/tmp')
+    for r, p in [(ROLE_ADMIN, 'rwaDdxtTnNcCoy'), (ROLE_CONTRIBUTOR, 'rwaDdxtTnNcy'),
+                 (ROLE_USER, 'rxtncy'), (ROLE_TRAVERSE, 'x')]:
+        perm = fs.__get_permission__(r)
+        assert sorted(perm['A']) == sorted(p)
+        assert sorted(perm['A'] + perm['D']) == sorted(fs.all_permission)
+
+    assert fs.__get_permission__('nosuchrole') == {}
+
+
+def test_classify():
+    fs = Nfs4NetApp('/tmp')
+    assert fs.mapACEtoRole(ACE(type='A', flag='fd', principle='u@dccn.nl', mask='rwaDdxtTnNcCoy')) == ROLE_ADMIN
+    assert fs.mapACEtoRole(ACE(type='A', flag='fd', principle='u@dccn.nl', mask='rwaDdxtTnNcy')) == ROLE_CONTRIBUTOR
+    assert fs.mapACEtoRole(ACE(type='A', flag='fd', principle='u@dccn.nl', mask='rxtncy')) == ROLE_USER
+    assert fs.mapACEtoRole(ACE(type='A', flag='d', principle='u@dccn.nl', mask='x')) == ROLE_TRAVERSE
+
+    # the role is at the same distance as the closest role of the set-based comparison
+    t = fs.role_masks
+    rnd = random.Random(1)
+    for i in range(1000):
+        mask = ''.join(rnd.sample(fs.all_permission, rnd.randint(0, len(fs.all_permission))))
+        d = dict(map(lambda r: (r, len(set(mask) ^ set(t.permission(r)['A']))), t.order))
+        assert d[t.classify(mask)] == min(d.values()), mask
+        assert t.classify(mask) == t.roles[mask]
+
+
+def test_tie():
+    t = RoleMaskTable({'a': 'r', 'b': 'w'}, 'rw', order=['b', 'a'])
+    assert t.classify('') == 'b'
+    assert maskToBits('rZ') == maskToBits('r') and popcount(maskToBits('rwx')) == 3
+
+
+if __name__ == "__main__":
+    test_permission()
+    test_classify()
+    test_tie()
+    print 'all tests passed'
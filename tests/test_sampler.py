@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+import sys
+import os
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from utils.acl.ACE import ACE
+from utils.acl.Nfs4NetApp import Nfs4NetApp
+from utils.acl.Sampler import normalQuantile
+from utils.acl.UserRole import ROLE_ADMIN, ROLE_USER
+from fake_acl import FakeACL, defaultACL
+
+
+def extraUserACL(path):
+    # an extra user on everything under sub-0[0-4]
+    aces = defaultACL(path)
+    if '/sub-0' in path and int(path.split('/sub-0')[1][0]) < 5:
+        aces.insert(0, ACE(type='A', flag='fd', principle='nobody@dccn.nl', mask='rxtncy'))
+    return aces
+
+
+def test_quantile():
+    assert abs(normalQuantile(0.95) - 1.96) < 0.001
+    assert abs(normalQuantile(0.99) - 2.576) < 0.001
+
+
+def test_sample_roles():
+    top = tempfile.mkdtemp()
+    try:
+        # 20 sub-directories, the first 5 with an extra user, of 1 + 1 + 50 paths each; the seed is fixed as
+        # the 95% intervals do not contain the true values for about one seed in twenty
+        for i in range(20):
+            os.makedirs(os.path.join(top, 'sub-%02d' % i, 'raw'))
+            for j in range(50):
+                open(os.path.join(top, 'sub-%02d' % i, 'raw', 'f%02d' % j), 'w').close()
+
+        npaths = 1 + 20 * 52
+        differ = 5 * 52. / npaths
+
+        with FakeACL(extraUserACL) as acl:
+            fs = Nfs4NetApp(top)
+
+            est = fs.sampleRoles(samples=400, seed=2)
+            assert est.samples == 400
+            assert len(acl.reads) == est.distinct < 400
+
+            assert est.npaths[1] <= npaths <= est.npaths[2], est.npaths
+            assert est.differ[1] <= differ <= est.differ[2], est.differ
+            assert est.roles[ROLE_ADMIN]['root'] == (1., 1., 1.)
+            assert est.roles[ROLE_USER]['nobody'][1] <= differ <= est.roles[ROLE_USER]['nobody'][2]
+
+            # the time budget
+            est = fs.sampleRoles(samples=10 ** 9, timeout=0.5, seed=1)
+            assert 0 < est.samples < 10 ** 9 and est.elapsed < 1.5
+    finally:
+        shutil.rmtree(top)
+
+
+if __name__ == "__main__":
+    test_quantile()
+    test_sample_roles()
+    print 'all tests passed'
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+import sys
+import os
+import shutil
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils.acl.ACE import ACE
+from utils.acl.Nfs4NetApp import Nfs4NetApp
+from utils.ProjectPool import ProjectPool
+
+
+def test_shared_lists():
+    top = tempfile.mkdtemp()
+    try:
+        for p in ['a', 'b']:
+            os.makedirs(os.path.join(top, p))
+
+        # u1 is already a viewer of project a, not of project b
+        owner = ACE(type='A', flag='fd', principle='OWNER@', mask='rwaDdxtTnNcCoy')
+        viewer = ACE(type='A', flag='fd', principle='u1@dccn.nl', mask='rxtncy')
+        acls = {os.path.join(top, 'a'): [viewer, owner], os.path.join(top, 'b'): [owner]}
+
+        lock = threading.Lock()
+        set_acls = {}
+
+        def __set_acl__(path, aces, options=None):
+            lock.acquire()
+            set_acls[path.rstrip('/')] = map(lambda x: x.principle, aces)
+            lock.release()
+            return True
+
+        fs = Nfs4NetApp('')
+        users = ['u1', 'u2']
+
+        def __set_roles__(p):
+            prj = fs.project(p)
+            prj.__nfs4_getfacl__ = lambda x: list(acls[x.rstrip('/')])
+            prj.__nfs4_setfacl__ = __set_acl__
+            prj.__userExist__ = lambda u: True
+            return prj.setRoles(users=users)
+
+        for i in range(20):
+            set_acls.clear()
+            pool = ProjectPool(jobs=2, per_server=2, server=lambda p: 'filer')
+            out = list(pool.map(__set_roles__, [os.path.join(top, 'a'), os.path.join(top, 'b')]))
+            assert map(lambda x: (x[1], x[2]), out) == [(True, None), (True, None)]
+
+            # the lists of the caller are left as they are, u1 is set on project b
+            assert users == ['u1', 'u2']
+            assert 'u1@dccn.nl' in set_acls[os.path.join(top, 'b')]
+            assert 'u2@dccn.nl' in set_acls[os.path.join(top, 'a')]
+    finally:
+        shutil.rmtree(top)
+
+
+if __name__ == "__main__":
+    test_shared_lists()
+    print 'all tests passed'
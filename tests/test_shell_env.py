@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+import sys
+import os
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils.Shell import Shell
+
+
+def test_env_cache_environ():
+    os.environ['PPS_TEST_BAR'] = 'rabarbar'
+    os.environ['PPS_TEST_FOO'] = '$PPS_TEST_BAR'
+    try:
+        s1 = Shell()
+        s2 = Shell()
+        assert s1.env['PPS_TEST_FOO'] == 'rabarbar'
+
+        # the snapshot is shared, each Shell gets its own copy
+        assert s1.env == s2.env and s1.env is not s2.env
+        s1.env['PPS_TEST_FOO'] = 'changed'
+        assert Shell().env['PPS_TEST_FOO'] == 'rabarbar'
+
+        # a change of os.environ is picked up
+        os.environ['PPS_TEST_BAR'] = 'other'
+        assert Shell().env['PPS_TEST_FOO'] == 'other'
+    finally:
+        del os.environ['PPS_TEST_BAR']
+        del os.environ['PPS_TEST_FOO']
+
+
+def test_env_cache_setup():
+    d = tempfile.mkdtemp()
+    popen = os.popen
+    calls = []
+
+    def __popen__(cmd, *args):
+        calls.append(cmd)
+        return popen(cmd, *args)
+
+    os.popen = __popen__
+    try:
+        setup = os.path.join(d, 'setup.sh')
+        with open(setup, 'w') as f:
+            f.write('export PPS_TEST_SETUP=$1\n')
+
+        s1 = Shell(setup, ['a'])
+        s2 = Shell(setup, ['a'])
+        Shell(setup, ['b'])
+        assert s1.env == s2.env and s1.env is not s2.env
+
+        # the script is sourced once per distinct arguments
+        assert len(calls) == 2
+    finally:
+        os.popen = popen
+        shutil.rmtree(d)
+
+
+def test_env_cache_dir():
+    d = tempfile.mkdtemp()
+    popen = os.popen
+    calls = []
+
+    def __popen__(cmd, *args):
+        calls.append(cmd)
+        return popen(cmd, *args)
+
+    def __shell__():
+        # a new process, with an empty process-wide cache
+        Shell.env_cache.clear()
+        return Shell(setup, ['a'], cache_dir=cache_dir)
+
+    os.popen = __popen__
+    try:
+        setup = os.path.join(d, 'setup.sh')
+        cache_dir = os.path.join(d, 'cache')
+        with open(setup, 'w') as f:
+            f.write('export PPS_TEST_SETUP=$1\n')
+
+        env = __shell__().env
+        assert len(calls) == 1
+        assert os.stat(cache_dir).st_mode & 0777 == 0700
+        cache_file = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+        assert os.stat(cache_file).st_mode & 0777 == 0600
+
+        # the environment is loaded from the file by the next process
+        assert __shell__().env == env and len(calls) == 1
+        assert all(map(lambda x: type(x[0]) is str and type(x[1]) is str, env.iteritems()))
+
+        # until the setup script is modified
+        os.utime(setup, (0, 0))
+        assert __shell__().env == env and len(calls) == 2
+
+        # a file others may write is ignored
+        os.chmod(cache_file, 0666)
+        __shell__()
+        assert len(calls) == 3
+    finally:
+        os.popen = popen
+        Shell.env_cache.clear()
+        shutil.rmtree(d)
+
+
+if __name__ == "__main__":
+    test_env_cache_environ()
+    test_env_cache_setup()
+    test_env_cache_dir()
+    print 'all tests passed'
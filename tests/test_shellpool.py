@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils.ShellPool import ShellPool
+from utils.Shell import Shell
+
+
+def test_completion_order():
+    pool = ShellPool(max_workers=3)
+    fs = map(lambda i: pool.submit(['sh', '-c', 'sleep %.1f; echo %d' % (0.1 * (3 - i), i)], tag=i), range(3))
+
+    assert map(lambda f: f.tag, pool.as_completed(fs)) == [2, 1, 0]
+    assert map(lambda f: f.result()[1], fs) == ['0\n', '1\n', '2\n']
+
+
+def test_concurrency_limit():
+    pool = ShellPool(max_workers=4)
+    t0 = time.time()
+    rslt = pool.map(map(lambda i: ['sleep', '0.2'], range(8)))
+    dt = time.time() - t0
+
+    assert map(lambda x: x[0], rslt) == [0] * 8
+    # two rounds of four concurrent commands
+    assert 0.4 <= dt < 0.8, dt
+
+
+def test_timeout():
+    pool = ShellPool(max_workers=2)
+    f = pool.submit('sleep 10', timeout=0.2)
+    g = pool.submit(['no_such_command_for_shellpool'])
+    h = pool.submit('echo done')
+
+    assert f.result()[0] < 0
+    assert g.result()[0] == 127 and not g.result()[2]
+    assert h.result() == (0, 'done\n', True)
+
+
+def test_no_inherited_pipes():
+    s = Shell()
+    p1 = s.spawn(['sleep', '1'])
+    try:
+        # the pipe of a running command is not inherited by the commands spawned after it
+        rc, out, m = s.cmd1(['ls', '-l', '/proc/self/fd/'])
+        assert rc == 0
+        assert 'pipe:[%d]' % os.fstat(p1.proc.stdout.fileno()).st_ino not in out, out
+
+        # and the output file of cmd is not either
+        d = tempfile.mkdtemp()
+        f = open(os.path.join(d, 'out'), 'w')
+        try:
+            p2 = s.spawn(['sleep', '1'], stdout=f)
+            rc, out, m = s.cmd1(['ls', '-iL', '/proc/self/fd/'])
+            assert rc == 0 and str(os.fstat(f.fileno()).st_ino) not in map(lambda x: x.split()[0], out.splitlines()), out
+            p2.proc.kill()
+            p2.proc.wait()
+        finally:
+            f.close()
+            shutil.rmtree(d)
+    finally:
+        p1.proc.kill()
+        p1.proc.wait()
+
+if __name__ == "__main__":
+    test_completion_order()
+    test_concurrency_limit()
+    test_timeout()
+    test_no_inherited_pipes()
+    print 'all tests passed'
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+import sys
+import os
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils.acl.ACE import ACE
+from utils.acl.Nfs4NetApp import Nfs4NetApp
+
+
+def traverseFs(top, aces):
+    """an Nfs4NetApp on top whose ACLs are aces on every path, recording the ACLs that are set"""
+    fs = Nfs4NetApp(top)
+    fs.set = []
+    fs.__nfs4_getfacl__ = lambda p: map(lambda x: ACE(type=x.type, flag=x.flag, principle=x.principle, mask=x.mask), aces)
+    fs.__nfs4_setfacl__ = lambda p, a, o=None: fs.set.append((p, fs.__curateACE__(a))) or True
+    fs.__userExist__ = lambda u: True
+    return fs
+
+
+def test_traverse_role():
+    top = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(top, 'a', 'b'))
+
+        # users already in the ACL, which is curated: nothing to set
+        aces = [ACE(type='A', flag='d', principle='u1@dccn.nl', mask='x'),
+                ACE(type='A', flag='fd', principle='OWNER@', mask='rwaDdxtTnNcCoy')]
+        fs = traverseFs(top, aces)
+        assert fs.__set_traverse_role__('a/b', ['u1'])
+        assert fs.set == []
+
+        # users already in the ACL, which is not curated: the curated ACL is set on every level
+        aces[1] = ACE(type='A', flag='', principle='OWNER@', mask='rwaDdxtTnNcCoy')
+        fs = traverseFs(top, aces)
+        assert fs.__set_traverse_role__('a/b', ['u1'])
+        assert len(fs.set) == 3
+        assert all(map(lambda x: x[1][1].flag == 'fd', fs.set))
+
+        # a new user is added on every level
+        fs = traverseFs(top, aces[:1])
+        assert fs.__set_traverse_role__('a/b', ['u2'])
+        assert len(fs.set) == 3
+        assert all(map(lambda x: x[1][0].principle == 'u2@dccn.nl', fs.set))
+    finally:
+        shutil.rmtree(top)
+
+
+if __name__ == "__main__":
+    test_traverse_role()
+    print 'all tests passed'
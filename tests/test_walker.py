@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+import sys
+import os
+import shutil
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../external/lib/python')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+from utils.acl.Walker import Walker, scandir, DT_DIR
+
+
+def make_tree():
+    top = tempfile.mkdtemp()
+    for d in ['a', 'a/b', 'a/b/c', 'd', '.snapshot', '.snapshot/hourly.0']:
+        os.mkdir(os.path.join(top, d))
+    for f in ['f0', 'a/f1', 'a/b/f2', 'a/b/c/f3', 'd/f4', '.snapshot/hourly.0/f0', '.setacl_lock']:
+        open(os.path.join(top, f), 'w').close()
+
+    os.symlink('f0', os.path.join(top, 'd/link_to_file'))
+    os.symlink('../a', os.path.join(top, 'd/link_to_dir'))
+    os.symlink('..', os.path.join(top, 'a/b/c/loop'))
+    os.symlink('nowhere', os.path.join(top, 'd/dangling'))
+    return top
+
+
+def rel(top, entries):
+    return sorted(map(lambda x: (os.path.relpath(x[0], top), x[1]), entries))
+
+
+def test_scandir():
+    top = make_tree()
+    try:
+        es = dict(scandir(top))
+        assert sorted(es.keys()) == ['.setacl_lock', '.snapshot', 'a', 'd', 'f0']
+        assert es['a'] == DT_DIR
+    finally:
+        shutil.rmtree(top)
+
+
+def test_walk():
+    top = make_tree()
+    try:
+        es = list(Walker().walk(top))
+
+        # same entries as os.walk, minus the excluded ones
+        expected = []
+        for r, ds, fs in os.walk(top):
+            ds[:] = filter(lambda x: x != '.snapshot', ds)
+            expected.append((r, True))
+            expected += map(lambda x: (os.path.join(r, x), False), filter(lambda x: x != '.setacl_lock', fs))
+
+        assert rel(top, es) == rel(top, expected)
+
+        # a directory is reported before its content
+        seen = set()
+        for p, isdir in es:
+            assert p == top or os.path.dirname(p) in seen, p
+            if isdir:
+                seen.add(p)
+    finally:
+        shutil.rmtree(top)
+
+
+def test_maxdepth():
+    top = make_tree()
+    try:
+        assert rel(top, Walker(maxdepth=0).walk(top)) == [('.', True)]
+        assert rel(top, Walker(maxdepth=1).walk(top)) == [('.', True), ('a', True), ('d', True), ('f0', False)]
+    finally:
+        shutil.rmtree(top)
+
+
+def test_followlinks():
+    top = make_tree()
+    try:
+        es = rel(top, Walker(followlinks=True).walk(top))
+        ds = map(lambda x: x[0], filter(lambda x: x[1], es))
+
+        # every directory is visited once, regardless the loop and the second link to 'a'
+        assert ds == ['.', 'a', 'a/b', 'a/b/c', 'd']
+        assert ('a/b/c/loop', True) not in es
+        assert ('d/dangling', False) in es
+    finally:
+        shutil.rmtree(top)
+
+
+def test_parallel():
+    top = make_tree()
+    try:
+        for i in range(20):
+            os.makedirs(os.path.join(top, 'wide', 'd%02d' % i, 'sub'))
+            open(os.path.join(top, 'wide', 'd%02d' % i, 'sub', 'f'), 'w').close()
+
+        for followlinks in [False, True]:
+            serial = rel(top, Walker(followlinks=followlinks).walk(top))
+            parallel = rel(top, Walker(followlinks=followlinks, nthreads=4).walk(top))
+            assert serial == parallel
+
+        # stop consuming half-way, no worker is left behind
+        g = Walker(nthreads=4).walk(top)
+        g.next()
+        g.close()
+        assert not filter(lambda x: x.name.startswith('Walker_worker_'), threading.enumerate())
+    finally:
+        shutil.rmtree(top)
+
+
+def test_onerror():
+    errors = []
+    assert list(Walker(onerror=errors.append).walk('/nonexisting/dir')) == [('/nonexisting/dir', True)]
+    assert len(errors) == 1
+
+
+if __name__ == "__main__":
+    test_scandir()
+    test_walk()
+    test_maxdepth()
+    test_followlinks()
+    test_parallel()
+    test_onerror()
+    print 'all tests passed'
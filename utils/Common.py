@@ -15,6 +15,7 @@ import pwd
 
 from colorlog import ColoredFormatter
 from utils.Shell import Shell
+from utils.PrincipalIndex import getPrincipalIndex
 
 lc_formatter = ColoredFormatter(
         "%(log_color)s[%(levelname)-8s:%(name)s] %(message)s%(reset)s",
@@ -41,7 +42,7 @@ def getNfsServer(path):
     if os.path.exists(p):
         s = Shell()
         # determin which fs module should be loaded
-        cmd = 'findmnt --target "%s" --output SOURCE -n' % p
+        cmd = ['findmnt', '--target', p, '--output', 'SOURCE', '-n']
         rc, out, m = s.cmd1(cmd, timeout=None)
         if rc == 0:
             return out.split(':')[0]
@@ -64,6 +65,12 @@ def getConfig(config_file='config.ini'):
         'PDB_PASSWORD'     : '',
         'PDB_HOST'         : '',
         'PDB_DATABASE'     : '',
+        # Snapshot file of the system users and groups, shared by cron jobs
+        'PRINCIPAL_SNAPSHOT': '',
+        # Directory of the persistent ACL caches of the projects
+        'ACL_CACHE_DIR'    : '',
+        # Number and latest creation time of the pending actions left by the previous run of activate-project-role.py
+        'ACTIVATE_MARK_FILE': '',
         # Email notification
         'SMTP_HOST'         : 'localhost',
         'SMTP_PORT'         : 25,
@@ -80,13 +87,7 @@ def getConfig(config_file='config.ini'):
 
 def userExist(username):
     '''check if given user name is existing as a system user id'''
-    ick = False
-    try:
-        pwd.getpwnam(username)
-        ick = True
-    except KeyError,e:
-        pass
-    return ick
+    return getPrincipalIndex().userExist(username)
 
 def gzipContent(content):
     out = StringIO.StringIO()
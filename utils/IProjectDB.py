@@ -1,7 +1,13 @@
 #!/usr/bin/env python
+import os
 import sys
+import time
+import errno
 import getpass
 import pprint
+import tempfile
+from datetime import datetime
+from contextlib import contextmanager
 
 from utils.Common import getMyLogger
 from utils.acl.UserRole import PROJECT_ROLES
@@ -68,143 +74,364 @@ def getDBConnectInfo(cfg):
 
     return (db_host, db_uid, db_name, db_pass)
 
-def setProjectRoleConfigActions(db_host, db_uid, db_pass, db_name, actions=[], lvl=0):
-    '''set configuration actions in the project database as activated
+class ProjectDBSession:
     '''
-    logger = getMyLogger(lvl=lvl)
- 
-    if not mdb:
-        logger.error('No MySQL library available.  Function disabled.')
-    else:
-        ## TODO: make connection to MySQL, prepare and execute SQL statement
-        cnx = __getMySQLConnector__(db_host, db_uid, db_pass, db_name, lvl=lvl)
+    Session on the project database, keeping one connection for the functions of this module so that a
+    script does not connect to the database for every query.
+
+    Every transaction starts with a check of the connection, which is re-established if the server has
+    dropped it.  A transaction given to run is repeated on a new connection if the connection is lost in
+    the middle of it.  With timing, every statement is logged with the time it took.
+
+    Example:
+
+        (db_host, db_uid, db_name, db_pass) = getDBConnectInfo(cfg)
+        with ProjectDBSession(db_host, db_uid, db_pass, db_name) as db:
+            actions = getProjectRoleConfigActions(session=db)
+            with db.transaction() as crs:
+                crs.execute('SELECT id FROM projects')
+    '''
+
+    def __init__(self, db_host, db_uid, db_pass, db_name, retries=1, timing=False, lvl=0):
+        '''
+        :param db_host: the database host
+        :param db_uid: the database user
+        :param db_pass: the password of the database user
+        :param db_name: the database name
+        :param retries: number of times a lost connection is re-established within a transaction
+        :param timing: log every statement with the time it took
+        :param lvl: logging level
+        '''
+        self.db_host = db_host
+        self.db_uid = db_uid
+        self.db_pass = db_pass
+        self.db_name = db_name
+        self.retries = retries
+        self.timing = timing
+        self.lvl = lvl
+        self.logger = getMyLogger(name=self.__class__.__name__, lvl=lvl)
+
+        self.cnx = None
+
+        # number of statements executed and the seconds they took, with timing
+        self.n_statements = 0
+        self.t_statements = 0.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def connect(self):
+        '''
+        makes sure the session is connected, re-establishing a connection dropped by the server
+        :return: the connection
+        '''
+        if self.cnx is not None:
+            if self.__alive__():
+                return self.cnx
+            self.logger.warning('Project DB connection lost, reconnecting')
+            self.close()
+
+        cnx = __getMySQLConnector__(self.db_host, self.db_uid, self.db_pass, self.db_name, lvl=self.lvl)
         if not cnx:
-            logger.error('Project DB connection failed')
-            return
-        else:
-            crs = None
+            raise mdb.InterfaceError('Project DB connection failed')
 
+        try:
+            ## in this case, we are using MySQLdb
+            ##  - disable autocommit that is by default enabled in MySQLdb package
+            cnx.autocommit(False)
+        except Exception:
+            ## in this case, we are using mysql.connector
+            ##  - the mysql.connector doesn't have the autocommit function;
+            ##    but the transaction is enabled by default, and autocommit set to False.
+            ##  - we set autocommit to False anyway.
+            cnx.autocommit = False
+
+        self.cnx = cnx
+        return cnx
+
+    @contextmanager
+    def transaction(self):
+        '''
+        context manager of a transaction, committed at the end of the block, or rolled back if the block
+        raises an exception
+        :return: the cursor of the transaction
+        '''
+        cnx = self.connect()
+        crs = __SessionCursor__(self, cnx.cursor())
+        try:
+            yield crs
+            ## commit the transaction if everything is fine
+            cnx.commit()
+        except Exception:
+            ## something wrong, rollback the queries
             try:
-                ## in this case, we are using MySQLdb 
-                ##  - disable autocommit that is by default enabled in MySQLdb package
-                cnx.autocommit(False)
-            except Exception:
-                ## in this case, we are using mysql.connector
-                ##  - the mysql.connector doesn't have the autocommit function;
-                ##    but the transaction is enabled by default, and autocommit set to False.
-                ##  - we set autocommit to False anyway.
-                cnx.autocommit = False
+                cnx.rollback()
+            except Exception, e_ignore:
+                self.logger.exception('Project DB rollback failed')
+            raise
+        finally:
+            ## close db cursor
+            try:
+                crs.close()
+            except Exception, e:
+                pass
 
+    def run(self, func, *args, **kwargs):
+        '''
+        runs a function in a transaction, repeated on a new connection if the connection is lost
+        :param func: the function, called with the cursor of the transaction followed by args and kwargs
+        :return: the return value of func
+        '''
+        n = 0
+        while True:
             try:
-                ## get the db cursor
-                crs = cnx.cursor()
-            
-                ## select actions that are not activted 
-                qry = 'UPDATE projectmembers SET activated=\'yes\',updated=%s WHERE project_id=%s AND user_id=%s AND created<=%s'
-                data = []
+                with self.transaction() as crs:
+                    return func(crs, *args, **kwargs)
+            except (mdb.OperationalError, mdb.InterfaceError), e:
+                ## errors other than a lost connection, e.g. a lock wait timeout, are not retried
+                if n >= self.retries or self.cnx is None or self.__alive__():
+                    raise
+                n += 1
+                self.logger.warning('Project DB connection lost, retrying the transaction: %s' % e)
+                self.close()
+
+    def close(self):
+        '''
+        closes the connection; the next transaction opens a new one
+        :return:
+        '''
+        if self.cnx is not None:
+            ## close db connection
+            try:
+                self.cnx.close()
+            except Exception, e:
+                pass
+            self.cnx = None
 
-                for a in actions:
-                    data.append( (a.atime,a.pid,a.uid,a.ctime) )
+    def __alive__(self):
+        try:
+            self.cnx.ping()
+            return True
+        except Exception:
+            return False
 
-                ## execute queries via the db cursor, transaction *shoud be* enabled by default
-                if data:
-                    for d in data:
-                        logger.debug(qry % d)
-                    crs.executemany(qry, data)
+class __SessionCursor__:
+    '''cursor of a ProjectDBSession, timing the statements if the session asks for it'''
 
-                ## commit the transaction if everything is fine
-                cnx.commit()
+    def __init__(self, session, crs):
+        self.session = session
+        self.crs = crs
 
-            except Exception, e:
-                logger.exception('Project DB update failed')
-                try:
-                    cnx.rollback()
-                except Exception, e:
-                    logger.exception('Project DB rollback failed')
-            else:
-                ## everything is fine
-                logger.info('Project DB update succeeded')
-            finally:
-                ## close db cursor
-                try:
-                    crs.close()
-                except Exception, e:
-                    pass
+    def __getattr__(self, name):
+        return getattr(self.crs, name)
 
-                ## close db connection
+    def __iter__(self):
+        return iter(self.crs)
+
+    def execute(self, qry, args=None):
+        return self.__timed__(self.crs.execute, qry, args)
+
+    def executemany(self, qry, args):
+        return self.__timed__(self.crs.executemany, qry, args)
+
+    def __timed__(self, f, qry, args):
+        if not self.session.timing:
+            return f(qry, args)
+
+        t0 = time.time()
+        try:
+            return f(qry, args)
+        finally:
+            dt = time.time() - t0
+            self.session.n_statements += 1
+            self.session.t_statements += dt
+            self.session.logger.debug('%.3f s: %s' % (dt, qry if len(qry) <= 200 else qry[:200] + ' ...'))
+
+class ActionMarkFile:
+    '''
+    File keeping the mark of the pending actions left by the previous run of the activation, see
+    getProjectRoleConfigActionsMark, so that a run can stop early when the pending actions have not changed since.
+
+    Example:
+
+        f = ActionMarkFile('/var/lib/pps/activate-project-role.mark')
+        last = f.load()
+        mark = getProjectRoleConfigActionsMark(session=db)
+        if mark == last:
+            sys.exit(0)
+        ...
+        f.save((0, None))
+    '''
+
+    FORMATS = ['%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S']
+
+    def __init__(self, path, lvl=0):
+        '''
+        :param path: path of the mark file
+        :param lvl: logging level
+        '''
+        self.path = path
+        self.logger = getMyLogger(name=self.__class__.__name__, lvl=lvl)
+
+    def load(self):
+        '''
+        loads the mark of the previous run
+        :return: the (count, created) tuple, or None if the file is missing or invalid
+        '''
+        try:
+            with open(self.path) as f:
+                v = f.read().strip()
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                self.logger.warning('cannot read action mark %s: %s' % (self.path, e))
+            return None
+
+        try:
+            n, t = v.split(' ', 1)
+            if t == 'None':
+                return (int(n), None)
+            for fmt in self.FORMATS:
                 try:
-                    cnx.close()
-                except Exception, e:
+                    return (int(n), datetime.strptime(t, fmt))
+                except ValueError:
                     pass
+        except ValueError:
+            pass
 
-def getProjectRoleConfigActions(db_host, db_uid, db_pass, db_name, lvl=0):
-    '''retrieve pending configuration actions in the project database
-    '''
+        self.logger.warning('invalid action mark in %s: %s' % (self.path, v))
+        return None
 
+    def save(self, mark):
+        '''
+        saves the mark, via a temporary file renamed into place
+        :param mark: the (count, created) tuple
+        :return: True in success, otherwise False
+        '''
+        d = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmp = tempfile.mkstemp(dir=d, prefix='.action_mark_')
+            with os.fdopen(fd, 'w') as f:
+                f.write('%d %s\n' % mark)
+            os.rename(tmp, self.path)
+            return True
+        except (IOError, OSError) as e:
+            self.logger.error('cannot write action mark %s: %s' % (self.path, e))
+            return False
+
+    def clear(self):
+        '''
+        removes the mark, so that the next run retrieves the pending actions
+        :return: True in success, otherwise False
+        '''
+        try:
+            os.unlink(self.path)
+            return True
+        except (IOError, OSError) as e:
+            if e.errno == errno.ENOENT:
+                return True
+            self.logger.error('cannot remove action mark %s: %s' % (self.path, e))
+            return False
+
+def setProjectRoleConfigActions(db_host=None, db_uid=None, db_pass=None, db_name=None, actions=[], lvl=0, session=None):
+    '''set configuration actions in the project database as activated
+
+       the actions are written into a temporary table, which is joined with projectmembers in a single UPDATE.
+
+       :param actions: the activated ProjectRoleSettingAction objects, with atime set
+       :param session: the ProjectDBSession to use instead of a new connection
+       :return: the number of updated projectmembers rows, or None if the update failed
+    '''
     logger = getMyLogger(lvl=lvl)
- 
-    actions=[]
 
     if not mdb:
         logger.error('No MySQL library available.  Function disabled.')
+        return
+
+    data = sorted(set(map(lambda a: (a.pid, a.uid, a.ctime, a.atime), actions)))
+
+    def __update__(crs):
+        if not data:
+            return 0
+
+        ## the temporary table is only visible to this connection, and is dropped with it;
+        ## the columns are copied from projectmembers
+        crs.execute('DROP TEMPORARY TABLE IF EXISTS activated_actions')
+        crs.execute('CREATE TEMPORARY TABLE activated_actions SELECT project_id, user_id, created, updated FROM projectmembers LIMIT 0')
+
+        qry = 'INSERT INTO activated_actions (project_id, user_id, created, updated) VALUES '
+        for rows in __chunkRows__(data, __getMaxStatementSize__(crs, logger)):
+            crs.execute(qry + ','.join(['(%s, %s, %s, %s)'] * len(rows)), [v for r in rows for v in r])
+
+        ## the actions created up to the activated ones are activated
+        crs.execute('UPDATE projectmembers AS a JOIN activated_actions AS t '
+                    'ON a.project_id=t.project_id AND a.user_id=t.user_id AND a.created<=t.created '
+                    'SET a.activated=\'yes\', a.updated=t.updated')
+        n = max(0, crs.rowcount)
+
+        crs.execute('DROP TEMPORARY TABLE activated_actions')
+        return n
+
+    db = __getSession__(db_host, db_uid, db_pass, db_name, session, lvl)
+    try:
+        n = db.run(__update__)
+    except Exception, e:
+        logger.exception('Project DB update failed')
+        return None
     else:
-        ## TODO: make connection to MySQL, prepare and execute SQL statement
-        cnx = __getMySQLConnector__(db_host, db_uid, db_pass, db_name, lvl=lvl)
-        if not cnx:
-            logger.error('Project DB connection failed')
-            return
-        else:
-            crs = None
-
-            try:
-                ## in this case, we are using MySQLdb 
-                ##  - disable autocommit that is by default enabled in MySQLdb package
-                cnx.autocommit(False)
-            except Exception:
-                ## in this case, we are using mysql.connector
-                ##  - the mysql.connector doesn't have the autocommit function;
-                ##    but the transaction is enabled by default, and autocommit set to False.
-                ##  - we set autocommit to False anyway.
-                cnx.autocommit = False
+        ## everything is fine
+        logger.info('Project DB update succeeded: %d actions activated, %d rows updated' % (len(data), n))
+        return n
+    finally:
+        if session is None:
+            db.close()
+
+def getProjectRoleConfigActions(db_host=None, db_uid=None, db_pass=None, db_name=None, lvl=0, session=None):
+    '''retrieve pending configuration actions in the project database
+       :param session: the ProjectDBSession to use instead of a new connection
+    '''
 
-            try:
-                ## get the db cursor
-                crs = cnx.cursor()
-            
-                ## select actions that are not activted 
-                qry = 'SELECT a.user_id,a.project_id,a.role,a.created,a.action,b.calculatedProjectSpace FROM projectmembers as a, projects as b WHERE a.activated=\'no\' AND b.calculatedProjectSpace > 0 AND a.project_id=b.id'
-
-                crs.execute(qry)
-
-                for (uid,pid,role,created,action,pquota) in crs:
-                    _a_new = ProjectRoleSettingAction( uid=uid, pid=pid, role=role, action=action, ctime=created, pquota=pquota )
-                    if actions.count(_a_new) > 0:
-                        ## when an action on same uid,pid is found,
-                        ## check the action's ctime and take the latest created one
-                        idx = actions.index(_a_new) 
-                        if _a_new.ctime > actions[ idx ].ctime:
-                             actions[ idx ] = _a_new
-                    else:
-                        ## else, add the action to the list
-                        actions.append(_a_new)
+    logger = getMyLogger(lvl=lvl)
 
-            except Exception, e:
-                logger.exception('Project DB select failed')
-            else:
-                ## everything is fine
-                logger.info('Project DB select succeeded')
-            finally:
-                ## close db cursor
-                try:
-                    crs.close()
-                except Exception, e:
-                    pass
+    actions=[]
 
-                ## close db connection
-                try:
-                    cnx.close()
-                except Exception, e:
-                    pass
+    if not mdb:
+        logger.error('No MySQL library available.  Function disabled.')
+        return actions
+
+    def __select__(crs):
+        ## select the latest created action of every (user, project) that is not activated
+        qry = ('SELECT a.user_id,a.project_id,a.role,a.created,a.action,b.calculatedProjectSpace '
+               'FROM projectmembers as a '
+               'JOIN (SELECT user_id,project_id,MAX(created) as created FROM projectmembers WHERE activated=\'no\' GROUP BY user_id,project_id) as l '
+               'ON a.user_id=l.user_id AND a.project_id=l.project_id AND a.created=l.created '
+               'JOIN projects as b ON a.project_id=b.id '
+               'WHERE a.activated=\'no\' AND b.calculatedProjectSpace > 0 '
+               'ORDER BY a.created')
+
+        crs.execute(qry)
+
+        ## actions created at the same time on the same uid,pid are returned more than once,
+        ## the first one is taken
+        _actions = {}
+        for (uid,pid,role,created,action,pquota) in crs.fetchall():
+            if (uid,pid) not in _actions:
+                _actions[(uid,pid)] = ProjectRoleSettingAction( uid=uid, pid=pid, role=role, action=action, ctime=created, pquota=pquota )
+        return sorted(_actions.values(), key=lambda x: x.ctime)
+
+    db = __getSession__(db_host, db_uid, db_pass, db_name, session, lvl)
+    try:
+        actions = db.run(__select__)
+    except Exception, e:
+        logger.exception('Project DB select failed')
+    else:
+        ## everything is fine
+        logger.info('Project DB select succeeded')
+    finally:
+        if session is None:
+            db.close()
 
     ## showing all actions to be executed
     for a in actions:
@@ -212,166 +439,173 @@ def getProjectRoleConfigActions(db_host, db_uid, db_pass, db_name, lvl=0):
 
     return actions
 
-def getProjectOwner(db_host, db_uid, db_pass, db_name, pid, lvl=0):
-    '''retrieve project owner information (name and email)
+def getProjectRoleConfigActionsMark(db_host=None, db_uid=None, db_pass=None, db_name=None, lvl=0, session=None):
+    '''retrieve the number of pending configuration actions and the creation time of the latest one, over the
+       same actions as getProjectRoleConfigActions, i.e. on projects with a quota; a cheap check on whether the
+       actions to activate have changed since a previous run, also by a project getting its quota
+       :param session: the ProjectDBSession to use instead of a new connection
+       :return: the (count, created) tuple, created is None if there is no pending action; None if the query failed
     '''
 
     logger = getMyLogger(lvl=lvl)
- 
-    actions=[]
 
     if not mdb:
         logger.error('No MySQL library available.  Function disabled.')
-    else:
-        ## TODO: make connection to MySQL, prepare and execute SQL statement
-        cnx = __getMySQLConnector__(db_host, db_uid, db_pass, db_name, lvl=lvl)
-        if not cnx:
-            logger.error('Project DB connection failed')
-            return
-        else:
-            crs = None
+        return None
+
+    def __select__(crs):
+        crs.execute('SELECT COUNT(*),MAX(a.created) FROM projectmembers as a '
+                    'JOIN projects as b ON a.project_id=b.id '
+                    'WHERE a.activated=\'no\' AND b.calculatedProjectSpace > 0')
+        (n, created) = crs.fetchone()
+        return (int(n), created)
+
+    db = __getSession__(db_host, db_uid, db_pass, db_name, session, lvl)
+    try:
+        return db.run(__select__)
+    except Exception, e:
+        logger.exception('Project DB select failed')
+        return None
+    finally:
+        if session is None:
+            db.close()
+
+def getProjectMetadata(pids, db_host=None, db_uid=None, db_pass=None, db_name=None, lvl=0, session=None):
+    '''retrieve the owner and the quota of projects, in one query per chunk of projects
+       :param pids: the project ids
+       :param session: the ProjectDBSession to use instead of a new connection
+       :return: a dictionary of project id to a dictionary with keys owner_id, name, email and quota (the
+                calculatedProjectSpace in GB); projects unknown to the database are left out
+    '''
 
-            try:
-                ## in this case, we are using MySQLdb 
-                ##  - disable autocommit that is by default enabled in MySQLdb package
-                cnx.autocommit(False)
-            except Exception:
-                ## in this case, we are using mysql.connector
-                ##  - the mysql.connector doesn't have the autocommit function;
-                ##    but the transaction is enabled by default, and autocommit set to False.
-                ##  - we set autocommit to False anyway.
-                cnx.autocommit = False
+    logger = getMyLogger(lvl=lvl)
 
-            try:
-                ## get the db cursor
-                crs = cnx.cursor()
-            
-                ## select actions that are not activted
-                qry = 'SELECT a.id, a.email, a.firstName, a.lastName FROM users as a, projects as b WHERE a.id = b.owner_id AND b.id = \'%s\'' % pid
+    meta = {}
 
-                crs.execute(qry)
+    if not mdb:
+        logger.error('No MySQL library available.  Function disabled.')
+        return meta
+
+    def __select__(crs):
+        _meta = {}
+        for ps in __chunkRows__(map(lambda x: (x,), sorted(set(pids))), __getMaxStatementSize__(crs, logger)):
+            qry = ('SELECT b.id, b.calculatedProjectSpace, a.id, a.email, a.firstName, a.lastName '
+                   'FROM projects as b LEFT JOIN users as a ON a.id = b.owner_id '
+                   'WHERE b.id IN (%s)' % ','.join(['%s'] * len(ps)))
+
+            crs.execute(qry, map(lambda x: x[0], ps))
+
+            for (pid, quota, owner_id, owner_email, owner_first_name, owner_last_name) in crs.fetchall():
+                _meta[pid] = {'owner_id': owner_id,
+                              'name': '%s %s' % (owner_first_name, owner_last_name) if owner_id is not None else None,
+                              'email': owner_email,
+                              'quota': quota}
+        return _meta
+
+    if not pids:
+        return meta
+
+    db = __getSession__(db_host, db_uid, db_pass, db_name, session, lvl)
+    try:
+        meta = db.run(__select__)
+    except Exception, e:
+        logger.exception('Project DB select failed')
+    else:
+        ## everything is fine
+        logger.info('Project DB select succeeded: %d of %d projects found' % (len(meta), len(set(pids))))
+    finally:
+        if session is None:
+            db.close()
 
-                # TODO: fix this
-                owner = {}
-                for (owner_id, owner_email, owner_first_name, owner_last_name) in crs:
-                    owner['name'] = '%s %s' % (owner_first_name, owner_last_name)
-                    owner['email'] = owner_email
+    return meta
 
-            except Exception, e:
-                logger.exception('Project DB select failed')
-            else:
-                ## everything is fine
-                logger.info('Project DB select succeeded')
-            finally:
-                ## close db cursor
-                try:
-                    crs.close()
-                except Exception, e:
-                    pass
+def getProjectOwner(db_host=None, db_uid=None, db_pass=None, db_name=None, pid=None, lvl=0, session=None):
+    '''retrieve project owner information (name and email)
+       :param session: the ProjectDBSession to use instead of a new connection
+    '''
 
-                ## close db connection
-                try:
-                    cnx.close()
-                except Exception, e:
-                    pass
+    logger = getMyLogger(lvl=lvl)
+
+    owner = {}
+    m = getProjectMetadata([pid], db_host, db_uid, db_pass, db_name, lvl=lvl, session=session).get(pid)
+    if m and m['owner_id'] is not None:
+        owner = {'name': m['name'], 'email': m['email']}
 
     ## showing the owner of the project
-    logger.debug('project owner: %s, email: %s' % (owner['name'], owner['email']))
-    
+    logger.debug('project owner: %s, email: %s' % (owner.get('name'), owner.get('email')))
+
     return owner
 
-def updateProjectDatabase(roles, db_host, db_uid, db_pass, db_name, lvl=0):
-    ''' update project roles in the project database 
+def projectRoleRows(roles):
+    ''' converts project roles into the rows of the acls table
+        :param roles: a dictionary of project id to a list of RoleData objects
+        :return: a set of (project, user, projectRole) tuples
     '''
-    logger = getMyLogger(lvl=lvl)
+    rows = set()
+    for p, rd_list in roles.iteritems():
+        for rd in rd_list:
+            for k in PROJECT_ROLES:
+                for u in rd[k]:
+                    rows.add((p, u, k))
+    return rows
+
+def aclsDelta(current, rows):
+    ''' computes the minimal changes turning the current rows of the acls table into the given rows
+        :param current: the (project, user, projectRole) tuples in the table
+        :param rows: the (project, user, projectRole) tuples to be in the table
+        :return: a tuple of the sorted lists of rows to insert and rows to delete
+    '''
+    current = set(current)
+    rows = set(rows)
+    return (sorted(rows - current), sorted(current - rows))
 
-    if not mdb:
-        logger.error('No MySQL library available.  Function disabled.')
-    else:
-        ## TODO: make connection to MySQL, prepare and execute SQL statement
-        cnx = __getMySQLConnector__(db_host, db_uid, db_pass, db_name, lvl=lvl)
-        if not cnx:
-            logger.error('Project DB connection failed')
-            return
-        else:
-            crs = None
+def updateProjectDatabase(roles, db_host=None, db_uid=None, db_pass=None, db_name=None, lvl=0, sync=False, session=None):
+    ''' update project roles in the project database
 
-            try:
-                ## in this case, we are using MySQLdb 
-                ##  - disable autocommit that is by default enabled in MySQLdb package
-                cnx.autocommit(False)
-            except Exception:
-                ## in this case, we are using mysql.connector
-                ##  - the mysql.connector doesn't have the autocommit function;
-                ##    but the transaction is enabled by default, and autocommit set to False.
-                ##  - we set autocommit to False anyway.
-                cnx.autocommit = False
+        by default, the rows of the given projects are deleted and inserted again one by one.  With sync,
+        the current rows of the projects are read in one query and only the rows that differ are deleted
+        or inserted, with multi-row statements kept under the max_allowed_packet of the server.
 
-            try:
-                ## get the db cursor
-                crs = cnx.cursor()
-            
-                ## delete project users first followed by inserting new users and roles
-                qry1  = 'DELETE FROM acls WHERE project=%s'
-                data1 = []
-                qry2  = 'INSERT INTO acls (project, user, projectRole) VALUES (%s, %s, %s)'
-                data2 = []
-
-                for p, rd_list in roles.iteritems():
-                    data1.append((p,))
-                    for rd in rd_list:
-                        for k in PROJECT_ROLES:
-                            for u in rd[k]:
-                                data1.append((p,))
-                                data2.append((p, u, k))
-
-                ## remove duplication
-                data1 = list(set(data1))
-
-                ## execute queries via the db cursor, transaction *shoud be* enabled by default
-                if data1:
-                    for d in data1:
-                        logger.debug(qry1 % d)
-                        crs.execute(qry1, d)
-
-                if data2:
-                    for d in data2:
-                        logger.debug(qry2 % d)
-                        try:
-                            crs.execute(qry2, d)
-                        except mdb.IntegrityError, ierr:
-                            # cache IntegrityError and allow the update to continue
-                            logger.exception('Project DB integrity error: ' + qry2 % d )
-
-                ## commit the transaction if everything is fine
-                cnx.commit()
+        :param roles: a dictionary of project id to a list of RoleData objects
+        :param sync: only apply the difference with the current rows
+        :param session: the ProjectDBSession to use instead of a new connection
+        :return: the number of rows deleted or inserted if the update is committed, otherwise None
+    '''
+    logger = getMyLogger(lvl=lvl)
 
-            except Exception, e:
-                logger.exception('Project DB update failed')
-                print("Error: {}".format(e))
-                ## something wrong, rollback the queries
-                try:
-                    cnx.rollback()
-                except Exception, e_ignore:
-                    logger.exception('Project DB rollback failed')
-                raise e
-            else:
-                ## everything is fine
-                logger.info('Project DB update succeeded')
-            finally:
-                ## close db cursor
-                try:
-                    crs.close()
-                except Exception, e:
-                    pass
+    if not mdb:
+        logger.error('No MySQL library available.  Function disabled.')
+        return
 
-                ## close db connection
-                try:
-                    cnx.close()
-                except Exception, e:
-                    pass
+    def __update__(crs):
+        if sync:
+            return __syncProjectRoles__(crs, roles, logger)
+        else:
+            return __replaceProjectRoles__(crs, roles, logger)
+
+    db = __getSession__(db_host, db_uid, db_pass, db_name, session, lvl)
+    try:
+        (n_ins, n_del) = db.run(__update__)
+    except Exception, e:
+        logger.exception('Project DB update failed')
+        print("Error: {}".format(e))
+        raise e
+    else:
+        ## everything is fine
+        logger.info('Project DB update succeeded: %d rows deleted, %d rows inserted' % (n_del, n_ins))
+        return n_ins + n_del
+    finally:
+        if session is None:
+            db.close()
 
 ## internal functions
+def __getSession__(db_host, db_uid, db_pass, db_name, session, lvl):
+    ''' gets the given session, or a new one to be closed by the caller
+    '''
+    if session is not None:
+        return session
+    return ProjectDBSession(db_host, db_uid, db_pass, db_name, lvl=lvl)
+
 def __getMySQLConnector__(host,uid,passwd,db,lvl=0):
     ''' establishes MySQL connector
     '''
@@ -413,3 +647,105 @@ def __getMySQLConnector__(host,uid,passwd,db,lvl=0):
 
     return cnx
 
+
+def __replaceProjectRoles__(crs, roles, logger):
+    ''' deletes the rows of the projects and inserts the new rows one by one
+        :return: a tuple of the numbers of inserted and deleted rows
+    '''
+
+    ## delete project users first followed by inserting new users and roles
+    qry1  = 'DELETE FROM acls WHERE project=%s'
+    qry2  = 'INSERT INTO acls (project, user, projectRole) VALUES (%s, %s, %s)'
+
+    n_ins = n_del = 0
+
+    ## execute queries via the db cursor, transaction *shoud be* enabled by default
+    for p in roles.keys():
+        logger.debug(qry1 % p)
+        crs.execute(qry1, (p,))
+        n_del += max(0, crs.rowcount)
+
+    for d in sorted(projectRoleRows(roles)):
+        logger.debug(qry2 % d)
+        try:
+            crs.execute(qry2, d)
+            n_ins += 1
+        except mdb.IntegrityError, ierr:
+            # cache IntegrityError and allow the update to continue
+            logger.exception('Project DB integrity error: ' + qry2 % d )
+
+    return (n_ins, n_del)
+
+def __syncProjectRoles__(crs, roles, logger):
+    ''' applies the difference between the current and the new rows of the projects
+        :return: a tuple of the numbers of inserted and deleted rows
+    '''
+
+    max_bytes = __getMaxStatementSize__(crs, logger)
+
+    ## current rows of the projects, in one query per chunk of projects
+    current = set()
+    for ps in __chunkRows__(map(lambda x: (x,), sorted(roles.keys())), max_bytes):
+        qry = 'SELECT project, user, projectRole FROM acls WHERE project IN (%s)' % ','.join(['%s'] * len(ps))
+        crs.execute(qry, map(lambda x: x[0], ps))
+        for (p, u, k) in crs.fetchall():
+            current.add((p, u, k))
+
+    (ins, dels) = aclsDelta(current, projectRoleRows(roles))
+    logger.debug('acls: %d rows current, %d to delete, %d to insert' % (len(current), len(dels), len(ins)))
+
+    n_ins = n_del = 0
+
+    for rows in __chunkRows__(dels, max_bytes):
+        qry = 'DELETE FROM acls WHERE ' + ' OR '.join(['(project=%s AND user=%s AND projectRole=%s)'] * len(rows))
+        crs.execute(qry, [v for r in rows for v in r])
+        n_del += max(0, crs.rowcount)
+
+    qry_ins = 'INSERT INTO acls (project, user, projectRole) VALUES '
+    for rows in __chunkRows__(ins, max_bytes):
+        try:
+            crs.execute(qry_ins + ','.join(['(%s, %s, %s)'] * len(rows)), [v for r in rows for v in r])
+            n_ins += len(rows)
+        except mdb.IntegrityError, ierr:
+            # the whole statement is rejected, insert the rows of the chunk one by one
+            # so that only the offending rows are skipped
+            for d in rows:
+                try:
+                    crs.execute(qry_ins + '(%s, %s, %s)', d)
+                    n_ins += 1
+                except mdb.IntegrityError, ierr:
+                    logger.exception('Project DB integrity error: ' + (qry_ins + '(%s, %s, %s)') % d)
+
+    return (n_ins, n_del)
+
+def __getMaxStatementSize__(crs, logger, default=1024*1024):
+    ''' gets the size in bytes a multi-row statement should stay under, half of max_allowed_packet
+        :param default: the size used if max_allowed_packet cannot be retrieved, i.e. as for a max_allowed_packet
+                        of twice the size
+    '''
+    try:
+        crs.execute('SELECT @@max_allowed_packet')
+        (packet,) = crs.fetchone()
+        return max(4096, int(packet) / 2)
+    except Exception, e:
+        logger.warning('cannot get max_allowed_packet, assuming %d bytes: %s' % (2 * default, e))
+        return default
+
+def __chunkRows__(rows, max_bytes, max_rows=5000):
+    ''' splits rows into chunks whose values, quoted and escaped in the worst case, take at most max_bytes
+        :param rows: a list of tuples
+        :return: a generator of lists of tuples
+    '''
+    chunk = []
+    size = 0
+    for r in rows:
+        ## every character may be escaped; quotes, separators and the condition or row syntax around each value
+        n = sum(map(lambda v: 2 * len('%s' % (v,)) + 32, r))
+        if chunk and (size + n > max_bytes or len(chunk) >= max_rows):
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append(r)
+        size += n
+    if chunk:
+        yield chunk
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+import os
+import pwd
+import grp
+import time
+import json
+import tempfile
+import threading
+from utils.acl.Logger import getLogger
+
+
+class PrincipalIndex:
+    """
+    Index of the system users and groups, answering whether a principal exists without an NSS lookup
+    (e.g. LDAP or sssd) for every ACE.
+
+    Lookups are memoized, positive answers for ttl seconds and negative answers for negative_ttl seconds.
+    In the bulk mode, all users and groups are loaded at once via getpwall/getgrall, and the index is
+    reloaded when it is older than ttl; names not in the bulk index are still looked up one-by-one, as the
+    NSS backend may not enumerate all principals. The bulk index can be kept in a snapshot file, so that
+    jobs on many nodes do not each enumerate the directory service.
+
+    Example:
+
+        idx = getPrincipalIndex()
+        if idx.userExist('honlee'):
+            ...
+    """
+
+    def __init__(self, ttl=3600, negative_ttl=300, bulk=False, snapshot=None, lvl=0):
+        """
+        :param ttl: seconds a positive lookup, the bulk index or the snapshot file is valid
+        :param negative_ttl: seconds a negative lookup is valid
+        :param bulk: set to True to load all users and groups at once
+        :param snapshot: path of the snapshot file of the bulk index, None for no snapshot
+        :param lvl: logging level
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.bulk = bulk
+        self.snapshot = snapshot
+        self.logger = getLogger(name=self.__class__.__name__, lvl=lvl)
+
+        self.lock = threading.Lock()
+
+        # kind ('user' or 'group') -> name -> (exists, expiry time)
+        self.cache = {'user': {}, 'group': {}}
+
+        # the bulk index: kind -> set of names, and the time it is made
+        self.index = None
+        self.index_time = 0
+
+    def userExist(self, name):
+        """
+        checks if the given user exists as a system user
+        :param name: the user id
+        :return: True if the user exists, otherwise False
+        """
+        return self.__exist__('user', name)
+
+    def groupExist(self, name):
+        """
+        checks if the given group exists as a system group
+        :param name: the group name
+        :return: True if the group exists, otherwise False
+        """
+        return self.__exist__('group', name)
+
+    def load(self):
+        """
+        (re)loads the bulk index, from the snapshot file if it is still valid, otherwise via getpwall/getgrall
+        after which the snapshot file is updated
+        :return:
+        """
+
+        now = time.time()
+
+        index = None
+        if self.snapshot:
+            index = self.__read_snapshot__(now)
+
+        if index is None:
+            index = {'user': set(map(lambda x: x.pw_name, pwd.getpwall())),
+                     'group': set(map(lambda x: x.gr_name, grp.getgrall()))}
+            self.logger.debug('%d users and %d groups loaded' % (len(index['user']), len(index['group'])))
+
+            if self.snapshot:
+                self.__write_snapshot__(index, now)
+        else:
+            now = index.pop('time')
+
+        self.lock.acquire()
+        self.index = index
+        self.index_time = now
+        self.lock.release()
+
+    def clear(self):
+        """
+        drops all cached lookups and the bulk index
+        :return:
+        """
+        self.lock.acquire()
+        self.cache = {'user': {}, 'group': {}}
+        self.index = None
+        self.index_time = 0
+        self.lock.release()
+
+    def __exist__(self, kind, name):
+        """
+        checks if a principal exists
+        :param kind: 'user' or 'group'
+        :param name: the principal name
+        :return: True if the principal exists, otherwise False
+        """
+
+        now = time.time()
+
+        if self.bulk:
+            if self.index is None or now - self.index_time > self.ttl:
+                self.load()
+            if name in self.index[kind]:
+                return True
+
+        c = self.cache[kind].get(name)
+        if c is not None and c[1] > now:
+            return c[0]
+
+        try:
+            if kind == 'user':
+                pwd.getpwnam(name)
+            else:
+                grp.getgrnam(name)
+            v = True
+        except KeyError:
+            v = False
+
+        self.cache[kind][name] = (v, now + (self.ttl if v else self.negative_ttl))
+        return v
+
+    def __read_snapshot__(self, now):
+        """
+        reads the bulk index from the snapshot file
+        :param now: the current time
+        :return: the index with its creation time under the key 'time', or None if the file is missing,
+                 invalid or older than ttl
+        """
+        try:
+            with open(self.snapshot) as f:
+                d = json.load(f)
+            if now - d['time'] > self.ttl:
+                return None
+            return {'user': set(d['user']), 'group': set(d['group']), 'time': d['time']}
+        except (IOError, OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.debug('cannot read principal snapshot %s: %s' % (self.snapshot, e))
+            return None
+
+    def __write_snapshot__(self, index, now):
+        """
+        writes the bulk index into the snapshot file, via a temporary file renamed into place
+        :param index: the index
+        :param now: the creation time of the index
+        :return:
+        """
+        d = os.path.dirname(os.path.abspath(self.snapshot))
+        try:
+            fd, tmp = tempfile.mkstemp(dir=d, prefix='.principals_')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'time': now, 'user': sorted(index['user']), 'group': sorted(index['group'])}, f)
+            os.chmod(tmp, 0644)
+            os.rename(tmp, self.snapshot)
+        except (IOError, OSError) as e:
+            self.logger.warning('cannot write principal snapshot %s: %s' % (self.snapshot, e))
+
+
+# the index shared within the process
+_index = PrincipalIndex()
+
+
+def getPrincipalIndex():
+    """
+    gets the principal index shared within the process
+    :return: the PrincipalIndex object
+    """
+    return _index
+
+
+def configPrincipalIndex(**kwargs):
+    """
+    replaces the shared principal index with a new one, e.g. in bulk mode with a snapshot file for cron jobs
+    :param kwargs: the arguments of PrincipalIndex
+    :return: the new PrincipalIndex object
+    """
+    global _index
+    _index = PrincipalIndex(**kwargs)
+    return _index
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+import Queue
+import threading
+import collections
+from utils.Common import getNfsServer
+from utils.acl.Logger import getLogger
+
+
+class ProjectPool:
+    """
+    Pool processing many projects concurrently, with at most jobs projects at a time and at most per_server
+    projects at a time on the same NFS server, so that a single filer is not overloaded by one invocation.
+
+    The projects wait in one queue per server; a free worker takes the first project, in the given order, of a
+    server with a free slot, so that projects on other servers go ahead of those waiting for a busy server.
+
+    Results are yielded in the order of the given projects, whatever the order of completion, so that the
+    output of a multi-project invocation does not depend on the number of jobs. With stream, the results of
+    the project in turn are yielded while its worker produces them.
+
+    Example:
+
+        pool = ProjectPool(jobs=8, per_server=4)
+        for p, roles, err in pool.map(lambda p: Nfs4NetApp(p).getRoles(), paths):
+            if err is None:
+                print p, roles
+    """
+
+    def __init__(self, jobs=4, per_server=4, server=getNfsServer, lvl=0):
+        """
+        :param jobs: the maximum number of projects processed concurrently
+        :param per_server: the maximum number of projects processed concurrently on the same NFS server
+        :param server: function resolving the NFS server of a project path
+        :param lvl: logging level
+        """
+        self.jobs = max(1, jobs)
+        self.per_server = max(1, per_server)
+        self.resolver = server
+        self.logger = getLogger(name=self.__class__.__name__, lvl=lvl)
+
+        self.lock = threading.Lock()
+        self.servers = {}
+
+    def server(self, path):
+        """
+        gets the NFS server of a project path, resolved once per path
+        :param path: the project path
+        :return: the server name, '' if it cannot be resolved
+        """
+        self.lock.acquire()
+        try:
+            if path in self.servers:
+                return self.servers[path]
+        finally:
+            self.lock.release()
+
+        s = self.resolver(path) or ''
+
+        self.lock.acquire()
+        self.servers[path] = s
+        self.lock.release()
+        return s
+
+    def map(self, func, items, path=None, lookahead=None):
+        """
+        generator applying func to every item in worker threads
+        :param func: the function processing an item
+        :param items: a list of items, e.g. project paths
+        :param path: function giving the project path of an item, the item itself if None
+        :param lookahead: the maximum number of items started ahead of the item being yielded, so that at most
+                          lookahead results completed ahead of their turn are held; None for no limit
+        :return: a generator of (item, result, exception) tuples in the order of items; exception is None
+                 if func succeeded, otherwise result is None
+        """
+        for item, rs in self.stream(lambda x: [func(x)], items, path=path, lookahead=lookahead):
+            try:
+                yield item, list(rs)[0], None
+            except Exception as e:
+                yield item, None, e
+
+    def stream(self, func, items, path=None, lookahead=None):
+        """
+        generator applying func, which returns an iterable, to every item in worker threads. The results of
+        the item in turn are yielded as soon as its worker produces them; those of the items ahead of their
+        turn are held until then.
+        :param func: the function giving an iterable of results of an item, e.g. a generator
+        :param items: a list of items, e.g. project paths
+        :param path: function giving the project path of an item, the item itself if None
+        :param lookahead: the maximum number of items started ahead of the item being yielded; None for no limit
+        :return: a generator of (item, results) tuples in the order of items; results is an iterator over the
+                 results of the item, raising the exception of func, if any, after the results produced before it
+        """
+
+        items = list(items)
+        path = path or (lambda x: x)
+
+        # items not assigned to a server yet, the items waiting per server and the items running per server
+        unresolved = collections.deque(enumerate(items))
+        queues = {}
+        running = {}
+
+        # results of every started item, in the order they are produced
+        results = {}
+
+        # index of the item being yielded, and whether the consumer has stopped
+        state = {'head': 0, 'closed': False}
+        cv = threading.Condition()
+
+        def __next_task__():
+            # gets the first item, in the order of items, on a server with a free slot; it is called with cv
+            # acquired and returns (index, item, server), ('resolve', index, item) or None if all items are taken
+            while not state['closed']:
+                limit = len(items) if lookahead is None else state['head'] + 1 + lookahead
+                ready = filter(lambda x: queues[x] and running.get(x, 0) < self.per_server and queues[x][0][0] < limit, queues)
+                t = min(map(lambda x: queues[x][0] + (x,), ready)) if ready else None
+                if unresolved and (t is None or unresolved[0][0] < t[0]):
+                    return ('resolve',) + unresolved.popleft()
+                if t is not None:
+                    queues[t[2]].popleft()
+                    running[t[2]] = running.get(t[2], 0) + 1
+                    results[t[0]] = Queue.Queue()
+                    cv.notify_all()
+                    return t
+                if not filter(None, queues.values()):
+                    return None
+                cv.wait()
+            return None
+
+        def __worker__():
+            while True:
+                cv.acquire()
+                try:
+                    t = __next_task__()
+                finally:
+                    cv.release()
+
+                if t is None:
+                    break
+
+                if t[0] == 'resolve':
+                    # resolve the server outside the lock, as it may run a command
+                    i, item = t[1:]
+                    try:
+                        s = self.server(path(item))
+                    except Exception as e:
+                        self.logger.exception('cannot process %s' % path(item))
+                        s = None
+                        q = Queue.Queue()
+                        q.put((False, e))
+                    cv.acquire()
+                    if s is None:
+                        results[i] = q
+                    else:
+                        queues.setdefault(s, collections.deque()).append((i, item))
+                    cv.notify_all()
+                    cv.release()
+                    continue
+
+                i, item, s = t
+                q = results[i]
+                try:
+                    for r in func(item):
+                        q.put((True, r))
+                    q.put((False, None))
+                except Exception as e:
+                    self.logger.exception('cannot process %s' % path(item))
+                    q.put((False, e))
+                finally:
+                    cv.acquire()
+                    running[s] -= 1
+                    cv.notify_all()
+                    cv.release()
+
+        workers = []
+        for i in range(min(self.jobs, len(items))):
+            w = threading.Thread(target=__worker__, name='ProjectPool_worker_%d' % i)
+            w.daemon = True
+            w.start()
+            workers.append(w)
+
+        def __results__(i):
+            q = results[i]
+            while True:
+                ok, r = q.get()
+                if ok:
+                    yield r
+                elif r is not None:
+                    raise r
+                else:
+                    break
+
+        try:
+            for i in range(len(items)):
+                # wait for the item to be started
+                cv.acquire()
+                try:
+                    state['head'] = i
+                    cv.notify_all()
+                    while i not in results:
+                        cv.wait()
+                finally:
+                    cv.release()
+
+                rs = __results__(i)
+                yield items[i], rs
+
+                # the results not consumed by the caller are discarded
+                try:
+                    for r in rs:
+                        pass
+                except Exception:
+                    pass
+                del results[i]
+        finally:
+            cv.acquire()
+            state['closed'] = True
+            cv.notify_all()
+            cv.release()
+
+        # all items are done, the workers only have to notice that nothing is left
+        for w in workers:
+            w.join()
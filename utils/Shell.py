@@ -23,6 +23,10 @@
 # 
 #     rc,output,m=shell.cmd1('edg-get-job-status -all')
 #
+# Command given as an argv list is executed directly, without /bin/sh
+#
+#     rc,output,m=shell.cmd1(['edg-get-job-status', '-all'])
+#
 # Output is not captured. Useful for commands that require interactions
 #
 #     rc=shell.system('grid-proxy-init')
@@ -37,17 +41,29 @@
 import logging
 import os
 import re
+import errno
+import fcntl
+import hashlib
+import json
+import select
+import stat
+import signal
+import subprocess
 import tempfile
+import threading
 import time
-import signal
 
 
 class Shell:
     # exceptions=getConfig('Shell')['IgnoredVars']
     exceptions = {}
 
+    # process-wide cache of captured environments, keyed by the setup script and its arguments
+    env_cache = {}
+    env_lock = threading.Lock()
+
     # def __init__(self,setup=None, setup_args=[]):
-    def __init__(self, setup=None, setup_args=[], debug=False):
+    def __init__(self, setup=None, setup_args=[], debug=False, cache_dir=None):
 
         """The setup script is sourced (with possible arguments) and the
         environment is captured. The environment variables are expanded
@@ -69,25 +85,77 @@ class Shell:
         if os.environ.not has_key('NO_BAR'):
            assert s.env['FOO'] == '$NO_BAR'
 
+        The captured environment is cached per process, see __capture_env__; cache_dir
+        optionally persists the environment captured from the setup script on disk.
+
         """
 
         self.logger = logging.getLogger(self.__class__.__name__)
-        lh = logging.StreamHandler()
-        lh.setFormatter(logging.Formatter(fmt="[%(levelname)-8s:%(name)s.%(funcName)s] %(message)s"))
-        self.logger.addHandler(lh)
+        if not self.logger.handlers:
+            # the logger is shared by all Shell objects, add the handler only once
+            lh = logging.StreamHandler()
+            lh.setFormatter(logging.Formatter(fmt="[%(levelname)-8s:%(name)s.%(funcName)s] %(message)s"))
+            self.logger.addHandler(lh)
 
         if debug:
             self.logger.setLevel(logging.DEBUG)
         else:
             self.logger.setLevel(logging.WARNING)
 
+        self.env = dict(self.__capture_env__(setup, setup_args, cache_dir))
+
+        self.dirname = None
+
+    def __capture_env__(self, setup, setup_args, cache_dir=None):
+        """Returns the captured environment from the process-wide cache, capturing it on a cache miss.
+
+        Without a setup script, the snapshot is reused as long as os.environ is unchanged. With a setup
+        script, the script is sourced at most once per process for the same arguments; if cache_dir is
+        given, the snapshot is also stored on disk as JSON and reused by other processes until the script's
+        modification time changes. The environment of later commands is taken from that file, so the
+        directory and the file must be owned by the user and not be writable by others; otherwise the
+        file is ignored."""
+
         def expand_vars(env):
             tmp_dict = {}
             for k, v in env.iteritems():
                 tmp_dict[k] = os.path.expandvars(v)
             return tmp_dict
 
-        if setup:
+        if not setup:
+            raw = dict(os.environ)  #bug #44334: Ganga/Utility/Shell.py does not save environ
+            Shell.env_lock.acquire()
+            try:
+                cached = Shell.env_cache.get(None)
+                if cached and cached[0] == raw:
+                    return cached[1]
+                env = expand_vars(raw)
+                Shell.env_cache[None] = (raw, env)
+                return env
+            finally:
+                Shell.env_lock.release()
+
+        key = (setup, tuple(setup_args))
+
+        Shell.env_lock.acquire()
+        try:
+            if key in Shell.env_cache:
+                return Shell.env_cache[key]
+
+            cache_file = None
+            mtime = None
+            if cache_dir:
+                try:
+                    mtime = os.path.getmtime(setup)
+                    cache_file = os.path.join(cache_dir, 'shell_env_%s.json' % hashlib.sha1(repr(key)).hexdigest())
+                except OSError, e:
+                    self.logger.warning('cannot cache environment of setup %s: %s', setup, e)
+
+            env = self.__load_env__(cache_file, key, mtime) if cache_file else None
+            if env is not None:
+                Shell.env_cache[key] = env
+                return env
+
             pipe = os.popen('source %s %s > /dev/null 2>&1; python -c "import os; print os.environ"' % (
                 setup, " ".join(setup_args)))
             output = pipe.read()
@@ -97,54 +165,87 @@ class Shell:
 
             env = expand_vars(eval(output))
 
-            for key in Shell.exceptions:
+            for k in Shell.exceptions:
                 try:
-                    del env[key]
+                    del env[k]
                 except KeyError:
                     pass
-            self.env = env
-        else:
-            env = dict(os.environ)  #bug #44334: Ganga/Utility/Shell.py does not save environ
-            self.env = expand_vars(env)
 
-        self.dirname = None
+            if cache_file:
+                self.__store_env__(cache_file, key, mtime, env)
 
-    def cmd(self, cmd, soutfile=None, allowed_exit=[0], capture_stderr=False, timeout=None, mention_outputfile_on_errors=True):
-        """Execute an OS command and captures the stderr and stdout which are returned in a file"""
+            Shell.env_cache[key] = env
+            return env
+        finally:
+            Shell.env_lock.release()
 
-        if not soutfile: soutfile = tempfile.mktemp('.out')
+    def __owned__(self, path):
+        """Checks that path is owned by the effective user and is not writable by group or others."""
+        st = os.lstat(path)
+        return st.st_uid == os.geteuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH) and not stat.S_ISLNK(st.st_mode)
 
-        self.logger.debug('Running shell command: %s' % cmd)
+    def __load_env__(self, cache_file, key, mtime):
+        """Returns the environment stored in cache_file for the setup script and arguments in key, if the
+        script has not been modified since; None otherwise."""
+        try:
+            if not os.path.exists(cache_file):
+                return None
+            if not (self.__owned__(os.path.dirname(cache_file)) and self.__owned__(cache_file)):
+                self.logger.warning('ignore environment cache %s, not owned by uid %d or writable by others',
+                                    cache_file, os.geteuid())
+                return None
+            f = open(cache_file)
+            try:
+                data = json.load(f)
+            finally:
+                f.close()
+            if data['setup'] != key[0] or data['args'] != list(key[1]) or data['mtime'] != mtime:
+                return None
+            self.logger.debug('environment of setup %s loaded from %s', key[0], cache_file)
+            return dict(map(lambda x: (x[0].encode('utf-8'), x[1].encode('utf-8')), data['env'].iteritems()))
+        except (IOError, OSError, ValueError, KeyError, TypeError, AttributeError), e:
+            self.logger.warning('cannot load environment cache %s: %s', cache_file, e)
+            return None
+
+    def __store_env__(self, cache_file, key, mtime, env):
+        """Stores the environment captured from the setup script in cache_file, readable only by the user."""
+        cache_dir = os.path.dirname(cache_file)
         try:
-            t0 = time.time()
-            already_killed = False
-            timeout0 = timeout
-            pid = os.spawnve(os.P_NOWAIT, '/bin/sh', ['/bin/sh', '-c', '%s > %s 2>&1' % (cmd, soutfile)], self.env)
-            while 1:
-                wpid, sts = os.waitpid(pid, os.WNOHANG)
-                if wpid != 0:
-                    if os.WIFSIGNALED(sts):
-                        rc = -os.WTERMSIG(sts)
-                        break
-                    elif os.WIFEXITED(sts):
-                        rc = os.WEXITSTATUS(sts)
-                        break
-                if timeout and time.time() - t0 > timeout:
-                    self.logger.warning('Command interrupted - timeout %ss reached: %s', timeout0, cmd)
-                    if already_killed:
-                        sig = signal.SIGKILL
-                    else:
-                        sig = signal.SIGTERM
-                    self.logger.debug('killing process %d with signal %d', pid, sig)
-                    os.kill(pid, sig)
-                    t0 = time.time()
-                    timeout = 5  # wait just 5 seconds before killing with SIGKILL
-                    already_killed = True
-                time.sleep(0.1)
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir, 0700)
+            if not self.__owned__(cache_dir):
+                self.logger.warning('environment not cached, %s not owned by uid %d or writable by others',
+                                    cache_dir, os.geteuid())
+                return
+            data = json.dumps({'setup': key[0], 'args': list(key[1]), 'mtime': mtime, 'env': env})
+
+            # write to a temporary file (mode 0600) and rename, so that concurrent readers never see a partial file
+            fd, tmp = tempfile.mkstemp(prefix='.shell_env_', dir=cache_dir)
+            f = os.fdopen(fd, 'w')
+            try:
+                f.write(data)
+            finally:
+                f.close()
+            os.rename(tmp, cache_file)
+        except (IOError, OSError, ValueError), e:
+            self.logger.warning('cannot store environment of setup %s: %s', key[0], e)
 
-        except OSError, (num, text):
-            self.logger.warning('Problem with shell command: %s, %s', num, text)
-            rc = 255
+    def cmd(self, cmd, soutfile=None, allowed_exit=[0], capture_stderr=False, timeout=None, mention_outputfile_on_errors=True):
+        """Execute an OS command and captures the stderr and stdout which are returned in a file
+
+        The command is executed by '/bin/sh -c' if given as a string, or directly if given as an argv list."""
+
+        if soutfile:
+            f = open(soutfile, 'w')
+        else:
+            fd, soutfile = tempfile.mkstemp('.out')
+            f = os.fdopen(fd, 'w')
+
+        try:
+            rc, output = self.__run__(cmd, timeout, stdout=f)
+            f.write(output)
+        finally:
+            f.close()
 
         BYTES = 4096
         if rc not in allowed_exit:
@@ -164,13 +265,46 @@ class Shell:
         return rc, soutfile, m is None
 
     def cmd1(self, cmd, allowed_exit=[0], capture_stderr=False, timeout=None):
-        """Executes an OS command and captures the stderr and stdout which are returned as a string"""
+        """Executes an OS command and captures the stderr and stdout which are returned as a string
+
+        The output is captured through a pipe, no intermediate file is involved."""
+
+        rc, output = self.__run__(cmd, timeout)
+
+        return rc, output, self.check(cmd, rc, output, allowed_exit)
+
+    def check(self, cmd, rc, output, allowed_exit=[0]):
+        """Reports unexpected exit status with the first part of the command output.
+        Returns False if the command is not found, otherwise True."""
+
+        BYTES = 4096
+        if rc not in allowed_exit:
+            self.logger.warning('exit status [%d] of command %s', rc, cmd)
+            self.logger.warning('<first %d bytes of output>\n%s', BYTES, output[:BYTES])
+            self.logger.warning('<end of first %d bytes of output>', BYTES)
+
+        m = None
+        if rc != 0:
+            m = re.search('command not found\n', output)
+            if m:
+                self.logger.warning('command %s not found', cmd)
 
-        rc, outfile, m = self.cmd(cmd, None, allowed_exit, capture_stderr, timeout, mention_outputfile_on_errors=False)
-        output = file(outfile).read()
-        os.unlink(outfile)
+        return m is None
 
-        return rc, output, m
+    def spawn(self, cmd, timeout=None, stdout=None):
+        """Starts the command in the background with the captured environment, returns a ShellProcess object"""
+
+        self.logger.debug('Running shell command: %s' % cmd)
+        return ShellProcess(cmd, self.env, stdout=stdout, timeout=timeout, logger=self.logger)
+
+    def __run__(self, cmd, timeout=None, stdout=None):
+        """Runs the command to completion and returns the exit code and the captured output.
+
+        If stdout is a file object, the output is written into it directly and the returned output is empty,
+        except for the error message of a command that cannot be started."""
+
+        p = self.spawn(cmd, timeout, stdout)
+        return p.communicate(), ''.join(p.output)
 
     def system(self, cmd, allowed_exit=[0], stderr_file=None):
         """Execute on OS command. Useful for interactive commands. Stdout and Stderr are not
@@ -224,6 +358,214 @@ class Shell:
 
         return fullpath
 
+
+class ShellProcess:
+    """A child process whose stdout and stderr are captured through a pipe.
+
+    The command is executed by '/bin/sh -c' if given as a string, or directly without a shell if given as
+    an argv list. Reading the output and waiting for the child are event-driven: select() on the pipe
+    wakes up on new output or on the timeout deadline, and waitpid() blocks until the child exits. When the
+    timeout is reached, the child gets SIGTERM, followed by SIGKILL if it is still running 5 seconds later.
+
+    Several ShellProcess objects can be driven by a single select() loop via fileno(), read() and expire().
+    """
+
+    # cache of resolved executables, keyed by (PATH, program)
+    executables = {}
+
+    # processes are spawned one at a time, see __init__
+    spawn_lock = threading.Lock()
+
+    def __init__(self, cmd, env, stdout=None, timeout=None, logger=None):
+
+        self.cmd = cmd
+        self.logger = logger or logging.getLogger('Shell')
+        self.timeout = timeout
+        self.output = []
+        self.rc = None
+        self.already_killed = False
+        self.lock = threading.Lock()
+
+        if isinstance(cmd, basestring):
+            args = ['/bin/sh', '-c', cmd]
+        else:
+            args = list(cmd)
+            args[0] = ShellProcess.which(args[0], env)
+
+        self.proc = None
+        self.pid = None
+
+        self.deadline = None
+        if timeout:
+            self.deadline = time.time() + timeout
+
+        try:
+            # processes are spawned concurrently from threads, a child must not inherit the pipes of the others.
+            # The descriptors of a child are made close-on-exec before the next one is spawned, instead of
+            # close_fds closing every possible descriptor on each spawn
+            ShellProcess.spawn_lock.acquire()
+            try:
+                if stdout is not None and stdout.fileno() > 2:
+                    ShellProcess.cloexec(stdout.fileno())
+                self.proc = subprocess.Popen(args, stdout=stdout or subprocess.PIPE, stderr=subprocess.STDOUT,
+                                             env=env, close_fds=False)
+                if self.proc.stdout:
+                    ShellProcess.cloexec(self.proc.stdout.fileno())
+            finally:
+                ShellProcess.spawn_lock.release()
+            self.pid = self.proc.pid
+        except OSError, (num, text):
+            if num == errno.ENOENT:
+                # same exit code and message as /bin/sh for a command not in PATH
+                self.rc = 127
+                self.output.append('%s: command not found\n' % args[0])
+            else:
+                self.logger.warning('Problem with shell command: %s, %s', num, text)
+                self.rc = 255
+            return
+
+    @staticmethod
+    def cloexec(fd):
+        """Sets the close-on-exec flag of a file descriptor"""
+        fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+
+    @staticmethod
+    def which(prog, env):
+        """Resolves the program against PATH of the given environment; the result is cached per process"""
+
+        if os.sep in prog:
+            return prog
+
+        path = env.get('PATH', os.defpath)
+        try:
+            return ShellProcess.executables[(path, prog)]
+        except KeyError:
+            pass
+
+        for d in path.split(os.pathsep):
+            f = os.path.join(d, prog)
+            if os.path.isfile(f) and os.access(f, os.X_OK):
+                ShellProcess.executables[(path, prog)] = f
+                return f
+
+        # leave it to exec, which reports the command not found
+        return prog
+
+    def fileno(self):
+        """Returns the file descriptor of the output pipe, or None if the output is not captured or complete"""
+        if self.proc and self.proc.stdout and not self.proc.stdout.closed:
+            return self.proc.stdout.fileno()
+        return None
+
+    def read(self):
+        """Reads available output from the pipe, returns False at the end of the output"""
+        data = os.read(self.fileno(), 65536)
+        if data:
+            self.output.append(data)
+            return True
+        self.proc.stdout.close()
+        return False
+
+    def remaining(self):
+        """Returns seconds left until the deadline, or None if there is no deadline"""
+        if self.deadline is None:
+            return None
+        return max(0, self.deadline - time.time())
+
+    def expire(self):
+        """Signals the child when the deadline is reached: SIGTERM first, SIGKILL 5 seconds later"""
+
+        self.lock.acquire()
+        try:
+            if self.rc is not None or self.deadline is None or self.deadline > time.time():
+                return
+
+            if self.already_killed:
+                sig = signal.SIGKILL
+                self.deadline = None
+            else:
+                self.logger.warning('Command interrupted - timeout %ss reached: %s', self.timeout, self.cmd)
+                sig = signal.SIGTERM
+                self.deadline = time.time() + 5  # wait just 5 seconds before killing with SIGKILL
+                self.already_killed = True
+
+            self.logger.debug('killing process %d with signal %d', self.pid, sig)
+            try:
+                os.kill(self.pid, sig)
+            except OSError:
+                pass
+        finally:
+            self.lock.release()
+
+    def wait(self):
+        """Waits for the child to exit, returns the exit code (-signal if the child is terminated by a signal)"""
+
+        if self.proc is None:
+            # the command has not been started
+            return self.rc
+
+        # the child has usually exited already when its output is complete
+        rc = self.proc.poll()
+        if rc is not None:
+            self.rc = rc
+            return rc
+
+        timers = []
+
+        def __watchdog__():
+            self.expire()
+            self.lock.acquire()
+            try:
+                # reschedule for the SIGKILL, unless the child has exited in the meantime
+                if self.rc is None and self.deadline is not None:
+                    t = threading.Timer(self.remaining(), __watchdog__)
+                    t.daemon = True
+                    timers.append(t)
+                    t.start()
+            finally:
+                self.lock.release()
+
+        if self.deadline is not None:
+            # blocking waitpid() in this thread, the timer thread takes care of the timeout
+            t = threading.Timer(self.remaining(), __watchdog__)
+            t.daemon = True
+            timers.append(t)
+            t.start()
+
+        rc = None
+        try:
+            rc = self.proc.wait()
+        finally:
+            self.lock.acquire()
+            self.rc = rc
+            self.lock.release()
+            for t in timers:
+                t.cancel()
+                if t is not threading.current_thread():
+                    t.join()
+
+        return rc
+
+    def communicate(self):
+        """Reads the output until the end, and waits for the child to exit; returns the exit code"""
+
+        while self.fileno() is not None:
+            try:
+                r, w, x = select.select([self.fileno()], [], [], self.remaining())
+            except select.error, (num, text):
+                if num == errno.EINTR:
+                    continue
+                raise
+
+            if r:
+                self.read()
+            else:
+                # stop reading once the child is signalled, the pipe may be held open by its own children
+                self.expire()
+                self.proc.stdout.close()
+
+        return self.wait()
+
 #
 #
 # $Log: not supported by cvs2svn $
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+import errno
+import select
+from collections import deque
+from utils.Shell import Shell
+
+
+class ShellFuture:
+    """
+    Result of a command submitted to the ShellPool. The result is available via result() which returns the
+    same (rc, output, m) tuple as Shell.cmd1.
+    """
+
+    def __init__(self, pool, cmd, allowed_exit=[0], timeout=None, tag=None):
+        self.pool = pool
+        self.cmd = cmd
+        self.allowed_exit = allowed_exit
+        self.timeout = timeout
+        self.tag = tag
+        self.proc = None
+        self.rc = None
+        self.output = None
+        self.m = None
+        self.consumed = 0
+
+    def fetch(self):
+        """
+        returns the output received since the previous call, also while the command is still running
+        :return: the new output, an empty string if there is none
+        """
+        if self.proc is None:
+            return ''
+        data = ''.join(self.proc.output[self.consumed:])
+        self.consumed = len(self.proc.output)
+        return data
+
+    def done(self):
+        """
+        checks if the command is finished
+        :return: True if the command is finished, otherwise False
+        """
+        return self.rc is not None
+
+    def result(self):
+        """
+        waits for the command to finish
+        :return: a tuple of (exit code, output, False if the command is not found)
+        """
+        while not self.done():
+            self.pool.step()
+        return self.rc, self.output, self.m
+
+
+class ShellPool:
+    """
+    Pool running many commands in parallel, with at most max_workers child processes at a time.
+
+    The pool has no threads of its own: the children are reaped by a select() loop over their output pipes,
+    which is driven by the caller through ShellFuture.result(), as_completed() or map(). A pool object is
+    therefore not meant to be shared between threads.
+
+    Example:
+
+        pool = ShellPool(max_workers=8)
+        fs = map(lambda p: pool.submit(['nfs4_getfacl', p], timeout=60), paths)
+        for f in pool.as_completed(fs):
+            rc, output, m = f.result()
+    """
+
+    def __init__(self, shell=None, max_workers=8):
+        """
+        :param shell: the Shell object providing the environment and logger, a new Shell object if None
+        :param max_workers: the maximum number of concurrently running commands
+        """
+        self.shell = shell or Shell()
+        self.max_workers = max(1, max_workers)
+        self.queue = deque()
+        self.running = []
+
+    def submit(self, cmd, allowed_exit=[0], timeout=None, tag=None):
+        """
+        submits a command, it is started as soon as there is a free slot in the pool
+        :param cmd: the command, as a string for '/bin/sh -c' or as an argv list
+        :param allowed_exit: exit codes not reported as failure
+        :param timeout: seconds after which the command is terminated, counted from its start
+        :param tag: an arbitrary object attached to the returned ShellFuture
+        :return: a ShellFuture object
+        """
+        f = ShellFuture(self, cmd, allowed_exit, timeout, tag)
+        self.queue.append(f)
+        self.__start__()
+        return f
+
+    def map(self, cmds, allowed_exit=[0], timeout=None):
+        """
+        runs all commands and returns their results in the order of the given commands
+        :param cmds: a list of commands
+        :param allowed_exit: exit codes not reported as failure
+        :param timeout: per-command timeout in seconds
+        :return: a list of (rc, output, m) tuples
+        """
+        fs = map(lambda c: self.submit(c, allowed_exit, timeout), cmds)
+        return map(lambda f: f.result(), fs)
+
+    def as_completed(self, futures=None):
+        """
+        generator yielding futures in the order of completion
+        :param futures: the futures to wait for, all submitted futures if None
+        :return: a generator of ShellFuture objects
+        """
+        if futures is None:
+            futures = list(self.queue) + map(lambda p: p[0], self.running)
+
+        pending = set(futures)
+        for f in futures:
+            if f.done():
+                pending.discard(f)
+                yield f
+
+        while pending:
+            for f in self.step():
+                if f in pending:
+                    pending.discard(f)
+                    yield f
+
+    def step(self):
+        """
+        waits for output or a timeout of the running commands, and finishes the commands whose output is complete
+        :return: a list of ShellFuture objects finished in this step
+        """
+
+        self.__start__()
+
+        finished = []
+        if not self.running:
+            return finished
+
+        fds = {}
+        for f, p in self.running:
+            if p.fileno() is not None:
+                fds[p.fileno()] = (f, p)
+
+        # wake up at the earliest deadline, if any
+        remaining = filter(lambda x: x is not None, map(lambda x: x[1].remaining(), self.running))
+        timeout = min(remaining) if remaining else None
+
+        r = []
+        if fds:
+            try:
+                r, w, x = select.select(fds.keys(), [], [], timeout)
+            except select.error, (num, text):
+                if num != errno.EINTR:
+                    raise
+
+        for fd in r:
+            fds[fd][1].read()
+
+        for f, p in list(self.running):
+            if p.fileno() is not None and p.remaining() == 0:
+                # stop reading once the child is signalled, the pipe may be held open by its own children
+                p.expire()
+                p.proc.stdout.close()
+
+            if p.fileno() is None:
+                self.running.remove((f, p))
+                f.rc = p.wait()
+                f.output = ''.join(p.output)
+                f.m = self.shell.check(f.cmd, f.rc, f.output, f.allowed_exit)
+                finished.append(f)
+
+        self.__start__()
+
+        return finished
+
+    def __start__(self):
+        """
+        starts queued commands as long as there are free slots
+        :return:
+        """
+        while self.queue and len(self.running) < self.max_workers:
+            f = self.queue.popleft()
+            f.proc = self.shell.spawn(f.cmd, timeout=f.timeout)
+            self.running.append((f, f.proc))
@@ -1,29 +1,201 @@
 #!/usr/bin/env python
-import re
 
-class ACE:
+# ACE type, flag and mask bits (RFC 7530, section 6.2.1) with the letters used by nfs4_getfacl/nfs4_setfacl
+ACE_TYPES = [('A', 0x0), ('D', 0x1), ('U', 0x2), ('L', 0x3)]
+
+ACE_FLAGS = [('f', 0x1),   # FILE_INHERIT
+             ('d', 0x2),   # DIRECTORY_INHERIT
+             ('n', 0x4),   # NO_PROPAGATE_INHERIT
+             ('i', 0x8),   # INHERIT_ONLY
+             ('S', 0x10),  # SUCCESSFUL_ACCESS
+             ('F', 0x20),  # FAILED_ACCESS
+             ('g', 0x40),  # IDENTIFIER_GROUP
+             ('I', 0x80)]  # INHERITED
+
+ACE_MASKS = [('r', 0x1),       # READ_DATA/LIST_DIRECTORY
+             ('w', 0x2),       # WRITE_DATA/ADD_FILE
+             ('a', 0x4),       # APPEND_DATA/ADD_SUBDIRECTORY
+             ('D', 0x40),      # DELETE_CHILD
+             ('d', 0x10000),   # DELETE
+             ('x', 0x20),      # EXECUTE
+             ('t', 0x80),      # READ_ATTRIBUTES
+             ('T', 0x100),     # WRITE_ATTRIBUTES
+             ('n', 0x8),       # READ_NAMED_ATTRS
+             ('N', 0x10),      # WRITE_NAMED_ATTRS
+             ('c', 0x20000),   # READ_ACL
+             ('C', 0x40000),   # WRITE_ACL
+             ('o', 0x80000),   # WRITE_OWNER
+             ('y', 0x100000)]  # SYNCHRONIZE
+
+# alias letters accepted by nfs4_setfacl
+MASK_ALIAS = {'R': 'rntcy',
+              'W': 'watTNcCy',
+              'X': 'xtcy'}
+
+FLAG_FILE_INHERIT = dict(ACE_FLAGS)['f']
+FLAG_DIRECTORY_INHERIT = dict(ACE_FLAGS)['d']
+FLAG_GROUP = dict(ACE_FLAGS)['g']
+
+DEFAULT_PRINCIPLES = frozenset(['OWNER', 'GROUP', 'EVERYONE'])
+
+
+def bitsToLetters(bits, table):
+    """
+    converts a bitmask into the letter string used by nfs4_getfacl
+    :param bits: the integer bitmask
+    :param table: one of ACE_FLAGS or ACE_MASKS
+    :return: the letter string
+    """
+    return ''.join([l for l, b in table if bits & b])
+
+
+def lettersToBits(letters, table, alias={}):
+    """
+    converts the letter string used by nfs4_setfacl into a bitmask
+    :param letters: the letter string
+    :param table: one of ACE_FLAGS or ACE_MASKS
+    :param alias: a dictionary for expanding alias letters, e.g. MASK_ALIAS
+    :return: the integer bitmask
+    """
+    bits = 0
+    _bits = dict(table)
+    for l in letters:
+        if l in alias:
+            bits |= lettersToBits(alias[l], table)
+        elif l in _bits:
+            bits |= _bits[l]
+        else:
+            raise ValueError('unknown letter \'%s\' in \'%s\'' % (l, letters))
+    return bits
+
+
+# letter string -> (bitmask, canonical letter string), per table
+_parsed = {'flag': {}, 'mask': {}}
+
+
+def _parse(kind, letters):
+    """
+    converts a flag or mask letter string into its bitmask and canonical letter string; the canonical string
+    has the letters in the nfs4_getfacl order and alias letters expanded, followed by unknown letters as given
+    :param kind: 'flag' or 'mask'
+    :param letters: the letter string
+    :return: a tuple of (bitmask, canonical letter string)
+    """
+    p = _parsed[kind].get(letters)
+    if p is None:
+        table, alias = (ACE_FLAGS, {}) if kind == 'flag' else (ACE_MASKS, MASK_ALIAS)
+        _bits = dict(table)
+        bits = 0
+        unknown = ''
+        for l in letters:
+            if l in alias:
+                bits |= lettersToBits(alias[l], table)
+            elif l in _bits:
+                bits |= _bits[l]
+            elif l not in unknown:
+                unknown += l
+        p = (bits, intern(bitsToLetters(bits, table) + unknown))
+        _parsed[kind][letters] = p
+    return p
+
+
+def _intern(s):
+    """interns a byte string, other strings are returned as they are"""
+    return intern(s) if isinstance(s, str) else s
+
+
+class ACE(object):
     '''object of the Access Control Entry, the main structure is inspired by NFSv4 ACE'''
+
+    __slots__ = ('_type', '_flag', '_flagbits', '_principle', '_mask', '_maskbits', '_str')
+
     def __init__(self, **kwargs):
-        self.type = ''
-        self.flag = ''
-        self.principle = ''
-        self.mask = ''
-        self.__dict__.update(kwargs)
+        self._str = None
+        self.type = kwargs.get('type', '')
+        self.flag = kwargs.get('flag', '')
+        self.principle = kwargs.get('principle', '')
+        self.mask = kwargs.get('mask', '')
+
+    def _get_type(self):
+        return self._type
+
+    def _set_type(self, v):
+        self._type = _intern(v)
+        self._str = None
+
+    def _get_flag(self):
+        return self._flag
+
+    def _set_flag(self, v):
+        self._flagbits, self._flag = _parse('flag', v)
+        self._str = None
+
+    def _get_principle(self):
+        return self._principle
+
+    def _set_principle(self, v):
+        self._principle = _intern(v)
+        self._str = None
+
+    def _get_mask(self):
+        return self._mask
+
+    def _set_mask(self, v):
+        self._maskbits, self._mask = _parse('mask', v)
+        self._str = None
+
+    type = property(_get_type, _set_type)
+    flag = property(_get_flag, _set_flag)
+    principle = property(_get_principle, _set_principle)
+    mask = property(_get_mask, _set_mask)
+
+    @property
+    def flagbits(self):
+        return self._flagbits
+
+    @property
+    def maskbits(self):
+        return self._maskbits
 
     def isDefaultPrinciple(self):
-        return re.match('^(OWNER|GROUP|EVERYONE)@', self.principle)
+        p, sep, domain = self._principle.partition('@')
+        return sep == '@' and p in DEFAULT_PRINCIPLES
 
     def isFileInherited(self):
-        return self.flag.find('f') >= 0
+        return self._flagbits & FLAG_FILE_INHERIT != 0
 
     def isDirectoryInherited(self):
-        return self.flag.find('d') >= 0
+        return self._flagbits & FLAG_DIRECTORY_INHERIT != 0
+
+    def isGroup(self):
+        return self._flagbits & FLAG_GROUP != 0
 
     def __str__(self):
-        return ':'.join([self.type, self.flag, self.principle, self.mask])
+        if self._str is None:
+            self._str = ':'.join([self._type, self._flag, self._principle, self._mask])
+        return self._str
 
     def __str_no_inheritance__(self):
-        return ':'.join([self.type, self.flag.replace('f','').replace('d',''), self.principle, self.mask])
+        return ':'.join([self._type, self._flag.replace('f','').replace('d',''), self._principle, self._mask])
+
+    def __eq__(self, other):
+        if not isinstance(other, ACE):
+            return NotImplemented
+        return self.__str__() == other.__str__()
+
+    def __ne__(self, other):
+        if not isinstance(other, ACE):
+            return NotImplemented
+        return self.__str__() != other.__str__()
+
+    def __hash__(self):
+        return hash(self.__str__())
+
+    def __getstate__(self):
+        return {'type': self._type, 'flag': self._flag, 'principle': self._principle, 'mask': self._mask}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
 
     def __repr__(self):
-        return repr(self.__dict__)
+        return repr(self.__getstate__())
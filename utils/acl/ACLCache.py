@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+import os
+import stat
+import time
+import hashlib
+import sqlite3
+import threading
+from utils.acl.ACE import ACE
+from utils.acl.Logger import getLogger
+
+
+def dumpACL(aces):
+    """
+    serializes an ACL into the nfs4_getfacl notation, one ACE per line
+    :param aces: a list of ACE objects
+    :return: the ACL string
+    """
+    return '\n'.join(map(lambda x: x.__str__(), aces))
+
+
+def loadACL(acl):
+    """
+    parses an ACL serialized by dumpACL
+    :param acl: the ACL string
+    :return: a list of ACE objects
+    """
+    aces = []
+    for l in acl.split('\n'):
+        # the principle is the only field that might contain a colon
+        t, f, p = l.split(':', 2)
+        p, m = p.rsplit(':', 1)
+        aces.append(ACE(type=t, flag=f, principle=p, mask=m))
+    return aces
+
+
+class ACLCache(object):
+    """
+    Persistent cache of the ACLs of a project tree, kept in a SQLite database.
+
+    An ACL change updates the ctime of the inode. A cached ACL is therefore used as long as the inode number
+    and the ctime of the path are the same as when the ACL was read, so that only the paths changed since
+    the last run are read again from the file system. Entries not refreshed for max_age seconds, and the
+    least recently refreshed entries beyond max_entries, are evicted when the cache is closed.
+
+    New entries are written in batches; call flush or close to make them persistent. If the database cannot be
+    read or written, e.g. it is read-only or corrupted, the cache is disabled with a warning: every path is a miss
+    and nothing is written any more, so that the ACLs are read from the file system as without the cache.
+
+    A cached ACL is trusted as it is; the database must therefore not be writable by anyone but the user
+    running the process, see getACLCache.
+
+    Example:
+
+        c = getACLCache('/var/cache/pps', '/project/3010000.01')
+        st = os.stat(path)
+        aces = c.get(path, st)
+        if aces is None:
+            aces = readACL(path)
+            c.put(path, st, aces)
+        c.close()
+    """
+
+    def __init__(self, dbfile, max_entries=2000000, max_age=30 * 86400, batch_size=1000, lvl=0):
+        """
+        :param dbfile: path of the SQLite database file
+        :param max_entries: the maximum number of entries kept
+        :param max_age: seconds an entry is kept without being refreshed
+        :param batch_size: number of new entries written to the database at once
+        :param lvl: logging level
+        """
+        self.dbfile = dbfile
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.logger = getLogger(name=self.__class__.__name__, lvl=lvl)
+
+        # the connection is shared by the worker threads of the parallel tree walk
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(dbfile, timeout=60, check_same_thread=False)
+        self.db.text_factory = str
+        self.db.execute('CREATE TABLE IF NOT EXISTS acls (path TEXT PRIMARY KEY, ino INTEGER, ctime REAL, '
+                        'acl TEXT, stamp REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS acls_stamp ON acls (stamp)')
+        self.db.commit()
+
+        self.pending = []
+        self.touched = []
+        self.hits = 0
+        self.misses = 0
+        self.enabled = True
+
+    def get(self, path, st):
+        """
+        gets the cached ACL of the path
+        :param path: the file system path
+        :param st: the stat result of the path
+        :return: a list of ACE objects, or None if the path is not cached or has changed
+        """
+        self.lock.acquire()
+        try:
+            r = None
+            if self.enabled:
+                try:
+                    r = self.db.execute('SELECT ino, ctime, acl FROM acls WHERE path = ?', (path,)).fetchone()
+                except sqlite3.Error as e:
+                    self.__disable__(e)
+            if r is not None and r[0] == st.st_ino and r[1] == st.st_ctime:
+                self.hits += 1
+                # refresh the stamp, so that the entry is not evicted as long as it is used
+                self.touched.append((time.time(), path))
+                self.__batch__()
+                return loadACL(r[2])
+            self.misses += 1
+            return None
+        finally:
+            self.lock.release()
+
+    def put(self, path, st, aces):
+        """
+        caches the ACL of the path
+        :param path: the file system path
+        :param st: the stat result of the path taken before the ACL is read
+        :param aces: a list of ACE objects
+        :return:
+        """
+        self.lock.acquire()
+        try:
+            if self.enabled:
+                self.pending.append((path, st.st_ino, st.st_ctime, dumpACL(aces), time.time()))
+                self.__batch__()
+        finally:
+            self.lock.release()
+
+    def flush(self):
+        """
+        writes the new entries into the database
+        :return:
+        """
+        self.lock.acquire()
+        try:
+            self.__flush__()
+        finally:
+            self.lock.release()
+
+    def evict(self):
+        """
+        removes the entries older than max_age, and the oldest entries beyond max_entries
+        :return: the number of removed entries
+        """
+        self.lock.acquire()
+        try:
+            self.__flush__()
+            if not self.enabled:
+                return 0
+            try:
+                n = self.db.execute('DELETE FROM acls WHERE stamp < ?', (time.time() - self.max_age,)).rowcount
+                n += self.db.execute('DELETE FROM acls WHERE path IN (SELECT path FROM acls ORDER BY stamp DESC, rowid DESC '
+                                     'LIMIT -1 OFFSET ?)', (self.max_entries,)).rowcount
+                self.db.commit()
+                return n
+            except sqlite3.Error as e:
+                self.__disable__(e)
+                return 0
+        finally:
+            self.lock.release()
+
+    def close(self):
+        """
+        flushes the new entries, evicts the expired ones and closes the database
+        :return:
+        """
+        n = self.evict()
+        self.logger.debug('%s: %d hits, %d misses, %d entries evicted' % (self.dbfile, self.hits, self.misses, n))
+        try:
+            self.db.close()
+        except sqlite3.Error as e:
+            self.logger.warning('cannot close ACL cache %s: %s' % (self.dbfile, e))
+
+    def __batch__(self):
+        if len(self.pending) + len(self.touched) >= self.batch_size:
+            self.__flush__()
+
+    def __flush__(self):
+        if (self.pending or self.touched) and self.enabled:
+            try:
+                self.db.executemany('INSERT OR REPLACE INTO acls (path, ino, ctime, acl, stamp) VALUES (?, ?, ?, ?, ?)',
+                                    self.pending)
+                self.db.executemany('UPDATE acls SET stamp = ? WHERE path = ?', self.touched)
+                self.db.commit()
+            except sqlite3.Error as e:
+                self.__disable__(e)
+        self.pending = []
+        self.touched = []
+
+    def __disable__(self, err):
+        # the ACLs are read from the file system from now on
+        self.logger.warning('ACL cache disabled, cannot use %s: %s' % (self.dbfile, err))
+        self.enabled = False
+        self.pending = []
+        self.touched = []
+        try:
+            self.db.rollback()
+        except sqlite3.Error:
+            pass
+
+
+def getACLCache(cache_dir, project_root, **kwargs):
+    """
+    opens the ACL cache of a project, one database file per project in the cache directory.
+
+    The cached ACLs are reported as they are, e.g. pushed into the project database by the root cron job.
+    The cache directory and the database file must therefore be owned by the user running the process and not
+    be writable by others; a cache directory shared by users, e.g. a common ACL_CACHE_DIR for getacl.py and
+    the cron job, is refused.
+
+    :param cache_dir: the cache directory, created if it does not exist
+    :param project_root: the top-level directory of the project
+    :param kwargs: the other arguments of ACLCache
+    :return: the ACLCache object
+    :raise OSError: if the cache directory or the database file may be written by another user
+    """
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, 0700)
+
+    key = os.path.normpath(os.path.abspath(project_root))
+    dbfile = os.path.join(cache_dir, 'acl_%s.sqlite' % hashlib.sha1(key).hexdigest())
+
+    __checkOwner__(cache_dir)
+    if os.path.exists(dbfile):
+        __checkOwner__(dbfile)
+    else:
+        os.close(os.open(dbfile, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0600))
+
+    return ACLCache(dbfile, **kwargs)
+
+
+def __checkOwner__(path):
+    st = os.lstat(path)
+    if st.st_uid != os.geteuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH) or stat.S_ISLNK(st.st_mode):
+        raise OSError('%s is not owned by uid %d, or is writable by others' % (path, os.geteuid()))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+import threading
+
+
+def canonicalACL(aces):
+    """
+    makes the canonical, hashable representation of an ACL
+    :param aces: a list of ACE objects
+    :return: a tuple of ACE strings in the nfs4_getfacl notation
+    """
+    return tuple(map(lambda x: x.__str__(), aces))
+
+
+class ACLClassTable(object):
+    """
+    Table of the distinct ACLs, the ACL classes, seen during a tree walk.
+
+    Most files under a directory carry the same ACL. The table maps every distinct ACL to a small integer
+    class id, and keeps the ACEs and the roles of the class; so that an ACL is mapped to roles only once,
+    no matter how many paths carry it.
+
+    Example:
+
+        t = ACLClassTable()
+        cid, roles = t.intern(aces, lambda aces: mapToRoles(aces))
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = {}
+        self.classes = []
+
+    def intern(self, aces, mapper):
+        """
+        looks up the class of the given ACL, and adds a new class if the ACL has not been seen before
+        :param aces: a list of ACE objects
+        :param mapper: function mapping the ACEs of a new class to its roles
+        :return: a tuple of (class id, roles of the class)
+        """
+
+        key = canonicalACL(aces)
+        cid = self.ids.get(key)
+        if cid is None:
+            # map outside the lock, a concurrent insertion of the same ACL is resolved below
+            roles = mapper(aces)
+
+            self.lock.acquire()
+            try:
+                cid = self.ids.get(key)
+                if cid is None:
+                    cid = len(self.classes)
+                    self.classes.append((tuple(aces), roles))
+                    self.ids[key] = cid
+            finally:
+                self.lock.release()
+
+        return cid, self.classes[cid][1]
+
+    def aces(self, cid):
+        """
+        gets the ACEs of a class
+        :param cid: the class id
+        :return: a tuple of ACE objects
+        """
+        return self.classes[cid][0]
+
+    def roles(self, cid):
+        """
+        gets the roles of a class
+        :param cid: the class id
+        :return: the roles, as returned by the mapper given to intern
+        """
+        return self.classes[cid][1]
+
+    def __len__(self):
+        return len(self.classes)
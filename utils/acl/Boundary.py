@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+import os
+
+
+def iterBoundaries(top, roles, dirs):
+    """
+    reduces the roles of a recursive walk to the ACL boundaries, i.e. the top directory and the paths whose
+    roles differ from the roles of their parent directory. A path with the same roles as its parent is
+    counted in the inherited attribute of the boundary its parent belongs to.
+
+    The RoleData objects may come in any order, e.g. from concurrent ACL readers; a path whose parent has
+    not been seen yet is held back until the parent comes. Only the directories are remembered, so the memory
+    use scales with the number of directories and boundaries, not with the number of files.
+
+    :param top: the top directory of the walk
+    :param roles: an iterable of RoleData objects of top and all paths under it
+    :param dirs: a container of the directories among the paths, normalised with os.path.normpath; a directory
+                 must be in it before its RoleData object is given
+    :return: a generator of the boundary RoleData objects, sorted by path, once the walk is complete
+    """
+
+    top = os.path.normpath(top)
+
+    # directory -> (roles of the directory, the boundary it belongs to)
+    state = {}
+
+    # parent directory -> paths held back until the parent is seen
+    waiting = {}
+
+    boundaries = []
+
+    def __process__(k, rd):
+        if k == top:
+            b = rd
+            boundaries.append(b)
+        else:
+            proles, b = state[os.path.dirname(k)]
+            if rd.roles is proles or rd.roles == proles:
+                b.inherited += 1
+            else:
+                b = rd
+                boundaries.append(b)
+
+        if k in dirs:
+            state[k] = (rd.roles, b)
+            return waiting.pop(k, [])
+
+        return []
+
+    for rd in roles:
+        k = os.path.normpath(rd.path)
+        if k != top and os.path.dirname(k) not in state:
+            waiting.setdefault(os.path.dirname(k), []).append((k, rd))
+            continue
+
+        stack = [(k, rd)]
+        while stack:
+            k, rd = stack.pop()
+            stack += __process__(k, rd)
+
+    # the content of directories whose RoleData never came, e.g. an ACL read failure, is reported as is
+    for pk in sorted(waiting.keys()):
+        for k, rd in waiting[pk]:
+            boundaries.append(rd)
+
+    for b in sorted(boundaries, key=lambda x: x.path):
+        yield b
@@ -11,13 +11,14 @@ from tempfile import NamedTemporaryFile
 from utils.acl.RoleData import RoleData
 from utils.acl.ACE import ACE
 from utils.acl.Nfs4NetApp import Nfs4NetApp
+from utils.acl.Walker import Walker
 from utils.Shell import Shell
 from utils.acl.UserRole import ROLE_ADMIN, ROLE_CONTRIBUTOR, ROLE_TRAVERSE, ROLE_USER
 
 class Nfs4FreeNAS(Nfs4NetApp):
 
-    def __init__(self, project_root, lvl=0):
-        Nfs4NetApp.__init__(self, project_root, lvl)
+    def __init__(self, project_root, lvl=0, use_xattr=True):
+        Nfs4NetApp.__init__(self, project_root, lvl, use_xattr)
 
     def setRoles(self, path='', users=[], contributors=[], admins=[], recursive=False, force=False, traverse=False,
                  logical=False, batch=False):
@@ -32,6 +33,9 @@ class Nfs4FreeNAS(Nfs4NetApp):
                 self.logger.error('user %s presents in multiple roles.' % u)
             return False
 
+        # the redundant users are removed from copies, the lists of the caller may be shared by concurrent calls
+        users, contributors, admins = list(users), list(contributors), list(admins)
+
         ulist = {ROLE_ADMIN: admins,
                  ROLE_CONTRIBUTOR: contributors,
                  ROLE_USER: users,
@@ -50,7 +54,7 @@ class Nfs4FreeNAS(Nfs4NetApp):
                     r = self.mapACEtoRole(ace)
 
                     # indicate group principle, except the the default GROUP@ identity 
-                    if ace.flag.lower().find('g') >= 0:
+                    if ace.isGroup():
                         u = 'g:%s' % u
 
                     if u in ulist[r]:
@@ -77,7 +81,7 @@ class Nfs4FreeNAS(Nfs4NetApp):
             u = ace.principle.split('@')[0]
 
             # indicate group principle, except the the default GROUP@ identity
-            if ace.flag.lower().find('g') >= 0 and u not in self.default_principles:
+            if ace.isGroup() and u not in self.default_principles:
                 u = 'g:%s' % u
                 if u not in _ulist_a:
                     n_aces_grp.append(ace)
@@ -122,11 +126,11 @@ class Nfs4FreeNAS(Nfs4NetApp):
 
         if not force:
             # check users in existing ACL to avoid redundant operations
-            _u_exist = []
+            _u_exist = set()
             for ace in o_aces:
-                u = 'g:%s' % ace.principle.split('@')[0] if ace.flag.lower().find('g') >= 0 else ace.principle.split('@')[0]
-                if u not in _u_exist + self.default_principles:
-                    _u_exist.append(u)
+                u = 'g:%s' % ace.principle.split('@')[0] if ace.isGroup() else ace.principle.split('@')[0]
+                if u not in self.default_principles:
+                    _u_exist.add(u)
 
             # resolve the users requiring actual removal of ACEs
             _u_remove = list( set(users) & set(_u_exist) )
@@ -144,7 +148,7 @@ class Nfs4FreeNAS(Nfs4NetApp):
         # compose new ACL regarding the removal
         n_aces = []
         for ace in o_aces:
-            u = 'g:%s' % ace.principle.split('@')[0] if ace.flag.lower().find('g') >= 0 else ace.principle.split('@')[0]
+            u = 'g:%s' % ace.principle.split('@')[0] if ace.isGroup() else ace.principle.split('@')[0]
             if u not in users:
                 n_aces.append(ace)
             else:
@@ -182,7 +186,7 @@ class Nfs4FreeNAS(Nfs4NetApp):
                 n_aces.append(ace)
             elif self.__userExist__(u):
                 n_aces.append(ace)
-            elif ace.flag.lower().find('g') >= 0 and self.__groupExist__(u):
+            elif ace.isGroup() and self.__groupExist__(u):
                 n_aces.append(ace)
             else:
                 self.logger.warning('ignore ACE for invalid user: %s' % u)
@@ -208,13 +212,9 @@ class Nfs4FreeNAS(Nfs4NetApp):
 
         recursive = False
 
-        if options:
-            if '-R' in options:
-                recursive = True
-                options.remove('-R')
-            cmd = 'nfs4_setfacl %s ' % ' '.join(options)
-        else:
-            cmd = 'nfs4_setfacl '
+        if options and '-R' in options:
+            recursive = True
+            options.remove('-R')
 
         # workaround for NetApp for the path is actually the root of the volume
         if os.path.isdir(path) and path[-1] is not '/':
@@ -239,59 +239,29 @@ class Nfs4FreeNAS(Nfs4NetApp):
                      'aces': aces}, f)
         f.close()
 
-        s = Shell()
-
         rc = 0
         if recursive and os.path.isdir(path):
 
-            # compose setacl command for directory ACEs
-            cmd_d = '%s "%s" ' % (cmd, ','.join(map(lambda x: x.__str__(), aces)))
-            # compose setacl command for file ACEs
-            # get ACEs with principle domain @dccn.nl; but without 'd' inherit flag
+            # ACEs for files: ACEs with principle domain @dccn.nl; but without 'd' inherit flag
             aces_f = filter( lambda x: not x.isDefaultPrinciple() and not x.isDirectoryInherited(), aces )
 
-            # execute multiple nfs4_setfacl command, iteratively
-            for (dirPath, dirNames, fileNames) in os.walk(path):
-                # on dir
-                _cmd = '%s "%s"' % (cmd_d, dirPath)
-                rc, outfile, m = s.cmd(_cmd, timeout=None, mention_outputfile_on_errors=True)
-                if rc != 0:
-                    self.logger.error('%s failed' % _cmd)
-                    break
+            # apply ACL on every directory and file, iteratively; symbolic links are followed with '-L'
+            w = Walker(followlinks='-L' in options)
+            for p, isdir in w.walk(path):
+                if isdir:
+                    rc = self.__nfs4_setfacl_path__(p, aces, options)
                 else:
-                    os.unlink(outfile)
-
-                # on files
-                ick = True
-                for f in fileNames:
-                    fpath = os.path.join(dirPath, f)
                     # combine the existing default ACEs (i.e. ACEs without pricinple domain)
-                    aces_d = filter( lambda x:x.isDefaultPrinciple(), self.__nfs4_getfacl__(fpath))
-                    _cmd = '%s "%s" "%s"' % (cmd, ','.join(map(lambda x: x.__str_no_inheritance__(), aces_f + aces_d)), fpath)
-                    rc, outfile, m = s.cmd(_cmd, timeout=None, mention_outputfile_on_errors=True)
-                    if rc != 0:
-                        self.logger.error('%s failed' % _cmd)
-                        ick = False
-                        break
-                    else:
-                        os.unlink(outfile)
+                    aces_d = filter( lambda x:x.isDefaultPrinciple(), self.__nfs4_getfacl__(p))
+                    rc = self.__nfs4_setfacl_path__(p, aces_f + aces_d, options, inheritance=False)
 
                 # leave the main loop if something goes wrong
-                if not ick:
+                if rc != 0:
                     break
         else:
-            # execute single nfs4_setfacl command
-            if os.path.isdir(path):
-                cmd += '"%s" "%s"' % (','.join(map(lambda x: x.__str__(), aces)), path)
-            else:
-                cmd += '"%s" "%s"' % (','.join(map(lambda x: x.__str_no_inherit__(), aces)), path)
+            # apply ACL on a single directory or file
+            rc = self.__nfs4_setfacl_path__(path, aces, options, inheritance=os.path.isdir(path))
 
-            rc, outfile, m = s.cmd(cmd, timeout=None, mention_outputfile_on_errors=True)
-            if rc != 0:
-                self.logger.error('%s failed' % cmd)
-            else:
-                os.unlink(outfile)
-         
         # cleanup lock file regardless the result
         try:
             os.remove(lock_fpath)
@@ -7,19 +7,41 @@ import socket
 import re
 import inspect
 import grp 
+import Queue
+import sqlite3
+import threading
 from tempfile import NamedTemporaryFile
-from utils.acl.RoleData import RoleData
+from utils.acl.RoleData import RoleData, makeRoles
+from utils.acl.ACLClass import ACLClassTable
+from utils.acl.ACLCache import getACLCache
+from utils.acl.RoleMask import RoleMaskTable
 from utils.acl.ACE import ACE
 from utils.acl.ProjectACL import ProjectACL
+from utils.acl import Nfs4Xattr
+from utils.acl.Walker import Walker
+from utils.acl.Boundary import iterBoundaries
 from utils.Shell import Shell
+from utils.PrincipalIndex import getPrincipalIndex
+from utils.ShellPool import ShellPool
 from utils.acl.UserRole import ROLE_ADMIN, ROLE_CONTRIBUTOR, ROLE_TRAVERSE, ROLE_USER
 
 class Nfs4NetApp(ProjectACL):
 
-    def __init__(self, project_root, lvl=0):
+    def __init__(self, project_root, lvl=0, use_xattr=True, cache_dir=None):
         ProjectACL.__init__(self, project_root, lvl)
         self.type = 'NFS4'
 
+        # read/write ACL directly via the system.nfs4_acl attribute instead of the nfs4_*facl commands
+        self.use_xattr = use_xattr
+
+        # directory of the persistent per-project ACL caches, None for no cache; see getACLCache
+        self.cache_dir = cache_dir
+        self.lvl = lvl
+        self.__init_project__()
+
+        # distinct ACLs seen by iterRoles, each mapped to roles only once
+        self.acl_classes = ACLClassTable()
+
         self.ROLE_PERMISSION = {ROLE_ADMIN: 'RXWdDoy',
                                 ROLE_CONTRIBUTOR: 'rwaDdxnNtTcy',
                                 ROLE_USER: 'RXy',
@@ -33,57 +55,102 @@ class Nfs4NetApp(ProjectACL):
 
         self.default_principles = ['GROUP', 'OWNER', 'EVERYONE']
 
-    def getRoles(self, path='', recursive=False):
+        # role masks as bitmasks, with the memoized mask-to-role lookup
+        self.role_masks = RoleMaskTable(self.ROLE_PERMISSION, self.all_permission, self._alias_)
+
+    def __init_project__(self):
+        # the ACL cache of the current project, opened on first use
+        self.acl_cache = None
+        self.acl_cache_root = None
+
+    def iterRoles(self, path='', recursive=False, nthreads=1, boundary=False):
+        """
+        generator of user roles of the given path.
+        :param path: the file system path relative to the project_root
+        :param recursive: get roles recursively for all sub-paths
+        :param nthreads: number of worker threads listing directories and reading ACLs concurrently in the
+                         recursive mode; 1 walks the tree serially and reads ACLs in batches
+        :param boundary: in the recursive mode, only yield the ACL boundaries, i.e. the path and the sub-paths with
+                         roles different from their parent directory, each with the number of descendants
+                         inheriting its roles in the inherited attribute; see iterBoundaries
+        :return: a generator of RoleData objects, in the recursive mode in the order the ACLs are retrieved
+        """
 
         path = os.path.join(self.project_root, path)
 
+        # open the ACL cache before the worker threads of the parallel walk use it
+        self.__get_acl_cache__()
+
         def __fs_walk_error__(err):
             print 'cannot list file: %s' % err.filename
 
+        # directories of the walk, needed for the ACL-boundary mode
+        dirs = set()
+
+        def __fs_walk__(w):
+            for p, isdir in w.walk(path):
+                if isdir:
+                    dirs.add(os.path.normpath(p))
+                yield p
+
         # make system call to retrieve NFSV4 ACL
-        acl = {}
-        if recursive:
-            # walk through all directories/files under the path
-            for r, ds, fs in os.walk(path, onerror=__fs_walk_error__):
-                # retrieve directory ACL
-                acl[r] = self.__nfs4_getfacl__(r)
-
-                # retrieve file ACL
-                for f in map(lambda x: os.path.join(r, x), fs):
-                    acl[f] = self.__nfs4_getfacl__(f)
+        if recursive and nthreads > 1:
+            acls = self.__nfs4_getfacl_parallel__(path, nthreads, onerror=__fs_walk_error__,
+                                                  ondir=lambda p: dirs.add(os.path.normpath(p)))
+        elif recursive:
+            # walk through all directories/files under the path, and retrieve their ACLs in batches
+            acls = self.__nfs4_getfacl_batch__(__fs_walk__(Walker(onerror=__fs_walk_error__)))
         else:
-            acl[path] = self.__nfs4_getfacl__(path)
+            acls = [(path, self.__nfs4_getfacl__(path))]
 
-        # convert NFSV4 ACL into roles
-        roles = []
-        for p, aces in acl.iteritems():
+        # convert NFSV4 ACL into roles, once per distinct ACL
+        def __roles__():
+            for p, aces in acls:
+                cid, roles = self.acl_classes.intern(aces, self.__mapACLtoRoles__)
+                yield RoleData(path=p, roles=roles, aclid=cid)
 
-            rdata = RoleData(path=p)
+        try:
+            if recursive and boundary:
+                for rd in iterBoundaries(path, __roles__(), dirs):
+                    yield rd
+            else:
+                for rd in __roles__():
+                    yield rd
+        finally:
+            if self.acl_cache:
+                self.acl_cache.flush()
 
-            for ace in aces:
-                # exclude the default principles
-                u = ace.principle.split('@')[0]
-                if u not in self.default_principles and ace.type in ['A']:
-                    r = self.mapACEtoRole(ace)
+    def __mapACLtoRoles__(self, aces):
+        """
+        converts NFSv4 ACL into roles
+        :param aces: a list of ACE objects
+        :return: a role-to-users mapping made by makeRoles
+        """
 
-                    # check validity of the given user or group
-                    v = False
-                    if ace.flag.lower().find('g') >= 0:
-                       # indicate the given user is a group 
-                       v = self.__groupExist__(u)
-                       u = 'g:%s' % u
-                    else:
-                       v = self.__userExist__(u)
+        roles = {}
 
-                    if v:
-                        rdata.addUserToRole(r, u)
-                        self.logger.debug('user %s: permission %s, role %s' % (u, ace.mask, r))
-                    else:
-                        self.logger.warning('invalid system user %s: permission %s, role %s' % (u, ace.mask, r))
+        for ace in aces:
+            # exclude the default principles
+            u = ace.principle.split('@')[0]
+            if u not in self.default_principles and ace.type in ['A']:
+                r = self.mapACEtoRole(ace)
+
+                # check validity of the given user or group
+                v = False
+                if ace.isGroup():
+                   # indicate the given user is a group 
+                   v = self.__groupExist__(u)
+                   u = 'g:%s' % u
+                else:
+                   v = self.__userExist__(u)
 
-            roles.append(rdata)
+                if v:
+                    roles.setdefault(r, set()).add(u)
+                    self.logger.debug('user %s: permission %s, role %s' % (u, ace.mask, r))
+                else:
+                    self.logger.warning('invalid system user %s: permission %s, role %s' % (u, ace.mask, r))
 
-        return roles
+        return makeRoles(roles)
 
     def mapRoleToACE(self, role):
         pass
@@ -101,6 +168,9 @@ class Nfs4NetApp(ProjectACL):
                 self.logger.error('user %s presents in multiple roles.' % u)
             return False
 
+        # the redundant users are removed from copies, the lists of the caller may be shared by concurrent calls
+        users, contributors, admins = list(users), list(contributors), list(admins)
+
         ulist = {ROLE_ADMIN: admins,
                  ROLE_CONTRIBUTOR: contributors,
                  ROLE_USER: users,
@@ -119,7 +189,7 @@ class Nfs4NetApp(ProjectACL):
                     r = self.mapACEtoRole(ace)
 
                     # indicate group principle, except the the default GROUP@ identity 
-                    if ace.flag.lower().find('g') >= 0:
+                    if ace.isGroup():
                         u = 'g:%s' % u
 
                     if u in ulist[r]:
@@ -146,7 +216,7 @@ class Nfs4NetApp(ProjectACL):
             u = ace.principle.split('@')[0]
 
             # indicate group principle, except the the default GROUP@ identity
-            if ace.flag.lower().find('g') >= 0 and u not in self.default_principles:
+            if ace.isGroup() and u not in self.default_principles:
                 u = 'g:%s' % u
                 if u not in _ulist_a:
                     n_aces_grp.append(ace)
@@ -189,11 +259,11 @@ class Nfs4NetApp(ProjectACL):
 
         if not force:
             # check users in existing ACL to avoid redundant operations
-            _u_exist = []
+            _u_exist = set()
             for ace in o_aces:
-                u = 'g:%s' % ace.principle.split('@')[0] if ace.flag.lower().find('g') >= 0 else ace.principle.split('@')[0]
-                if u not in _u_exist + self.default_principles:
-                    _u_exist.append(u)
+                u = 'g:%s' % ace.principle.split('@')[0] if ace.isGroup() else ace.principle.split('@')[0]
+                if u not in self.default_principles:
+                    _u_exist.add(u)
 
             # resolve the users requiring actual removal of ACEs
             _u_remove = list( set(users) & set(_u_exist) )
@@ -211,7 +281,7 @@ class Nfs4NetApp(ProjectACL):
         # compose new ACL regarding the removal
         n_aces = []
         for ace in o_aces:
-            u = 'g:%s' % ace.principle.split('@')[0] if ace.flag.lower().find('g') >= 0 else ace.principle.split('@')[0]
+            u = 'g:%s' % ace.principle.split('@')[0] if ace.isGroup() else ace.principle.split('@')[0]
             if u not in users:
                 n_aces.append(ace)
             else:
@@ -231,13 +301,8 @@ class Nfs4NetApp(ProjectACL):
             return self.__nfs4_setfacl__(path, n_aces, _opts)
 
     def mapACEtoRole(self, ace):
-        diff = {}
-        for r in self.ROLE_PERMISSION.keys():
-            diff[r] = list(set(list(ace.mask)) ^ set(list(self.__get_permission__(r)['A'])))
-            self.logger.debug('diff to role %s: %s' % (r, repr(diff[r])))
-
-        # find the closest match, i.e. shortest string on the value of the diff dict
-        return sorted(diff.items(), key=lambda x: len(x[1]))[0][0]
+        # the closest match, i.e. the role with the fewest permissions different from the ACE mask
+        return self.role_masks.classify(ace.mask)
 
     # internal functions
     def __set_traverse_role__(self, path, users):
@@ -260,8 +325,9 @@ class Nfs4NetApp(ProjectACL):
 
             # consider users that needs to be added to the ACL for traverse role
             # we assume the user has already the traverse permission if it is already in ACL
+            _u_exist = set(map(lambda x: 'g:%s' % x.principle.split('@')[0] if x.isGroup() else x.principle.split('@')[0], o_aces))
             for u in users:
-                if u not in map(lambda x: 'g:%s' % x.principle.split('@')[0] if x.flag.lower().find('g') >= 0 else x.principle.split('@')[0], o_aces):
+                if u not in _u_exist:
                     self.logger.debug("adding user to traverse role: %s" % u)
                     _perm = self.__get_permission__(ROLE_TRAVERSE)
                     if u.find('g:') == 0:
@@ -269,9 +335,14 @@ class Nfs4NetApp(ProjectACL):
                     else:
                         n_aces.insert(0, ACE(type='A', flag='d', principle='%s@dccn.nl' % u, mask=_perm['A']))
 
-            # apply n_aces
-            _opts = ['-s']
-            ick = self.__nfs4_setfacl__(path, n_aces, _opts)
+            # apply n_aces, unless all users are already in the ACL and curation leaves it unchanged;
+            # __curateACE__ modifies the ACEs in place, so it is given copies of the current ones
+            _c_aces = self.__curateACE__(map(lambda x: ACE(type=x.type, flag=x.flag, principle=x.principle, mask=x.mask), o_aces))
+            if n_aces == o_aces and _c_aces == o_aces:
+                self.logger.debug('traverse role already set on %s' % path)
+            else:
+                _opts = ['-s']
+                ick = self.__nfs4_setfacl__(path, n_aces, _opts)
 
             if not ick:
                 self.logger.error('setting ACL for traverse role failed: %s' % path)
@@ -289,53 +360,369 @@ class Nfs4NetApp(ProjectACL):
         :return: an permission mask dictionary with keys 'A' and 'D' corresponding to the ALLOW and DENY types
         """
 
-        ace = {}
-        try:
-            _ace_a = self.ROLE_PERMISSION[role]
+        ace = self.role_masks.permission(role)
+        if ace is None:
+            self.logger.error('No such role: %s' % role)
+            ace = {}
 
-            for k, v in self._alias_.iteritems():
-                _ace_a = _ace_a.replace(k, v)
+        return ace
 
-            _ace_a = ''.join(list(set(list(_ace_a))))
-            _ace_d = ''.join(list(set(list(self.all_permission)) - set(list(_ace_a))))
+    def closeCache(self):
+        """
+        closes the ACL cache of the current project, if any, evicting its expired entries
+        :return:
+        """
+        if self.acl_cache:
+            self.acl_cache.close()
+            self.acl_cache = None
 
-            ace['A'] = _ace_a
-            ace['D'] = _ace_d
+    def __get_acl_cache__(self):
+        """
+        gets the ACL cache of the current project, the cache of the previous project is closed
+        :return: the ACLCache object, or None if the cache is disabled or cannot be opened
+        """
+        if not self.cache_dir:
+            return None
 
-        except KeyError, e:
-            self.logger.error('No such role: %s' % role)
+        root = os.path.normpath(os.path.abspath(self.project_root))
+        if self.acl_cache and self.acl_cache_root == root:
+            # None if the cache has been disabled on a database error
+            return self.acl_cache if self.acl_cache.enabled else None
 
-        return ace
+        self.closeCache()
+        try:
+            self.acl_cache = getACLCache(self.cache_dir, root, lvl=self.lvl)
+            self.acl_cache_root = root
+        except (OSError, IOError, sqlite3.Error) as e:
+            self.logger.warning('ACL cache disabled, cannot open it in %s: %s' % (self.cache_dir, e))
+            self.cache_dir = None
+        return self.acl_cache
+
+    def __stat__(self, path):
+        """
+        stats the path for the ACL cache
+        :param path: the file system path
+        :return: the stat result, or None if the path cannot be stat'ed
+        """
+        try:
+            return os.stat(path)
+        except OSError:
+            return None
 
     def __nfs4_getfacl__(self, path):
+        """
+        gets ACL of the given path, from the ACL cache if the path has not changed since it is cached
+        :param path: the file system path
+        :return: a list of ACE objects
+        """
 
-        self.logger.debug('get ACL of %s ...' % path)
+        cache = self.__get_acl_cache__()
+        if not cache:
+            return self.__nfs4_getfacl_path__(path)
 
-        def __parseACL__(acl_str):
-            """ parses ACL table into ACE objects
-            """
-            acl = []
-            for ace in acl_str.split('\n'):
-                if ace:
-                    d = ace.split(':')
-                    if len(d) == 4:
-                        acl.append(ACE(type=d[0], flag=d[1], principle=d[2], mask=d[3]))
-                    else:
-                        self.logger.debug("invalid ACE: %s" % ace)
-            return acl
+        st = self.__stat__(path)
+        if st:
+            aces = cache.get(path, st)
+            if aces is not None:
+                return aces
+
+        aces = self.__nfs4_getfacl_path__(path)
+        if st and aces:
+            cache.put(path, st, aces)
+        return aces
+
+    def __nfs4_getfacl_path__(self, path):
+
+        self.logger.debug('get ACL of %s ...' % path)
 
         # workaround for NetApp for the path is actually the root of the volume
         if os.path.isdir(path) and path[-1] is not '/':
             path += '/'
 
-        cmd = 'nfs4_getfacl "%s"' % path
+        if self.use_xattr:
+            try:
+                return Nfs4Xattr.getACL(path)
+            except (OSError, IOError, ValueError) as e:
+                self.logger.debug('cannot read %s of %s, fallback to nfs4_getfacl: %s' % (Nfs4Xattr.XATTR_NFS4_ACL, path, e))
+
+        cmd = ['nfs4_getfacl', path]
         s = Shell()
         rc, output, m = s.cmd1(cmd, allowed_exit=[0, 255], timeout=None)
         if rc != 0:
-            self.logger.error('%s failed' % cmd)
+            self.logger.error('%s failed' % ' '.join(cmd))
             return []
         else:
-            return __parseACL__(output)
+            return self.__parseACL__(output)
+
+    def __nfs4_getfacl_batch__(self, paths, batch_size=500, nprocs=4):
+        """
+        generator retrieving ACLs of many paths with as few nfs4_getfacl invocations as possible.
+        Paths are passed to nfs4_getfacl in batches limited by batch_size and the argument length
+        allowed by the system; the combined output is split by the per-file '# file:' header as it arrives,
+        so that the ACL of a path is yielded as soon as the next one in the same batch is printed.
+        Up to nprocs batches are read concurrently.
+        :param paths: an iterable of file system paths
+        :param batch_size: the maximum number of paths given to one nfs4_getfacl invocation
+        :param nprocs: the maximum number of concurrent nfs4_getfacl invocations
+        :return: a generator of (path, [ACE]) tuples
+        """
+
+        # arguments and environment share the ARG_MAX space, leave some room for the command itself
+        arg_max = os.sysconf('SC_ARG_MAX') - sum(map(lambda x: len(x[0]) + len(x[1]) + 2 + 8, os.environ.items())) - 4096
+
+        pool = ShellPool(max_workers=nprocs)
+        running = []
+
+        # the ACL cache, and the stat results of the paths read while it is enabled
+        cache = self.__get_acl_cache__()
+        stats = {}
+
+        def __result__(p, aces):
+            st = stats.pop(p, None)
+            if st and aces:
+                cache.put(p, st, aces)
+            return p, aces
+
+        def __submit__(batch):
+            # batch is a list of (argument, path) tuples
+            cmd = ['nfs4_getfacl'] + map(lambda x: x[0], batch)
+            f = pool.submit(cmd, allowed_exit=range(256), tag=batch)
+            # the arguments not yet presented in the output, and the output not yet parsed
+            f.args = dict(batch)
+            f.buf = ''
+            running.append(f)
+
+        def __parse__(f, complete):
+            # yields results of the records in the output of f, the last record is held back unless complete
+            f.buf += f.fetch()
+            if complete:
+                data, f.buf = f.buf, ''
+            else:
+                # a record is complete when the header of the next one is received
+                i = f.buf.rfind('\n# file: ')
+                if i < 0:
+                    return
+                data, f.buf = f.buf[:i + 1], f.buf[i + 1:]
+
+            for a, aces in self.__parseACLStream__(data.split('\n')):
+                if a in f.args:
+                    yield __result__(f.args.pop(a), aces)
+
+        def __collect__(nmax):
+            # yields results as the output of the batches arrives, until at most nmax batches are still running
+            while len(running) > nmax:
+                finished = pool.step()
+                for f in list(running):
+                    done = f in finished
+                    for r in __parse__(f, done):
+                        yield r
+
+                    if done:
+                        running.remove(f)
+                        # paths not presented in the output are retried one-by-one so that errors are reported per path
+                        for a, p in f.tag:
+                            if a in f.args:
+                                yield __result__(p, self.__nfs4_getfacl_path__(p))
+
+        batch = []
+        nbytes = 0
+        for p in paths:
+
+            if cache:
+                st = self.__stat__(p)
+                if st:
+                    aces = cache.get(p, st)
+                    if aces is not None:
+                        yield p, aces
+                        continue
+                    stats[p] = st
+
+            self.logger.debug('get ACL of %s ...' % p)
+
+            # workaround for NetApp for the path is actually the root of the volume
+            a = p
+            if os.path.isdir(a) and a[-1] is not '/':
+                a += '/'
+
+            if self.use_xattr:
+                try:
+                    yield __result__(p, Nfs4Xattr.getACL(a))
+                    continue
+                except (OSError, IOError, ValueError) as e:
+                    self.logger.debug('cannot read %s of %s, fallback to nfs4_getfacl: %s' % (Nfs4Xattr.XATTR_NFS4_ACL, a, e))
+
+            # the argument string plus its pointer in argv
+            n = len(a) + 1 + 8
+            if batch and (len(batch) >= batch_size or nbytes + n > arg_max):
+                __submit__(batch)
+                batch = []
+                nbytes = 0
+
+                # keep reading the tree while the batches are running
+                for r in __collect__(nprocs - 1):
+                    yield r
+
+            batch.append((a, p))
+            nbytes += n
+
+        if len(batch) == 1 and not running:
+            yield __result__(batch[0][1], self.__nfs4_getfacl_path__(batch[0][1]))
+        elif batch:
+            __submit__(batch)
+
+        for r in __collect__(0):
+            yield r
+
+    def __nfs4_getfacl_parallel__(self, path, nthreads, onerror=None, ondir=None, queue_size=1000):
+        """
+        generator walking through the tree under path with nthreads worker threads. A worker reads the ACL of
+        a directory and lists it, or reads the ACL of a file; so that directory listings and ACL retrievals
+        over NFS are overlapped. Paths are visited as the serial Walker does, i.e. symbolic links to directories
+        are not followed and the default exclude patterns apply. The entries of a directory are handed over to
+        the other workers while it is listed, through a bounded queue; when the queue is full, the listing worker
+        processes the entry itself, so that a large directory is never held in memory.
+        :param path: the top-level directory
+        :param nthreads: the number of worker threads
+        :param onerror: function called with an OSError if a directory cannot be listed
+        :param ondir: function called with the path of a directory, before the ACL of the directory is yielded
+        :param queue_size: the number of paths per thread held in the task and the result queues
+        :return: a generator of (path, [ACE]) tuples, in the order of completion
+        """
+
+        walker = Walker()
+        tasks = Queue.Queue(maxsize=nthreads * queue_size)
+        results = Queue.Queue(maxsize=nthreads * queue_size)
+        stopped = threading.Event()
+
+        # number of tasks whose result is not yet consumed
+        lock = threading.Lock()
+        pending = [1]
+
+        def __put__(r):
+            while not stopped.is_set():
+                try:
+                    results.put(r, timeout=1)
+                    return
+                except Queue.Full:
+                    pass
+
+        def __process__(p, isdir):
+            # lists a directory, handing its entries over to the other workers as they are listed, and reads the
+            # ACL of the path; exactly one result per path
+            r = (p, None)
+            try:
+                if isdir:
+                    if ondir:
+                        ondir(p)
+
+                    # as the serial Walker, the ACL of a directory that cannot be listed is still read,
+                    # only the listing error is reported
+                    e = []
+                    for c in walker.entries(p, onerror=e.append):
+                        if stopped.is_set():
+                            break
+
+                        # counted before the result of the directory, so that the walk does not end before it
+                        lock.acquire()
+                        pending[0] += 1
+                        lock.release()
+
+                        try:
+                            tasks.put_nowait(c)
+                        except Queue.Full:
+                            # the other workers are behind, the entry is processed here instead of being held
+                            __process__(*c)
+
+                    if e and onerror:
+                        onerror(e[0])
+
+                r = (p, self.__nfs4_getfacl__(p))
+            except Exception:
+                self.logger.exception('cannot process %s' % p)
+            finally:
+                # also for the skipped paths
+                __put__(r)
+
+        def __worker__():
+            while True:
+                t = tasks.get()
+                if t is None:
+                    break
+
+                if stopped.is_set():
+                    continue
+
+                __process__(*t)
+
+        workers = []
+        for i in range(nthreads):
+            w = threading.Thread(target=__worker__, name='%s_worker_%d' % (self.__class__.__name__, i))
+            w.daemon = True
+            w.start()
+            workers.append(w)
+
+        tasks.put((path, True))
+        try:
+            while True:
+                lock.acquire()
+                n = pending[0]
+                lock.release()
+                if n == 0:
+                    break
+
+                p, aces = results.get()
+
+                lock.acquire()
+                pending[0] -= 1
+                lock.release()
+
+                if aces is not None:
+                    yield p, aces
+        finally:
+            stopped.set()
+            for w in workers:
+                tasks.put(None)
+            # the workers only finish the path at hand, they must not outlive the walk
+            for w in workers:
+                w.join()
+
+    def __parseACL__(self, acl_str):
+        """
+        parses ACL table into ACE objects
+        :param acl_str: the output of nfs4_getfacl on a single path
+        :return: a list of ACE objects
+        """
+        acl = []
+        for ace in acl_str.split('\n'):
+            if ace:
+                d = ace.split(':')
+                if len(d) == 4:
+                    acl.append(ACE(type=d[0], flag=d[1], principle=d[2], mask=d[3]))
+                else:
+                    self.logger.debug("invalid ACE: %s" % ace)
+        return acl
+
+    def __parseACLStream__(self, lines):
+        """
+        generator splitting the output of nfs4_getfacl on multiple paths by the '# file:' header
+        :param lines: an iterable of output lines
+        :return: a generator of (path, [ACE]) tuples, a tuple is yielded as soon as the ACL of the path is complete
+        """
+
+        f = None
+        acl = []
+        for l in lines:
+            l = l.rstrip('\n')
+            if l.startswith('# file: '):
+                if f is not None:
+                    yield f, acl
+                f = l[len('# file: '):]
+                acl = []
+            elif f is not None and l:
+                acl += self.__parseACL__(l)
+
+        if f is not None:
+            yield f, acl
 
     def __userExist__(self, uid):
         """
@@ -344,14 +731,7 @@ class Nfs4NetApp(ProjectACL):
         :param uid: the system user id
         :return: True if the uid is valid, otherwise False
         """
-
-        ick = False
-        try:
-            pwd.getpwnam(uid)
-            ick = True
-        except KeyError, e:
-            pass
-        return ick
+        return getPrincipalIndex().userExist(uid)
 
     def __groupExist__(self, group):
         """
@@ -360,14 +740,7 @@ class Nfs4NetApp(ProjectACL):
         :param group: the system group name 
         :return: True if the group is valid, otherwise False
         """
-
-        ick = False
-        try:
-            grp.getgrnam(group)
-            ick = True
-        except KeyError, e:
-            pass
-        return ick
+        return getPrincipalIndex().groupExist(group)
 
     def __curateACE__(self, aces):
         """
@@ -387,7 +760,7 @@ class Nfs4NetApp(ProjectACL):
                 n_aces.append(ace)
             elif self.__userExist__(u):
                 n_aces.append(ace)
-            elif ace.flag.lower().find('g') >= 0 and self.__groupExist__(u):
+            elif ace.isGroup() and self.__groupExist__(u):
                 n_aces.append(ace)
             else:
                 self.logger.warning('ignore ACE for invalid user: %s' % u)
@@ -458,10 +831,10 @@ rm -f $setacl_lock
 
         # submit the job with 120 seconds timeout
         s = Shell()
-        cmd = 'qsub %s' % n
+        cmd = ['qsub', n]
         rc, output, m = s.cmd1(cmd, timeout=120)
         if rc != 0:
-            self.logger.error('fail to submit job %s' % cmd)
+            self.logger.error('fail to submit job %s' % ' '.join(cmd))
             self.logger.error(output)
         else:
             job_id = output
@@ -486,11 +859,6 @@ rm -f $setacl_lock
         for a in aces:
             self.logger.debug(a)
 
-        if options:
-            cmd = 'nfs4_setfacl %s ' % ' '.join(options)
-        else:
-            cmd = 'nfs4_setfacl '
-
         # workaround for NetApp for the path is actually the root of the volume
         if os.path.isdir(path) and path[-1] is not '/':
             path += '/'
@@ -502,14 +870,15 @@ rm -f $setacl_lock
             return False
  
         # check project quota (1K block size)
-        qcmd = 'df -BK --output="avail" %s | grep -v "Avail"' % self.project_root
+        qcmd = ['df', '-BK', '--output=avail', self.project_root]
         qs = Shell()
         rc, output, m = qs.cmd1(qcmd, timeout=None)
         if rc != 0:
-            self.logger.error('fail checking quota uage of %s, cmd: %s' % (self.project_root, qcmd))
+            self.logger.error('fail checking quota uage of %s, cmd: %s' % (self.project_root, ' '.join(qcmd)))
             return False
 
-        nbavail = int(output.strip().strip('K'))
+        # the last line of the output, following the "Avail" header
+        nbavail = int(output.strip().split('\n')[-1].strip().strip('K'))
         if nbavail < 1:
             self.logger.error('insufficient quota (%d 1k-block available) for %s' % (nbavail, self.project_root))
             return False
@@ -527,14 +896,7 @@ rm -f $setacl_lock
                      'aces': aces}, f)
         f.close()
 
-        cmd += '"%s" "%s"' % (','.join(map(lambda x: x.__str__(), aces)), path)
-
-        s = Shell()
-        rc, outfile, m = s.cmd(cmd, timeout=None, mention_outputfile_on_errors=True)
-        if rc != 0:
-            self.logger.error('%s failed' % cmd)
-        else:
-            os.unlink(outfile)
+        rc = self.__nfs4_setfacl_path__(path, aces, options)
 
         # cleanup lock file regardless the result
         try:
@@ -548,3 +910,40 @@ rm -f $setacl_lock
 
         return not rc
 
+
+    def __nfs4_setfacl_path__(self, path, aces, options=None, inheritance=True):
+        """
+        applies ACEs on a single path via the system.nfs4_acl attribute, or via the nfs4_setfacl command
+        if the attribute is disabled, cannot be written or a recursive operation is requested.
+        :param path: the path on which the given ACEs will be applied
+        :param aces: a list of ACE objects
+        :param options: command-line options for nfs4_setfacl command
+        :param inheritance: set to False to strip the file and directory inheritance flags, e.g. for files
+        :return: the exit code of the operation, 0 if the operation succeed
+        """
+
+        if not options:
+            options = []
+
+        if self.use_xattr and not set(options) - set(['-s', '-L']):
+            try:
+                Nfs4Xattr.setACL(path, aces, inheritance)
+                return 0
+            except (OSError, IOError, ValueError) as e:
+                self.logger.debug('cannot write %s of %s, fallback to nfs4_setfacl: %s' % (Nfs4Xattr.XATTR_NFS4_ACL, path, e))
+
+        if inheritance:
+            acl = ','.join(map(lambda x: x.__str__(), aces))
+        else:
+            acl = ','.join(map(lambda x: x.__str_no_inheritance__(), aces))
+
+        cmd = ['nfs4_setfacl'] + options + [acl, path]
+
+        s = Shell()
+        rc, outfile, m = s.cmd(cmd, timeout=None, mention_outputfile_on_errors=True)
+        if rc != 0:
+            self.logger.error('%s failed' % ' '.join(cmd))
+        else:
+            os.unlink(outfile)
+
+        return rc
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+import os
+import errno
+import struct
+import ctypes
+import ctypes.util
+from utils.acl.ACE import ACE, ACE_TYPES, ACE_FLAGS, ACE_MASKS, MASK_ALIAS, bitsToLetters, lettersToBits
+
+# name of the extended attribute through which the Linux NFSv4 client exposes the raw ACL
+XATTR_NFS4_ACL = 'system.nfs4_acl'
+
+_type_letter = dict(map(lambda x: (x[1], x[0]), ACE_TYPES))
+_type_bits = dict(ACE_TYPES)
+_flag_bits = dict(ACE_FLAGS)
+
+_libc = None
+
+
+def decodeACL(data):
+    """
+    decodes the XDR-encoded value of the system.nfs4_acl attribute into ACE objects
+    :param data: the raw attribute value
+    :return: a list of ACE objects
+    """
+
+    try:
+        naces, = struct.unpack_from('>I', data, 0)
+        off = 4
+
+        aces = []
+        for i in xrange(naces):
+            t, f, m, n = struct.unpack_from('>IIII', data, off)
+            off += 16
+
+            if off + n > len(data):
+                raise ValueError('principle of ACE %d exceeds the attribute size' % i)
+
+            who = data[off:off + n]
+            if not isinstance(who, str):
+                who = who.decode('utf-8')
+
+            # opaque data is padded to a multiple of 4 bytes
+            off += (n + 3) & ~3
+
+            if t not in _type_letter:
+                raise ValueError('unknown type %d of ACE %d' % (t, i))
+
+            aces.append(ACE(type=_type_letter[t],
+                            flag=bitsToLetters(f, ACE_FLAGS),
+                            principle=who,
+                            mask=bitsToLetters(m, ACE_MASKS)))
+    except struct.error as e:
+        raise ValueError('truncated %s attribute: %s' % (XATTR_NFS4_ACL, e))
+
+    return aces
+
+
+def _loadLibc():
+    """
+    loads the C library providing the getxattr/setxattr system call wrappers
+    :return: the ctypes library object
+    """
+
+    global _libc
+
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.getxattr.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_void_p, ctypes.c_size_t]
+        libc.getxattr.restype = ctypes.c_ssize_t
+        libc.setxattr.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_size_t, ctypes.c_int]
+        libc.setxattr.restype = ctypes.c_int
+        _libc = libc
+
+    return _libc
+
+
+def getxattr(path, name):
+    """
+    gets value of an extended attribute of the given path
+    :param path: the file system path
+    :param name: the attribute name
+    :return: the raw attribute value
+    """
+
+    if hasattr(os, 'getxattr'):
+        return os.getxattr(path, name)
+
+    libc = _loadLibc()
+    while True:
+        # query the size first, then retry if the attribute grows in between
+        n = libc.getxattr(path, name, None, 0)
+        if n < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), path)
+
+        buf = ctypes.create_string_buffer(n)
+        n = libc.getxattr(path, name, buf, n)
+        if n >= 0:
+            return buf.raw[:n]
+
+        e = ctypes.get_errno()
+        if e != errno.ERANGE:
+            raise OSError(e, os.strerror(e), path)
+
+
+def getACL(path):
+    """
+    reads NFSv4 ACL of the given path from the system.nfs4_acl attribute
+    :param path: the file system path
+    :return: a list of ACE objects
+    """
+    return decodeACL(getxattr(path, XATTR_NFS4_ACL))
+
+
+def encodeACL(aces, inheritance=True):
+    """
+    encodes ACE objects into the XDR-encoded value of the system.nfs4_acl attribute
+    :param aces: a list of ACE objects
+    :param inheritance: set to False to strip the file and directory inheritance flags, e.g. for files
+    :return: the raw attribute value
+    """
+
+    data = [struct.pack('>I', len(aces))]
+    for ace in aces:
+        if ace.type not in _type_bits:
+            raise ValueError('unknown type of ACE %s' % ace)
+
+        f = lettersToBits(ace.flag, ACE_FLAGS)
+        if not inheritance:
+            f &= ~(_flag_bits['f'] | _flag_bits['d'])
+
+        who = ace.principle
+        if not isinstance(who, str):
+            who = who.encode('utf-8')
+
+        data.append(struct.pack('>IIII', _type_bits[ace.type], f, lettersToBits(ace.mask, ACE_MASKS, MASK_ALIAS), len(who)))
+        data.append(who)
+        data.append('\0' * (-len(who) & 3))
+
+    return ''.join(data)
+
+
+def setxattr(path, name, value):
+    """
+    sets value of an extended attribute of the given path
+    :param path: the file system path
+    :param name: the attribute name
+    :param value: the raw attribute value
+    :return:
+    """
+
+    if hasattr(os, 'setxattr'):
+        return os.setxattr(path, name, value)
+
+    if _loadLibc().setxattr(path, name, value, len(value), 0) < 0:
+        e = ctypes.get_errno()
+        raise OSError(e, os.strerror(e), path)
+
+
+def setACL(path, aces, inheritance=True):
+    """
+    replaces NFSv4 ACL of the given path via the system.nfs4_acl attribute, i.e. the equivalent of 'nfs4_setfacl -s'
+    :param path: the file system path
+    :param aces: a list of ACE objects
+    :param inheritance: set to False to strip the file and directory inheritance flags, e.g. for files
+    :return:
+    """
+    setxattr(path, XATTR_NFS4_ACL, encodeACL(aces, inheritance))
@@ -1,5 +1,8 @@
 #!/usr/bin/env python
+import os
+import copy
 from utils.acl.Logger import getLogger
+from utils.acl.Sampler import RoleSampler
 
 
 class ProjectACL:
@@ -16,6 +19,26 @@ class ProjectACL:
         self.project_root = project_root
         self.logger = getLogger(name=self.__class__.__name__, lvl=lvl)
 
+    def project(self, project_root):
+        """
+        makes a handle of the given project. The handle shares the configuration and the caches of this object,
+        e.g. the permission tables, but has its own project_root and other per-project state; so that several
+        projects can be processed concurrently, each in its own thread with its own handle.
+        :param project_root: the path to the top-level directory of the project
+        :return: the ProjectACL object of the project
+        """
+        h = copy.copy(self)
+        h.project_root = project_root
+        h.__init_project__()
+        return h
+
+    def __init_project__(self):
+        """
+        resets the per-project state of a new project handle made by project
+        :return:
+        """
+        pass
+
     def setRoles(self, path='', users=[], contributors=[], admins=[], recursive=True, force=False, traverse=False,
                  logical=False):
         """
@@ -32,15 +55,41 @@ class ProjectACL:
         """
         raise NotImplementedError
 
-    def getRoles(self, path='', recursive=False):
+    def getRoles(self, path='', recursive=False, **kwargs):
         """
         gets user roles of the given path.
         :param path: the file system path relative to the project_root
         :param recursive: get roles recursively for all sub-paths
+        :param kwargs: implementation specific options passed on to iterRoles
         :return: a list of RoleData objects
         """
+        return list(self.iterRoles(path, recursive, **kwargs))
+
+    def iterRoles(self, path='', recursive=False, **kwargs):
+        """
+        generator of user roles of the given path. In the recursive mode, the RoleData object of a path is
+        yielded as soon as its ACL is retrieved, so that the roles of a large tree are not kept in memory.
+        :param path: the file system path relative to the project_root
+        :param recursive: get roles recursively for all sub-paths
+        :param kwargs: implementation specific options
+        :return: a generator of RoleData objects
+        """
         raise NotImplementedError
 
+    def sampleRoles(self, path='', samples=1000, timeout=None, confidence=0.95, seed=None):
+        """
+        estimates the role distribution of the tree under the given path from a random sample of paths,
+        e.g. for a quick look at a large project before a recursive operation; see RoleSampler.
+        :param path: the file system path relative to the project_root
+        :param samples: the maximum number of sampled paths
+        :param timeout: the maximum sampling time in seconds, None for no limit
+        :param confidence: the confidence level of the estimated intervals
+        :param seed: the seed of the random generator, for reproducible samples
+        :return: a RoleEstimate object
+        """
+        s = RoleSampler(lambda p: self.iterRoles(p, recursive=False).next(), samples, timeout, confidence, seed)
+        return s.sample(os.path.join(self.project_root, path))
+
     def delUsers(self, path='', users=[], recursive=True, force=False, logical=False):
         """
         deletes specified users from accessing to the given path
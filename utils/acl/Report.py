@@ -1,27 +1,218 @@
 #!/usr/bin/env python
 import sys
 import os
+import csv
+import json
 
 ## loading PrettyTable for table output
 from utils.acl.UserRole import PROJECT_ROLES
 from prettytable import PrettyTable
 
+# output formats supported by getRoleWriter
+OUTPUT_FORMATS = ['table', 'fixed', 'ndjson', 'csv', 'tsv']
+
 def printRoleTable(roles):
     ''' display project roles in prettytable
     '''
 
-    t = PrettyTable()
-    t.field_names = ['project', 'path'] + PROJECT_ROLES
-
+    w = TableRoleWriter()
     for pid, rd_list in roles.iteritems():
         for rd in rd_list:
-            data = [pid, rd.path]
-            for k in PROJECT_ROLES:
-                if rd[k]:
-                    data.append(','.join(rd[k]))
-                else:
-                    data.append('x')
-            t.add_row(data)
-
-    t.sortby = 'project'
-    print t
+            w.write(pid, rd)
+    w.close()
+
+def getRoleWriter(fmt='table', out=sys.stdout, inherited=False, **kwargs):
+    ''' returns a writer of project roles in the given output format, one of OUTPUT_FORMATS.
+        Except for 'table', a row is written as soon as it is given to the writer. With inherited set to True,
+        the number of descendants inheriting the roles of an ACL boundary is written in an extra column.
+
+        Example:
+
+            w = getRoleWriter('ndjson')
+            for rd in fs.iterRoles(recursive=True):
+                w.write(pid, rd)
+            w.close()
+    '''
+
+    if fmt == 'table':
+        return TableRoleWriter(out, inherited)
+    elif fmt == 'fixed':
+        return FixedWidthRoleWriter(out, inherited, **kwargs)
+    elif fmt == 'ndjson':
+        return NDJSONRoleWriter(out, inherited)
+    elif fmt == 'csv':
+        return DelimitedRoleWriter(out, inherited, delimiter=',')
+    elif fmt == 'tsv':
+        return DelimitedRoleWriter(out, inherited, delimiter='\t')
+    else:
+        raise ValueError('unknown output format: %s' % fmt)
+
+class RoleWriter:
+    ''' base class of the role writers, writing one row per (project, RoleData)
+    '''
+
+    def __init__(self, out=sys.stdout, inherited=False):
+        self.out = out
+        self.inherited = inherited
+        self.field_names = ['project', 'path'] + PROJECT_ROLES
+        if inherited:
+            self.field_names.append('inherited')
+
+    def write(self, pid, rd):
+        ''' writes roles of a path
+            :param pid: the project id
+            :param rd: the RoleData object
+            :return:
+        '''
+        raise NotImplementedError
+
+    def close(self):
+        ''' writes the pending rows, if any
+        '''
+        self.out.flush()
+
+    def __row__(self, pid, rd, empty='x'):
+        ''' makes the column values of a row
+            :param pid: the project id
+            :param rd: the RoleData object
+            :param empty: the value of a role without users
+            :return: a list of strings
+        '''
+        row = [pid, rd.path] + map(lambda k: ','.join(rd[k]) if rd[k] else empty, PROJECT_ROLES)
+        if self.inherited:
+            row.append(str(rd.inherited))
+        return row
+
+class TableRoleWriter(RoleWriter):
+    ''' the PrettyTable output of printRoleTable, rows are kept in memory until the writer is closed
+    '''
+
+    def __init__(self, out=sys.stdout, inherited=False):
+        RoleWriter.__init__(self, out, inherited)
+        self.roles = {}
+
+    def write(self, pid, rd):
+        self.roles.setdefault(pid, []).append(rd)
+
+    def close(self):
+        t = PrettyTable()
+        t.field_names = self.field_names
+
+        for pid, rd_list in self.roles.iteritems():
+            for rd in rd_list:
+                t.add_row(self.__row__(pid, rd))
+
+        t.sortby = 'project'
+        self.out.write('%s\n' % t)
+        self.roles = {}
+        RoleWriter.close(self)
+
+class FixedWidthRoleWriter(RoleWriter):
+    ''' a plain-text table with fixed column widths. With the widths given, rows are written immediately and
+        values not fitting in a column are truncated with a trailing '~'. Otherwise, rows are written in pages
+        of page_size rows, with the widths derived from the rows of the page.
+    '''
+
+    def __init__(self, out=sys.stdout, inherited=False, widths=None, page_size=1000):
+        RoleWriter.__init__(self, out, inherited)
+        self.widths = widths
+        self.page_size = max(1, page_size)
+        self.page = []
+        self.header = False
+
+        if self.widths is not None and len(self.widths) != len(self.field_names):
+            raise ValueError('%d column widths required, %d given' % (len(self.field_names), len(self.widths)))
+
+    def write(self, pid, rd):
+        row = self.__row__(pid, rd)
+        if self.widths is not None:
+            if not self.header:
+                self.__write_row__(self.field_names, self.widths)
+                self.header = True
+            self.__write_row__(row, self.widths)
+        else:
+            self.page.append(row)
+            if len(self.page) >= self.page_size:
+                self.__flush_page__()
+
+    def close(self):
+        self.__flush_page__()
+        RoleWriter.close(self)
+
+    def __flush_page__(self):
+        if not self.page:
+            return
+
+        widths = map(len, self.field_names)
+        for row in self.page:
+            widths = map(max, widths, map(len, row))
+
+        # a blank line between pages
+        if self.header:
+            self.out.write('\n')
+
+        self.__write_row__(self.field_names, widths)
+        for row in self.page:
+            self.__write_row__(row, widths)
+
+        self.header = True
+        self.page = []
+
+    def __write_row__(self, row, widths):
+        cols = []
+        for v, w in zip(row, widths):
+            if len(v) > w:
+                v = v[:max(0, w - 1)] + '~'
+            cols.append(v.ljust(w))
+        self.out.write('%s\n' % '  '.join(cols).rstrip())
+
+class NDJSONRoleWriter(RoleWriter):
+    ''' newline-delimited JSON, one object per path with the list of users per role
+    '''
+
+    def write(self, pid, rd):
+        # a file name is not necessarily valid UTF-8, and must not break the stream
+        path = rd.path
+        if isinstance(path, str):
+            path = path.decode('utf-8', 'replace')
+
+        data = {'project': pid, 'path': path}
+        for k in PROJECT_ROLES:
+            data[k] = list(rd[k])
+        if self.inherited:
+            data['inherited'] = rd.inherited
+        self.out.write('%s\n' % json.dumps(data, sort_keys=True))
+
+class DelimitedRoleWriter(RoleWriter):
+    ''' CSV/TSV with a header row; users of a role are separated by ',' within the column
+    '''
+
+    def __init__(self, out=sys.stdout, inherited=False, delimiter=','):
+        RoleWriter.__init__(self, out, inherited)
+        self.writer = csv.writer(out, delimiter=delimiter, lineterminator='\n')
+        self.writer.writerow(self.field_names)
+
+    def write(self, pid, rd):
+        self.writer.writerow(self.__row__(pid, rd, empty=''))
+
+def printRoleEstimate(pid, est, out=sys.stdout):
+    ''' display the estimated role distribution of a project, see ProjectACL.sampleRoles
+        :param pid: the project id
+        :param est: the RoleEstimate object
+        :param out: the output stream
+    '''
+
+    def __fmt__(x):
+        return '%5.1f%% [%5.1f%%, %5.1f%%]' % tuple(map(lambda v: v * 100, x))
+
+    out.write('project %s: %s\n' % (pid, est.path))
+    out.write('  %d samples (%d distinct paths) in %.1f s, %d%% confidence intervals\n' %
+              (est.samples, est.distinct, est.elapsed, int(round(est.confidence * 100))))
+    out.write('  estimated number of paths: %d [%d, %d]\n' % tuple(map(lambda v: min(v, sys.maxint), est.npaths)))
+    out.write('  paths with roles different from the top directory: %s\n' % __fmt__(est.differ))
+
+    for k in PROJECT_ROLES:
+        for u, x in sorted(est.roles.get(k, {}).iteritems(), key=lambda x: -x[1][0]):
+            out.write('  %-12s %-12s %s\n' % (k, u, __fmt__(x)))
+
+    out.flush()
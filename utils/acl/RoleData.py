@@ -2,16 +2,43 @@
 from utils.acl.UserRole import PROJECT_ROLES
 
 
-class RoleData:
+def makeRoles(roles={}):
+    """
+    makes the role-to-users mapping shared by RoleData objects. The mapping is never modified in place,
+    so that it can be shared between paths with the same ACL.
+    :param roles: a dictionary of role to an iterable of user ids
+    :return: a dictionary of role to a frozenset of user ids, with all PROJECT_ROLES present
+    """
+    d = dict(map(lambda r: (r, frozenset()), PROJECT_ROLES))
+    for r, users in roles.iteritems():
+        d[r] = frozenset(users)
+    return d
+
+# roles of a path without any user
+EMPTY_ROLES = makeRoles()
+
+
+class RoleData(object):
     """
     RoleData object that contains user roles associated with a file system path.
+
+    The roles are kept in a role-to-frozenset mapping shared by all paths with the same ACL, i.e. the same
+    ACL class id (aclid). Changing the roles of a RoleData object replaces its mapping with a modified copy.
     """
-    def __init__(self, **kwargs):
-        self.path = ''
-        self.__dict__.update(kwargs)
 
-        for r in PROJECT_ROLES:
-            self.__dict__[r] = []
+    __slots__ = ('path', 'roles', 'aclid', 'inherited')
+
+    def __init__(self, path='', roles=None, aclid=None, inherited=0):
+        """
+        :param path: the file system path
+        :param roles: a mapping made by makeRoles, shared with other RoleData objects; no user if None
+        :param aclid: id of the ACL class of the path, see ACLClassTable
+        :param inherited: number of descendants with the same roles, counted in the ACL-boundary mode
+        """
+        self.path = path
+        self.roles = roles if roles is not None else EMPTY_ROLES
+        self.aclid = aclid
+        self.inherited = inherited
 
     def addUserToRole(self, role, user):
         """
@@ -20,11 +47,11 @@ class RoleData:
         :param user: the user id
         :return:
         """
-        if role not in self.__dict__.keys():
-            self.__dict__[role] = []
-
-        if user not in self.__dict__[role]:
-            self.__dict__[role].append(user)
+        users = self.roles.get(role, frozenset())
+        if user not in users:
+            self.roles = dict(self.roles)
+            self.roles[role] = users | frozenset([user])
+            self.aclid = None
 
     def removeUserFromRole(self, role, user):
         """
@@ -33,16 +60,33 @@ class RoleData:
         :param user: the user id
         :return:
         """
-        if role in self.__dict__.keys() and user in self.__dict__[role]:
-            self.__dict__[role].remove(user)
+        users = self.roles.get(role, frozenset())
+        if user in users:
+            self.roles = dict(self.roles)
+            self.roles[role] = users - frozenset([user])
+            self.aclid = None
 
     def __getitem__(self, key):
         """
-        map RoleData[key] to RoleData.key
-        :param key: the attribute of the RoleData object
+        map RoleData[key] to the sorted users of role key, or RoleData.key for the other attributes
+        :param key: the role or the attribute of the RoleData object
         :return: the value
         """
-        return self.__dict__[key]
+        if key in self.roles:
+            return sorted(self.roles[key])
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        return isinstance(other, RoleData) and self.path == other.path and self.roles == other.roles
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((self.path, frozenset(self.roles.iteritems())))
 
     def __repr__(self):
-        return repr(self.__dict__)
\ No newline at end of file
+        d = {'path': self.path}
+        for r, users in self.roles.iteritems():
+            d[r] = sorted(users)
+        return repr(d)
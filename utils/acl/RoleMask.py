@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+from utils.acl.ACE import ACE_MASKS, MASK_ALIAS, lettersToBits, bitsToLetters
+
+_mask_bits = dict(ACE_MASKS)
+
+
+def maskToBits(mask):
+    """
+    converts an ACE mask into a bitmask, ignoring letters that are not NFSv4 permissions
+    :param mask: the mask letters, e.g. 'rwaDdxtTnNcCoy'
+    :return: the integer bitmask
+    """
+    bits = 0
+    for l in mask:
+        bits |= _mask_bits.get(l, 0)
+    return bits
+
+
+def popcount(bits):
+    """
+    counts the bits set in an integer
+    :param bits: the integer
+    :return: the number of bits set
+    """
+    return bin(bits).count('1')
+
+
+class RoleMaskTable(object):
+    """
+    Table of the ALLOW and DENY masks of the roles, encoded as bitmasks when the table is made.
+
+    An ACE mask is classified as the role whose ALLOW mask differs from it in the fewest permissions;
+    on a tie, the role that comes first in the given role order. The result is memoized per mask string,
+    so that classifying an ACE with a mask seen before is a single dictionary lookup.
+
+    Example:
+
+        t = RoleMaskTable({'user': 'RXy', 'traverse': 'x'}, 'rwaDdxnNtTcCoy')
+        t.classify('rxtncy')    # 'user'
+        t.permission('user')    # {'A': 'rxtncy', 'D': 'waDdTNCo'}
+    """
+
+    def __init__(self, role_permission, all_permission, alias=MASK_ALIAS, order=None):
+        """
+        :param role_permission: a role-to-mask dictionary, the masks may contain alias letters
+        :param all_permission: the mask letters of all permissions
+        :param alias: a dictionary for expanding alias letters
+        :param order: the roles in the order of preference on a tie, default to the order of role_permission
+        """
+
+        self.order = list(order if order is not None else role_permission.keys())
+
+        _all = lettersToBits(all_permission, ACE_MASKS, alias)
+
+        self.bits = {}
+        self.permissions = {}
+        for r, m in role_permission.iteritems():
+            a = lettersToBits(m, ACE_MASKS, alias)
+            self.bits[r] = a
+            self.permissions[r] = {'A': bitsToLetters(a, ACE_MASKS),
+                                   'D': bitsToLetters(_all & ~a, ACE_MASKS)}
+
+        # mask string -> role
+        self.roles = {}
+
+    def permission(self, role):
+        """
+        gets the ALLOW and DENY masks of the given role
+        :param role: the role
+        :return: a dictionary with keys 'A' and 'D', or None if the role is unknown
+        """
+        p = self.permissions.get(role)
+        if p is None:
+            return None
+        return dict(p)
+
+    def classify(self, mask):
+        """
+        gets the role closest to the given ACE mask
+        :param mask: the mask letters of an ALLOW ACE
+        :return: the role
+        """
+        r = self.roles.get(mask)
+        if r is None:
+            bits = maskToBits(mask)
+            d = None
+            for _r in self.order:
+                _d = popcount(bits ^ self.bits[_r])
+                if d is None or _d < d:
+                    r, d = _r, _d
+            self.roles[mask] = r
+        return r
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+import os
+import math
+import time
+import random
+from utils.acl.Walker import Walker
+from utils.acl.UserRole import PROJECT_ROLES
+
+
+def normalQuantile(confidence):
+    """
+    gets the two-sided quantile of the standard normal distribution, e.g. 1.96 for 0.95
+    :param confidence: the confidence level, between 0 and 1
+    :return: the quantile
+    """
+    lo, hi = 0.0, 10.0
+    for i in range(60):
+        z = (lo + hi) / 2
+        if math.erf(z / math.sqrt(2)) < confidence:
+            lo = z
+        else:
+            hi = z
+    return (lo + hi) / 2
+
+
+class RoleEstimate:
+    """
+    Estimated role distribution over the paths of a tree, made by RoleSampler. Every estimate is given as
+    a tuple of (value, lower bound, upper bound) of the confidence interval.
+
+    Attributes:
+        path: the top directory
+        samples: number of sampled paths
+        distinct: number of distinct paths among the samples
+        elapsed: sampling time in seconds
+        confidence: the confidence level of the intervals
+        npaths: the estimated number of paths in the tree
+        differ: the estimated fraction of paths with roles different from the top directory
+        roles: a dictionary of role to a dictionary of user to the estimated fraction of paths
+               on which the user has the role
+    """
+
+    def __init__(self, path, confidence):
+        self.path = path
+        self.confidence = confidence
+        self.samples = 0
+        self.distinct = 0
+        self.elapsed = 0.
+        self.npaths = (0., 0., 0.)
+        self.differ = (0., 0., 1.)
+        self.roles = dict(map(lambda r: (r, {}), PROJECT_ROLES))
+
+    def __repr__(self):
+        return repr(self.__dict__)
+
+
+class RoleSampler:
+    """
+    Estimator of the role distribution of a large tree from a random sample of paths.
+
+    Each sample is a random descent from the top directory: at a directory with n entries, the descent stops
+    with probability 1/(n+1) or moves into one of the entries with probability 1/(n+1) each; it always stops
+    at a file. A path is thus sampled with a known probability p, the product of the 1/(n+1) factors along
+    the way. With the weight w = 1/p, the mean weight estimates the number of paths in the tree, and the
+    weighted fraction of samples with a property estimates the fraction of paths with the property.
+
+    Only the directories on the descents are listed, and their listings are kept for the next descents; so
+    that the cost is bounded by the sample size times the depth of the tree.
+
+    Example:
+
+        s = RoleSampler(lambda p: fs.iterRoles(p).next(), samples=500, timeout=60)
+        est = s.sample('/project/3010000.01')
+    """
+
+    def __init__(self, reader, samples=1000, timeout=None, confidence=0.95, seed=None, walker=None):
+        """
+        :param reader: function returning the RoleData object of a path
+        :param samples: the maximum number of samples
+        :param timeout: the maximum sampling time in seconds, None for no limit
+        :param confidence: the confidence level of the intervals
+        :param seed: the seed of the random generator, for reproducible samples
+        :param walker: the Walker object for listing directories, a Walker with the default excludes if None
+        """
+        self.reader = reader
+        self.samples = samples
+        self.timeout = timeout
+        self.confidence = confidence
+        self.random = random.Random(seed)
+        self.walker = walker or Walker()
+
+    def sample(self, top):
+        """
+        samples the tree under top and estimates the role distribution
+        :param top: the top directory
+        :return: a RoleEstimate object
+        """
+
+        t0 = time.time()
+
+        listings = {}
+        roles = {}
+
+        def __roles__(p):
+            if p not in roles:
+                roles[p] = self.reader(p)
+            return roles[p]
+
+        root = __roles__(top).roles
+
+        # (weight, roles) of the samples
+        ws = []
+        while len(ws) < self.samples:
+            if self.timeout is not None and time.time() - t0 > self.timeout:
+                break
+
+            p, isdir, w = top, True, 1.
+            while isdir:
+                if p not in listings:
+                    listings[p] = list(self.walker.entries(p))
+                es = listings[p]
+
+                i = self.random.randint(0, len(es))
+                w *= len(es) + 1
+                if i == len(es):
+                    break
+                p, isdir = es[i]
+
+            ws.append((w, __roles__(p).roles))
+
+        est = RoleEstimate(top, self.confidence)
+        est.samples = len(ws)
+        est.distinct = len(roles)
+        est.elapsed = time.time() - t0
+
+        if not ws:
+            return est
+
+        z = normalQuantile(self.confidence)
+        est.npaths = self.__mean__(map(lambda x: x[0], ws), z)
+        est.differ = self.__ratio__(ws, lambda r: r != root, z)
+
+        users = set()
+        for w, r in ws:
+            for k, us in r.iteritems():
+                users |= set(map(lambda u: (k, u), us))
+
+        for k, u in sorted(users):
+            est.roles.setdefault(k, {})[u] = self.__ratio__(ws, lambda r: u in r.get(k, ()), z)
+
+        return est
+
+    def __mean__(self, xs, z):
+        """
+        estimates the mean with its confidence interval
+        :param xs: the sampled values
+        :param z: the normal quantile of the confidence level
+        :return: a tuple of (mean, lower bound, upper bound)
+        """
+        n = len(xs)
+        m = sum(xs) / n
+        if n < 2:
+            return m, 0., float('inf')
+        se = math.sqrt(sum(map(lambda x: (x - m) ** 2, xs)) / (n - 1) / n)
+        return m, max(0., m - z * se), m + z * se
+
+    def __ratio__(self, ws, cond, z):
+        """
+        estimates the fraction of paths satisfying a condition on their roles, with the ratio estimator and
+        its linearised variance
+        :param ws: a list of (weight, roles) tuples
+        :param cond: function of the roles returning True or False
+        :param z: the normal quantile of the confidence level
+        :return: a tuple of (fraction, lower bound, upper bound)
+        """
+        n = len(ws)
+        ys = map(lambda x: (x[0], 1. if cond(x[1]) else 0.), ws)
+        sw = sum(map(lambda x: x[0], ys))
+        r = sum(map(lambda x: x[0] * x[1], ys)) / sw
+        if n < 2:
+            return r, 0., 1.
+
+        wm = sw / n
+        s2 = sum(map(lambda x: (x[0] * (x[1] - r)) ** 2, ys)) / (n - 1)
+        se = math.sqrt(s2 / n) / wm
+        return r, max(0., r - z * se), min(1., r + z * se)
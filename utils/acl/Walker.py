@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+import os
+import stat
+import fnmatch
+import ctypes
+import ctypes.util
+import Queue
+import threading
+
+# names never visited by default: NetApp snapshot trees and the lock file of setacl
+DEFAULT_EXCLUDES = ['.snapshot', '.setacl_lock']
+
+# d_type values of struct dirent
+DT_UNKNOWN = 0
+DT_DIR = 4
+DT_LNK = 10
+
+
+class _dirent64(ctypes.Structure):
+    _fields_ = [('d_ino', ctypes.c_uint64),
+                ('d_off', ctypes.c_int64),
+                ('d_reclen', ctypes.c_ushort),
+                ('d_type', ctypes.c_ubyte),
+                ('d_name', ctypes.c_char * 256)]
+
+_libc = None
+
+
+def _loadLibc():
+    """
+    loads the C library providing opendir/readdir64/closedir, or returns False if they are not available
+    :return: the ctypes library object or False
+    """
+
+    global _libc
+
+    if _libc is None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            libc.opendir.argtypes = [ctypes.c_char_p]
+            libc.opendir.restype = ctypes.c_void_p
+            libc.readdir64.argtypes = [ctypes.c_void_p]
+            libc.readdir64.restype = ctypes.POINTER(_dirent64)
+            libc.closedir.argtypes = [ctypes.c_void_p]
+            libc.closedir.restype = ctypes.c_int
+            _libc = libc
+        except (OSError, AttributeError):
+            _libc = False
+
+    return _libc
+
+
+def scandir(path):
+    """
+    generator listing a directory entry by entry, together with the entry type provided by readdir, so that
+    the type of most entries is known without a stat call. Unlike os.listdir, the names are not collected
+    into a list first. Falls back to os.listdir with unknown types if readdir64 is not available.
+    :param path: the directory
+    :return: a generator of (name, d_type) tuples, '.' and '..' excluded
+    """
+
+    libc = _loadLibc()
+    if not libc:
+        for n in os.listdir(path):
+            yield n, DT_UNKNOWN
+        return
+
+    d = libc.opendir(path)
+    if not d:
+        e = ctypes.get_errno()
+        raise OSError(e, os.strerror(e), path)
+
+    try:
+        while True:
+            ctypes.set_errno(0)
+            ent = libc.readdir64(d)
+            if not ent:
+                e = ctypes.get_errno()
+                if e:
+                    raise OSError(e, os.strerror(e), path)
+                break
+
+            n = ent.contents.d_name
+            if n not in ('.', '..'):
+                yield n, ent.contents.d_type
+    finally:
+        libc.closedir(d)
+
+
+class Walker:
+    """
+    Walker through a directory tree, the common traversal of the recursive ACL operations.
+
+    Entries are streamed as (path, isdir) tuples: a directory comes first, followed by the files in it
+    as they are read from the directory, followed by its sub-directories. Files are never collected
+    into a list, so that the memory use is bounded by the sub-directories pending to be visited rather than
+    the size of the directories.
+
+    Example:
+
+        w = Walker(followlinks=True, maxdepth=2)
+        for p, isdir in w.walk('/project/3010000.01'):
+            print p
+    """
+
+    def __init__(self, excludes=DEFAULT_EXCLUDES, maxdepth=None, followlinks=False, nthreads=1, onerror=None):
+        """
+        :param excludes: a list of fnmatch patterns of entry names not to be visited, e.g. '.snapshot'
+        :param maxdepth: the maximum depth to descend, the top directory is at depth 0; None for no limit
+        :param followlinks: set to True to descend into symbolic links to directories, a directory reached
+                            more than once, e.g. through a symbolic link loop, is visited only the first time
+        :param nthreads: number of threads listing directories concurrently, entries are then yielded
+                         in the order of completion
+        :param onerror: function called with an OSError if a directory cannot be listed
+        """
+        self.excludes = excludes or []
+        self.maxdepth = maxdepth
+        self.followlinks = followlinks
+        self.nthreads = max(1, nthreads)
+        self.onerror = onerror
+        self.lock = threading.Lock()
+
+    def walk(self, top):
+        """
+        generator walking through the tree under top
+        :param top: the top directory
+        :return: a generator of (path, isdir) tuples, the top directory included
+        """
+
+        visited = set()
+        if not self.__visit__(top, visited):
+            return
+
+        if self.nthreads > 1:
+            for e in self.__walk_parallel__(top, visited):
+                yield e
+            return
+
+        # stack of (directory, depth) pending to be visited; a directory is reported when it is popped,
+        # followed by its files, and its sub-directories are pushed in reverse order so that the tree is
+        # visited depth-first in the order of listing
+        stack = [(top, 0)]
+        while stack:
+            d, depth = stack.pop()
+            yield d, True
+
+            dirs = []
+            for p, isdir in self.entries(d, depth, visited):
+                if isdir:
+                    dirs.append(p)
+                else:
+                    yield p, False
+
+            for p in reversed(dirs):
+                stack.append((p, depth + 1))
+
+    def entries(self, path, depth=0, visited=None, onerror=None):
+        """
+        generator listing the entries of a single directory with the exclude patterns, the maximum depth and,
+        if symbolic links are followed, the cycle detection applied. Symbolic links to directories are not
+        reported at all if they are not followed, as os.walk does not descend into them either.
+        :param path: the directory
+        :param depth: depth of the directory
+        :param visited: the set of visited directories for the cycle detection
+        :param onerror: function called with an OSError if the directory cannot be listed, instead of the
+                        onerror function of the walker
+        :return: a generator of (path, isdir) tuples
+        """
+
+        onerror = onerror or self.onerror
+
+        if self.maxdepth is not None and depth >= self.maxdepth:
+            return
+
+        if visited is None:
+            visited = set()
+
+        try:
+            for n, t in scandir(path):
+                if self.__excluded__(n):
+                    continue
+
+                p = os.path.join(path, n)
+
+                if t == DT_UNKNOWN:
+                    # file system not providing d_type, e.g. some NFS servers
+                    try:
+                        m = os.lstat(p).st_mode
+                    except OSError:
+                        continue
+                    t = DT_DIR if stat.S_ISDIR(m) else DT_LNK if stat.S_ISLNK(m) else None
+
+                if t == DT_DIR:
+                    if self.__visit__(p, visited):
+                        yield p, True
+                elif t == DT_LNK:
+                    try:
+                        isdir = stat.S_ISDIR(os.stat(p).st_mode)
+                    except OSError:
+                        # dangling link
+                        isdir = False
+
+                    if not isdir:
+                        yield p, False
+                    elif self.followlinks and self.__visit__(p, visited):
+                        yield p, True
+                else:
+                    yield p, False
+        except OSError as e:
+            if onerror:
+                onerror(e)
+
+    def __excluded__(self, name):
+        """
+        checks if the entry name matches one of the exclude patterns
+        :param name: the entry name
+        :return: True if the entry is excluded, otherwise False
+        """
+        for x in self.excludes:
+            if fnmatch.fnmatchcase(name, x):
+                return True
+        return False
+
+    def __visit__(self, path, visited):
+        """
+        marks the directory as visited for the cycle detection, which is only needed when symbolic links
+        are followed. The directory is identified by its device and inode numbers.
+        :param path: the directory
+        :param visited: the set of visited directories
+        :return: True if the directory has not been visited before, otherwise False
+        """
+
+        if not self.followlinks:
+            return True
+
+        try:
+            s = os.stat(path)
+        except OSError as e:
+            if self.onerror:
+                self.onerror(e)
+            return False
+
+        k = (s.st_dev, s.st_ino)
+        self.lock.acquire()
+        try:
+            if k in visited:
+                return False
+            visited.add(k)
+            return True
+        finally:
+            self.lock.release()
+
+    def __walk_parallel__(self, top, visited):
+        """
+        generator walking through the tree under top with nthreads threads listing directories. A directory is
+        reported when a thread starts listing it, followed by its files.
+        :param top: the top directory
+        :param visited: the set of visited directories for the cycle detection
+        :return: a generator of (path, isdir) tuples in the order of completion
+        """
+
+        tasks = Queue.Queue()
+        results = Queue.Queue(maxsize=self.nthreads * 1000)
+        stopped = threading.Event()
+
+        # number of directories not yet completely listed
+        lock = threading.Lock()
+        pending = [1]
+
+        def __put__(r):
+            while not stopped.is_set():
+                try:
+                    results.put(r, timeout=1)
+                    return True
+                except Queue.Full:
+                    pass
+            return False
+
+        def __worker__():
+            while True:
+                t = tasks.get()
+                if t is None:
+                    break
+
+                d, depth = t
+                try:
+                    if not __put__((d, True)):
+                        continue
+
+                    for p, isdir in self.entries(d, depth, visited):
+                        if stopped.is_set():
+                            break
+                        if isdir:
+                            lock.acquire()
+                            pending[0] += 1
+                            lock.release()
+                            tasks.put((p, depth + 1))
+                        elif not __put__((p, False)):
+                            break
+                finally:
+                    lock.acquire()
+                    pending[0] -= 1
+                    done = pending[0] == 0
+                    lock.release()
+
+                    # all entries are in the result queue before the end marker
+                    if done:
+                        __put__(None)
+
+        workers = []
+        for i in range(self.nthreads):
+            w = threading.Thread(target=__worker__, name='Walker_worker_%d' % i)
+            w.daemon = True
+            w.start()
+            workers.append(w)
+
+        tasks.put((top, 0))
+        try:
+            while True:
+                r = results.get()
+                if r is None:
+                    break
+                yield r
+        finally:
+            stopped.set()
+            for w in workers:
+                tasks.put(None)
+            # the workers only finish the directory entry at hand, they must not outlive the walk
+            for w in workers:
+                w.join()